@@ -5,5 +5,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from address_book import AddressBook
+from contact_query import And, BirthdayBetween, Contains, Equals, Or, Predicate, Prefix, parse_query
 from note_book import NoteBook
+from pagination import Page, paginate
 from fields import Record, Note
@@ -1,11 +1,23 @@
+import threading
 from calendar import day_name
 from collections import UserDict, defaultdict
-from datetime import datetime
-from typing import Any, Optional, List, Dict, Union
+from datetime import date
+from typing import Callable, Optional, Iterable, Iterator, List, Dict, Set, Tuple, Union
 
 from fields.record import Record
 from book_exceptions import AddressBookException
+from field_exceptions import FieldException, RecordException
 from prompt_toolkit.validation import ValidationError
+from birthday_index import BirthdayIndex, parse_birthday
+from fuzzy_index import CLOSEST_NAMES_LIMIT, FuzzyIndex, scan_closest
+from name_order import NameOrder
+from pagination import DEFAULT_PAGE_SIZE, Page, check_page
+from phone_index import PhoneIndex
+from record_index import INDEXED_FIELDS, RecordIndex
+from trigram_index import SEARCH_FIELDS, TrigramIndex
+
+# A batch adding at least this share of the book drops the built indexes instead of updating them record by record.
+REBUILD_INDEXES_SHARE = 0.25
 
 
 class AddressBook(UserDict):
@@ -13,21 +25,93 @@ class AddressBook(UserDict):
     def __init__(self):
         self.data = {}
         super().__init__()
+        self._changed_names: Set[str] = set()
+        self._deleted_names: Set[str] = set()
+        # The autosave thread serializes the book while the user keeps editing it, so every change of the
+        # records and every serialization of them holds this lock.
+        self._lock = threading.RLock()
+        self._index = RecordIndex()
+        self._trigrams = TrigramIndex()
+        self._birthdays = BirthdayIndex()
+        self._fuzzy_names = FuzzyIndex()
+        self._phones = PhoneIndex()
+        self._order = NameOrder()
+        # Every attribute access creates a new bound method, so all records share the same two hooks.
+        self._name_change_hook = self._update_self_key
+        self._change_hook = self._on_record_change
 
     def add_record(self, record: Record) -> None:
         """Add a record to the address book."""
         try:
-            record.name._on_name_change = self._update_self_key
-            self.data[record.name.value] = record
+            with self._lock:
+                self._attach_hooks(record)
+                if record.name.value not in self.data:
+                    self._order.extend([record.name.value])
+                self.data[record.name.value] = record
+                self._index.add(record)
+                self._trigrams.add(record)
+                self._birthdays.add(record)
+                self._fuzzy_names.add(record.name.value)
+                self._phones.add(record)
+                self._mark_changed(record.name.value)
         except AttributeError as ex:
             raise AddressBookException(f"Invalid record: {record}")
 
+    def add_records(self, rows: Iterable[Union[Record, Dict[str, str]]], validate: bool = True) -> List[Tuple[int, str]]:
+        """Add records or their dictionaries in one batch and return the positions and errors of the invalid ones.
+
+        All rows are validated before the book is touched, and the indexes are updated once for the whole batch.
+        """
+        records: Dict[str, Record] = {}
+        errors: List[Tuple[int, str]] = []
+        for position, row in enumerate(rows):
+            if not isinstance(row, dict):
+                record = row
+            else:
+                try:
+                    record = Record.from_dict(row, validate=validate)
+                except (ValidationError, FieldException, RecordException) as ex:
+                    errors.append((position, f"{row.get('name') or 'unnamed contact'}: {ex}"))
+                    continue
+            self._attach_hooks(record)
+            records[record.name.value] = record
+        if records:
+            with self._lock:
+                self._order.extend([name for name in records if name not in self.data])
+                self.data.update(records)
+                self._index_batch(records.values())
+                for name in records:
+                    self._mark_changed(name)
+        return errors
+
+    def load_trusted(self, rows: Iterable[Tuple[Optional[str], ...]]) -> None:
+        """Add the records of a verified snapshot from their (name, phone, birthday, email, address) values.
+
+        The values are not validated and the records are not marked as changed, since they are exactly what was saved.
+        """
+        records: Dict[str, Record] = {}
+        for fields in rows:
+            record = Record.trusted(*fields, on_name_change=self._name_change_hook, on_change=self._change_hook)
+            records[record.name.value] = record
+        with self._lock:
+            self._order.extend([name for name in records if name not in self.data])
+            self.data.update(records)
+            self._index_batch(records.values())
+
     def delete_record(self, name: str) -> bool:
         """Delete a record from the address book."""
         record = self.find(name)
         try:
             if record:
-                self.data.pop(record.name.value)
+                with self._lock:
+                    self.data.pop(record.name.value)
+                    self._index.remove(record.name.value)
+                    self._trigrams.remove(record.name.value)
+                    self._birthdays.remove(record.name.value)
+                    self._fuzzy_names.remove(record.name.value)
+                    self._phones.remove(record.name.value)
+                    self._order.remove(record.name.value)
+                    self._mark_deleted(record.name.value)
                 return True
             return False
         except AttributeError as ex:
@@ -39,42 +123,94 @@ class AddressBook(UserDict):
         """Return all records in the address book."""
         return list(self.data.values())
 
+    def get_page(self, offset: int = 0, page_size: int = DEFAULT_PAGE_SIZE) -> Page[Record]:
+        """Return a page of the records in the order they were added, building only the records of the page."""
+        check_page(offset, page_size)
+        with self._lock:
+            names = self._name_order().slice(offset, page_size)
+            return Page([self.data[name] for name in names], offset, page_size, len(self.data))
+
+    def pop_changes(self) -> Tuple[List[Dict[str, str]], List[str]]:
+        """Return the records changed and the names deleted since the last call.
+
+        The changes are forgotten only once all changed records have been converted, so a failed
+        conversion leaves them for the next save.
+        """
+        with self._lock:
+            changed = [record.to_dict() for name in self._changed_names if (record := self.find(name))]
+            deleted = list(self._deleted_names)
+            self._changed_names, self._deleted_names = set(), set()
+        return changed, deleted
+
+    def restore_changes(self, changed: List[Dict[str, str]], deleted: List[str]) -> None:
+        """Give back the changes returned by `pop_changes` which could not be saved, so the next save retries them.
+
+        A contact changed again meanwhile keeps its newer change.
+        """
+        with self._lock:
+            for record in changed:
+                if record["name"] not in self._deleted_names:
+                    self._changed_names.add(record["name"])
+            for name in deleted:
+                if name not in self._changed_names:
+                    self._deleted_names.add(name)
+
+    def has_changes(self) -> bool:
+        """Check if the address book has changed since the last call of `pop_changes`."""
+        return bool(self._changed_names or self._deleted_names)
+
     def to_dict(self) -> List[Dict[str, str]]:
         """Convert the address book to a dictionary."""
         res = []
-        for record in self.data.values():
-            try:
-                res.append(record.to_dict())
-            except TypeError as ex:
-                raise AddressBookException(f"Invalid record: {record}. Unable to convert to dictionary.")
+        with self._lock:
+            for record in self.data.values():
+                try:
+                    res.append(record.to_dict())
+                except TypeError as ex:
+                    raise AddressBookException(f"Invalid record: {record}. Unable to convert to dictionary.")
         return res
 
+    def deferred_dict(self) -> Callable[[], List[Dict[str, str]]]:
+        """Return a function converting the address book as it is now to a dictionary later, e.g. in another thread.
+
+        Only the references to the records are copied now, so a record changed meanwhile is converted as changed.
+        """
+        with self._lock:
+            records = list(self.data.values())
+        return lambda: [record.to_dict() for record in records]
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        """Iterate over the dictionaries of all records one at a time."""
+        for record in self.data.values():
+            yield record.to_dict()
+
     @classmethod
-    def from_dict(cls, data: List[Dict[str, str]]) -> "AddressBook":
+    def from_dict(cls, data: Iterable[Dict[str, str]]) -> "AddressBook":
         """Create an address book from a dictionary."""
         address_book = cls()
         for record in data:
-            try:
-                new_record = Record.from_dict(record, name_change_callback=address_book._update_self_key)
-            except ValidationError as e:
-                print("Ignored invalid record instorage: ", record, e)
-
-            address_book.add_record(new_record)
+            address_book.load_record(record)
         return address_book
 
+    def load_record(self, data: Dict[str, str], validate: bool = True) -> Optional[Record]:
+        """Create a record from a dictionary and add it to the address book."""
+        try:
+            new_record = Record.from_dict(data, name_change_callback=self._name_change_hook, validate=validate)
+        except ValidationError as e:
+            print("Ignored invalid record instorage: ", data, e)
+            return None
+        self.add_record(new_record)
+        return new_record
+
     def get_birthdays_per_week(self, num_of_days: int = 7) -> Optional[Dict[str, str]]:
-        """Print the birthdays for the next `num_of_days` days."""
+        """Print the birthdays for the next `num_of_days` days starting today."""
         users_with_day_this_week = defaultdict(list)
-        updated_users_list = self._get_users_birthday_in_current_year(self.data)
-        for user in updated_users_list:
-            if day := self._estimate_birthday_delta(user, num_of_days):
-                if name := user.get("name"):
-                    if day.lower() in ["saturday", "sunday"]:
-                        users_with_day_this_week["Monday"].append(name.capitalize())
-                    else:
-                        users_with_day_this_week[day].append(name.capitalize())
-                else:
-                    raise AddressBookException(f"Invalid user: {user}. Unable to estimate birthday.")
+        for birthday, name in self._birthday_index().upcoming(date.today(), num_of_days):
+            day = birthday.strftime("%A")
+            if day.lower() in ["saturday", "sunday"]:
+                users_with_day_this_week["Monday"].append(name.capitalize())
+            else:
+                users_with_day_this_week[day].append(name.capitalize())
 
         sorted_days = sorted(users_with_day_this_week.keys(), key=lambda x: list(day_name).index(x))
 
@@ -92,31 +228,144 @@ class AddressBook(UserDict):
         except KeyError:
             return None
 
+    def find_closest(self, name: str, limit: int = CLOSEST_NAMES_LIMIT) -> List[Record]:
+        """Find the records whose names are the closest to the name by edit distance, for names with typos."""
+        if not self._fuzzy_names.is_built():
+            self._fuzzy_names.build_in_background(list(self.data))
+            if not self._fuzzy_names.is_built():
+                # The tree of a large book takes seconds to build, so until it is ready the names are compared directly.
+                return [self.data[closest] for closest in scan_closest(name, self.data, limit)]
+        return [self.data[closest] for closest in self._fuzzy_names.closest(name, limit)]
+
+    def find_by_phone_prefix(self, prefix: str) -> List[Record]:
+        """Find the records whose phone starts with the prefix, e.g. an operator code, ordered by phone."""
+        return [self.data[name] for name in self._phone_index().starting_with(prefix)]
+
+    def find_callers(self, number: str) -> List[Record]:
+        """Find the records an incoming call may come from, matching the number with or without its country code."""
+        return [self.data[name] for name in self._phone_index().callers(number)]
+
+    def find_by(self, by_field: str, value: str) -> List[Record]:
+        """Find the records whose phone, email or birthday equals the value, using the index instead of a scan."""
+        if by_field not in INDEXED_FIELDS:
+            raise AddressBookException(f"Invalid indexed field: {by_field}")
+        return [self.data[name] for name in sorted(self._field_index(by_field).lookup(by_field, value))]
+
     def search(self, by_field: str, value: str) -> List[Record]:
         """Search for a record in the address book."""
+        if by_field not in SEARCH_FIELDS:
+            raise AddressBookException(f"Invalid search field: {by_field}")
         if not value:
             return self.get_all_records()
-        return [record for record in self.data.values() if getattr(record, by_field) and value.lower() in getattr(record, by_field).value.lower()]
-
-    def _get_users_birthday_in_current_year(self, data: Dict[str, Any]) -> List[Dict[str, Union[str, datetime]]]:
-        """Return the list of users with their birthday in the current year."""
-        updated_users_list = []
-        for user in data:
-            birthday = data[user].birthday
-            if not birthday:
-                continue
-            birthday = datetime.strptime(birthday.value, "%d.%m.%Y")
-            birthday = birthday.replace(year=datetime.today().date().year).date()
-            name = data[user].name.value
-            updated_users_list.append({"name": name, "birthday": birthday})
-        return updated_users_list
-
-    def _estimate_birthday_delta(self, user: Dict[str, Union[str, datetime]], from_days: int) -> Optional[str]:
-        """Estimate the birthday delta."""
-        delta_days = abs((user.get("birthday") - datetime.today().date()).days)
-        if delta_days < from_days:
-            return user.get("birthday").strftime("%A")
-        
+        return [self.data[name] for name in self._trigram_index(by_field).search(by_field, value)]
+
+    def query(self, predicate: "Predicate") -> List[Record]:
+        """Return the records matching the query sorted by name.
+
+        The candidates come from the most selective index the query can use and only they are checked
+        against the whole query; a query no index can answer falls back to a single scan of the book.
+        """
+        if predicate.estimate(self) is None:
+            return sorted((record for record in self.data.values() if predicate.matches(record)),
+                          key=lambda record: record.name.value)
+        records = (self.data[name] for name in sorted(predicate.candidates(self)))
+        return [record for record in records if predicate.matches(record)]
+
+    def _birthday_index(self) -> BirthdayIndex:
+        """Return the birthday index, building it on first use."""
+        if not self._birthdays.is_built():
+            self._birthdays.build(self._iter_birthday_days())
+        return self._birthdays
+
+    def _name_order(self) -> NameOrder:
+        """Return the order of the names, building it on first use."""
+        if not self._order.is_built():
+            self._order.build(self.data)
+        return self._order
+
+    def _phone_index(self) -> PhoneIndex:
+        """Return the phone index, building it on first use."""
+        if not self._phones.is_built():
+            self._phones.build(self._iter_field("phone"))
+        return self._phones
+
+    def _field_index(self, field: str) -> RecordIndex:
+        """Return the exact-match index with the field built, building it on first use."""
+        if not self._index.is_built(field):
+            self._index.build(field, self._iter_field(field))
+        return self._index
+
+    def _trigram_index(self, field: str) -> TrigramIndex:
+        """Return the trigram index with the field built, building it on first use."""
+        if not self._trigrams.is_built(field):
+            self._trigrams.build(field, self._iter_field(field))
+        return self._trigrams
+
+    def _index_batch(self, records: Iterable[Record]) -> None:
+        """Add a batch of records to the built indexes, or drop them to be rebuilt if the batch is a large part of the book."""
+        records = list(records)
+        if len(records) >= len(self.data) * REBUILD_INDEXES_SHARE:
+            self._index.clear()
+            self._trigrams.clear()
+            self._birthdays.clear()
+            self._fuzzy_names.clear()
+            self._phones.clear()
+            self._order.clear()
+            return
+        for record in records:
+            self._index.add(record)
+            self._trigrams.add(record)
+            self._birthdays.add(record)
+            self._fuzzy_names.add(record.name.value)
+            self._phones.add(record)
+
+    def _iter_birthday_days(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """Iterate over the names of the records having a birthday together with its month and day."""
+        for name, birthday in self._iter_field("birthday"):
+            if day := parse_birthday(birthday):
+                yield name, day
+
+    def _iter_field(self, field: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate over the names of all records together with the value of their field, for building indexes."""
+        for record in self.data.values():
+            value = getattr(record, field)
+            yield record.name.value, value.value if value else None
+
+    def _attach_hooks(self, record: Record) -> None:
+        """Subscribe the address book to the changes of the record."""
+        record._on_name_change = self._name_change_hook
+        record._on_change = self._change_hook
+
+    def _mark_changed(self, name: str) -> None:
+        """Mark the record as changed since the last save."""
+        with self._lock:
+            self._deleted_names.discard(name)
+            self._changed_names.add(name)
+
+    def _mark_deleted(self, name: str) -> None:
+        """Mark the record as deleted since the last save."""
+        with self._lock:
+            self._changed_names.discard(name)
+            self._deleted_names.add(name)
+
+    def _on_record_change(self, record: Record) -> None:
+        """Track changes made to a record of the address book."""
+        with self._lock:
+            self._index.add(record)
+            self._trigrams.add(record)
+            self._birthdays.add(record)
+            self._phones.add(record)
+            self._mark_changed(record.name.value)
+
     def _update_self_key(self, old_name: str, new_name: str) -> None:
         """Update the key of the address book."""
-        self.data[new_name] = self.data.pop(old_name)
+        with self._lock:
+            self.data[new_name] = self.data.pop(old_name)
+            self._index.rename(old_name, new_name)
+            self._trigrams.rename(old_name, new_name)
+            self._birthdays.rename(old_name, new_name)
+            self._fuzzy_names.rename(old_name, new_name)
+            self._phones.rename(old_name, new_name)
+            self._order.rename(old_name, new_name)
+            self._mark_deleted(old_name)
+            self._mark_changed(new_name)
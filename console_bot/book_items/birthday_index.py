@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right, insort
+from calendar import isleap, monthrange
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fields.record import Record
+
+# Birthdays on February 29 are celebrated on March 1 in non-leap years.
+LEAP_DAY = (2, 29)
+AFTER_LEAP_DAY = (3, 1)
+YEAR_END = (12, 31)
+YEAR_START = (1, 1)
+# A leap year, so February 29 stays a day of its own.
+LEAP_YEAR = 2000
+
+
+def parse_birthday(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Return the month and day of a DD.MM.YYYY birthday."""
+    if not value:
+        return None
+    day, month, _ = value.split(".")
+    return clamp_day(int(month), int(day))
+
+
+def clamp_day(month: int, day: int) -> Tuple[int, int]:
+    """Return the month and day with a day past the end of the month moved to its last day, e.g. 31.04 to 30.04.
+
+    Stored birthdays and query bounds are clamped alike, so a range ending on the last day of a month finds them.
+    """
+    if not 1 <= month <= 12:
+        return month, day
+    return month, min(day, monthrange(LEAP_YEAR, month)[1])
+
+
+def celebration_date(year: int, month: int, day: int) -> date:
+    """Return the date the birthday is celebrated on in the year."""
+    if (month, day) == LEAP_DAY and not isleap(year):
+        return date(year, *AFTER_LEAP_DAY)
+    # Books saved before impossible dates were rejected may hold days past the end of the month.
+    return date(year, month, min(day, monthrange(year, month)[1]))
+
+
+class BirthdayIndex:
+    """The names of the contacts sorted by the day of the year of their birthday.
+
+    The index is built on its first query, so loading a book does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Optional[List[Tuple[int, int, str]]] = None
+        self._days: Dict[str, Tuple[int, int]] = {}
+
+    def is_built(self) -> bool:
+        """Check if the index has been built."""
+        return self._entries is not None
+
+    def build(self, days: Iterable[Tuple[str, Tuple[int, int]]]) -> None:
+        """Build the index from the (name, (month, day)) pairs of all contacts having a birthday."""
+        self._days = dict(days)
+        self._entries = sorted((month, day, name) for name, (month, day) in self._days.items())
+
+    def clear(self) -> None:
+        """Drop the index, so it is built again on its next query."""
+        self._entries = None
+        self._days = {}
+
+    def add(self, record: Record) -> None:
+        """Index the birthday of the record replacing what was indexed for its name before."""
+        if self._entries is None:
+            return
+        name = record.name.value
+        self.remove(name)
+        if day := parse_birthday(record.birthday.value if record.birthday else None):
+            self._days[name] = day
+            insort(self._entries, (*day, name))
+
+    def remove(self, name: str) -> None:
+        """Drop the contact with the name from the index."""
+        if self._entries is None or name not in self._days:
+            return
+        entry = (*self._days.pop(name), name)
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Move the birthday of a contact to its new name."""
+        if self._entries is None or old_name not in self._days:
+            self.remove(new_name)
+            return
+        day = self._days[old_name]
+        self.remove(old_name)
+        self.remove(new_name)
+        self._days[new_name] = day
+        insort(self._entries, (*day, new_name))
+
+    def between(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[str]:
+        """Return the names of the contacts born between the (month, day) bounds, wrapping across the year end."""
+        return [name for first, last in self._ranges(start, end) for _, _, name in self._entries[first:last]]
+
+    def count_between(self, start: Tuple[int, int], end: Tuple[int, int]) -> int:
+        """Return the number of contacts born between the (month, day) bounds, wrapping across the year end."""
+        return sum(last - first for first, last in self._ranges(start, end))
+
+    def upcoming(self, start: date, days: int) -> Iterator[Tuple[date, str]]:
+        """Iterate over the celebration dates and names of the birthdays in the `days` days from `start` on."""
+        if days <= 0:
+            return
+        # A year at most, so every birthday is found once.
+        end = start + timedelta(days=min(days, 365) - 1)
+        year = start.year
+        low = (start.month, start.day)
+        while year <= end.year:
+            high = (end.month, end.day) if year == end.year else YEAR_END
+            if low == AFTER_LEAP_DAY and not isleap(year):
+                low = LEAP_DAY
+            for first, last in self._ranges(low, high):
+                for month, day, name in self._entries[first:last]:
+                    yield celebration_date(year, month, day), name
+            year, low = year + 1, YEAR_START
+
+    def _ranges(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Return the slices of the entries between the (month, day) bounds, two of them if the bounds wrap."""
+        bounds = [(start, end)] if start <= end else [(start, YEAR_END), (YEAR_START, end)]
+        return [(bisect_left(self._entries, low), bisect_right(self._entries, (*high, chr(0x10FFFF))))
+                for low, high in bounds]
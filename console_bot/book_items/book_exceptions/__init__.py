@@ -5,4 +5,4 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
-from book_exceptions.exceptions import AddressBookException, NoteBookException
+from book_exceptions.exceptions import AddressBookException, NoteBookException, QueryException
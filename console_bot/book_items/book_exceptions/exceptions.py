@@ -8,3 +8,9 @@ class NoteBookException(Exception):
     """A class to represent a note book exception."""
     def __init__(self, message: str) -> None:
         super().__init__(message)
+
+
+class QueryException(AddressBookException):
+    """A class to represent an invalid contact query."""
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
@@ -0,0 +1,229 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional, Set, Tuple
+
+from birthday_index import clamp_day, parse_birthday
+from book_exceptions import QueryException
+from fields.field import normalize_phone
+from fields.record import Record
+from record_index import INDEXED_FIELDS, normalize
+from trigram_index import SEARCH_FIELDS, field_value
+
+QUERY_OPERATORS = {"=": "equals", "^": "starts with", "~": "contains", ":": "birthday between"}
+TERM_PATTERN = re.compile(r"^\s*(\w+)\s*([=^~:])\s*(.*?)\s*$")
+DAY_RANGE_PATTERN = re.compile(r"^(\d{1,2})\.(\d{1,2})\s*-\s*(\d{1,2})\.(\d{1,2})$")
+# The number of candidates of a conjunction small enough to check them on the records right away.
+FEW_CANDIDATES = 100
+
+
+class Predicate(ABC):
+    """A condition on the contacts of an address book."""
+
+    @abstractmethod
+    def matches(self, record: Record) -> bool:
+        """Check if the record satisfies the condition."""
+        ...
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Return the upper bound of the number of candidates an index gives, or None if no index can answer."""
+        return None
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Return the names of the records which may satisfy the condition, a superset of the matching ones."""
+        raise QueryException(f"No index can answer {self}")
+
+
+class FieldPredicate(Predicate):
+    """A condition on the value of a single contact field."""
+    operator = ""
+
+    def __init__(self, field: str, value: str) -> None:
+        if field not in SEARCH_FIELDS:
+            raise QueryException(f"Invalid query field: {field}")
+        if field == "phone":
+            # Phones are stored as digits, so the value is compared the same way.
+            value = normalize_phone(value)
+        if not value:
+            raise QueryException(f"Missing value for the field {field}")
+        self.field = field
+        self.value = value
+
+    def __str__(self) -> str:
+        return f"{self.field} {self.operator} {self.value}"
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Estimate the candidates by the shortest trigram posting of the value."""
+        return book._trigram_index(self.field).estimate(self.field, self.value)
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Return the names of the records having every trigram of the value."""
+        return book._trigram_index(self.field).candidates(self.field, self.value)
+
+
+class Equals(FieldPredicate):
+    """The field equals the value; phones are compared by digits and the other fields ignoring the case."""
+    operator = "="
+
+    def matches(self, record: Record) -> bool:
+        """Check if the normalized field of the record equals the normalized value."""
+        value = field_value(record, self.field)
+        if self.field in INDEXED_FIELDS:
+            return value is not None and normalize(self.field, value) == normalize(self.field, self.value)
+        return value is not None and value.lower() == self.value.lower()
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Use the exact-match index for the fields which have one, the trigram index otherwise."""
+        if self.field in INDEXED_FIELDS:
+            return book._field_index(self.field).count(self.field, self.value)
+        return super().estimate(book)
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Look the value up in the exact-match index, or collect the candidates from the trigram index."""
+        if self.field in INDEXED_FIELDS:
+            return book._field_index(self.field).lookup(self.field, self.value)
+        return super().candidates(book)
+
+
+class Prefix(FieldPredicate):
+    """The field starts with the value, ignoring the case."""
+    operator = "^"
+
+    def matches(self, record: Record) -> bool:
+        """Check if the field of the record starts with the value; phones are compared by digits."""
+        value = field_value(record, self.field)
+        if self.field == "phone":
+            return value is not None and value.startswith(self.value)
+        return value is not None and value.lower().startswith(self.value.lower())
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Count the phones with the prefix in the phone index, use the trigram index for the other fields."""
+        if self.field == "phone":
+            return book._phone_index().count_starting_with(self.value)
+        return super().estimate(book)
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Return the contacts whose phone has the prefix from the phone index, or the trigram candidates."""
+        if self.field == "phone":
+            return book._phone_index().starting_with(self.value)
+        return super().candidates(book)
+
+
+class Contains(FieldPredicate):
+    """The field contains the value, ignoring the case."""
+    operator = "~"
+
+    def matches(self, record: Record) -> bool:
+        """Check if the field of the record contains the value."""
+        value = field_value(record, self.field)
+        return value is not None and self.value.lower() in value.lower()
+
+
+class BirthdayBetween(Predicate):
+    """The birthday falls between two (month, day) bounds, inclusive and wrapping across the year end."""
+
+    def __init__(self, start: Tuple[int, int], end: Tuple[int, int]) -> None:
+        self.start = start
+        self.end = end
+
+    def __str__(self) -> str:
+        return f"birthday : {self.start[1]:02d}.{self.start[0]:02d}-{self.end[1]:02d}.{self.end[0]:02d}"
+
+    def matches(self, record: Record) -> bool:
+        """Check if the month and day of the record's birthday are within the bounds."""
+        day = parse_birthday(field_value(record, "birthday"))
+        if day is None:
+            return False
+        if self.start <= self.end:
+            return self.start <= day <= self.end
+        return day >= self.start or day <= self.end
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Count the contacts within the bounds in the birthday index."""
+        return book._birthday_index().count_between(self.start, self.end)
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Return the contacts within the bounds from the birthday index."""
+        return book._birthday_index().between(self.start, self.end)
+
+
+class And(Predicate):
+    """All of the conditions hold."""
+
+    def __init__(self, *predicates: Predicate) -> None:
+        self.predicates = predicates
+
+    def __str__(self) -> str:
+        return " and ".join(map(str, self.predicates))
+
+    def matches(self, record: Record) -> bool:
+        """Check if the record satisfies every condition."""
+        return all(predicate.matches(record) for predicate in self.predicates)
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """The candidates of the most selective indexed condition are enough, so its estimate is the estimate."""
+        estimates = [estimate for predicate in self.predicates if (estimate := predicate.estimate(book)) is not None]
+        return min(estimates) if estimates else None
+
+    def candidates(self, book: "AddressBook") -> Iterable[str]:
+        """Return the candidates of the most selective indexed condition, narrowed by the next ones while many remain.
+
+        Intersecting name sets is much cheaper than checking the records, but not worth it for a few candidates.
+        """
+        indexed = sorted((estimate, index) for index, predicate in enumerate(self.predicates)
+                         if (estimate := predicate.estimate(book)) is not None)
+        names = set(self.predicates[indexed[0][1]].candidates(book))
+        for _, index in indexed[1:]:
+            if len(names) <= FEW_CANDIDATES:
+                break
+            names.intersection_update(self.predicates[index].candidates(book))
+        return names
+
+
+class Or(Predicate):
+    """At least one of the conditions holds."""
+
+    def __init__(self, *predicates: Predicate) -> None:
+        self.predicates = predicates
+
+    def __str__(self) -> str:
+        return " or ".join(map(str, self.predicates))
+
+    def matches(self, record: Record) -> bool:
+        """Check if the record satisfies any condition."""
+        return any(predicate.matches(record) for predicate in self.predicates)
+
+    def estimate(self, book: "AddressBook") -> Optional[int]:
+        """Every condition needs an index, otherwise the whole book has to be scanned anyway."""
+        estimates = [predicate.estimate(book) for predicate in self.predicates]
+        return None if None in estimates else sum(estimates)
+
+    def candidates(self, book: "AddressBook") -> Set[str]:
+        """Return the union of the candidates of all conditions."""
+        names: Set[str] = set()
+        for predicate in self.predicates:
+            names.update(predicate.candidates(book))
+        return names
+
+
+def parse_term(term: str) -> Predicate:
+    """Parse a single `field<operator>value` condition."""
+    match = TERM_PATTERN.match(term)
+    if not match:
+        raise QueryException(f"Invalid condition: '{term}'. Expected field, one of {' '.join(QUERY_OPERATORS)} and value.")
+    field, operator, value = match.group(1).lower(), match.group(2), match.group(3)
+    if operator == ":":
+        days = DAY_RANGE_PATTERN.match(value)
+        if field != "birthday" or not days:
+            raise QueryException(f"Invalid range: '{term}'. Expected birthday:DD.MM-DD.MM.")
+        start_day, start_month, end_day, end_month = map(int, days.groups())
+        return BirthdayBetween(clamp_day(start_month, start_day), clamp_day(end_month, end_day))
+    return {"=": Equals, "^": Prefix, "~": Contains}[operator](field, value)
+
+
+def parse_query(text: str) -> Predicate:
+    """Parse conditions joined by `and` and `or`, where `and` binds tighter, e.g. `name^jo and birthday:01.03-31.03`."""
+    alternatives = []
+    for alternative in re.split(r"\s+or\s+", text.strip(), flags=re.IGNORECASE):
+        terms = [parse_term(term) for term in re.split(r"\s+and\s+", alternative, flags=re.IGNORECASE)]
+        alternatives.append(terms[0] if len(terms) == 1 else And(*terms))
+    return alternatives[0] if len(alternatives) == 1 else Or(*alternatives)
@@ -1,51 +1,118 @@
 import re
+import sys
+import weakref
+from calendar import monthrange
+from typing import ClassVar
 from field_exceptions import FieldException
 from prompt_toolkit.validation import Validator, ValidationError
 
+# Compiled once, so validating a field does not look the pattern up in the regex cache every time.
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+DATE_PATTERN = re.compile(r'^(\d{2})\.(\d{2})\.(\d{4})$')
+# Spaces, dashes, dots, parentheses and the leading plus people write phone numbers with; a plus elsewhere is kept,
+# so such numbers fail the validation.
+PHONE_SEPARATORS = re.compile(r'^\s*\+|[\s().-]')
+
+
+def normalize_phone(value: str) -> str:
+    """Strip the separators from a phone number, so every way of writing it is stored and searched as the same digits."""
+    return value if value.isdigit() else PHONE_SEPARATORS.sub('', value)
+
+
 class Field:
     """Base class for all fields."""
+    __slots__ = ("value",)
+
     def __init__(self, value: str) -> None:
         self.value = value
 
     def __str__(self) -> str:
         return str(self.value)
 
+    @classmethod
+    def trusted(cls, value: str) -> "Field":
+        """Create the field from a value which was already validated, skipping the validation."""
+        field = object.__new__(cls)
+        field.value = value
+        return field
+
+
+class SharedField(Field):
+    """A field whose values repeat across contacts, so all fields of an equal value share one instance.
+
+    Fields are never changed in place, a record replaces the whole field instead, so sharing them is safe.
+    """
+    __slots__ = ("__weakref__",)
+    _instances: ClassVar["weakref.WeakValueDictionary[str, SharedField]"]
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, value: str) -> "SharedField":
+        return cls._instances.get(value) or super().__new__(cls)
+
+    def __init__(self, value: str) -> None:
+        super().__init__(sys.intern(value))
+        self._instances[self.value] = self
+
+    @classmethod
+    def trusted(cls, value: str) -> "SharedField":
+        """Return the shared field of the value, creating it without validation if there is none yet."""
+        if field := cls._instances.get(value):
+            return field
+        field = super().trusted(sys.intern(value))
+        cls._instances[field.value] = field
+        return field
+
 
-class Address(Field):
+class Address(SharedField):
     """A class to represent an address."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         super().__init__(value)
 
 
-class Birthday(Field):
+class Birthday(SharedField):
     """A class to represent a birthday."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
-        DateValidator().validate(value)
+        DATE_VALIDATOR.validate(value)
         super().__init__(value)
 
 
 class Email(Field):
     """A class to represent an email."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
-        EmailValidator().validate(value)
+        EMAIL_VALIDATOR.validate(value)
         super().__init__(value)
 
 
 class Name(Field):
     """A class to represent a name."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         super().__init__(value)
 
 
 class Phone(Field):
     """A class to represent a phone number."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
-        PhoneValidator().validate(value)
-        super().__init__(value)
+        PHONE_VALIDATOR.validate(value)
+        super().__init__(normalize_phone(value))
 
 
-class Tag(Field):
+class Tag(SharedField):
     """A class to represent a tag."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         super().__init__(value)
 
@@ -55,6 +122,8 @@ class Tag(Field):
         
 class Text(Field):
     """A class to represent a text."""
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         if not self._has_valid_length(value):
             raise FieldException("Text must be between 0 and 512 characters long.")
@@ -70,8 +139,9 @@ class PhoneValidator(Validator):
         if not isinstance(data, str):
             text = data.text
 
+        text = normalize_phone(text)
         if text and not text.isdigit():
-            raise ValidationError(message='Phone can contain only digits')
+            raise ValidationError(message='Phone can contain only digits, spaces, dashes, dots, parentheses and a plus')
         if len(text) < 3:
             raise ValidationError(message='Phone min len is 3')
         
@@ -83,8 +153,7 @@ class EmailValidator(Validator):
 
         if text == "":
             return
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if re.match(pattern, text) is None:
+        if EMAIL_PATTERN.match(text) is None:
             raise ValidationError(message='Invalid email format')
 
 class DateValidator(Validator):
@@ -96,18 +165,26 @@ class DateValidator(Validator):
         if text == "":
             return
 
-        pattern = r'^\d{2}\.\d{2}\.\d{4}$'
-        if re.match(pattern, text) is None:
+        match = DATE_PATTERN.match(text)
+        if match is None:
             raise ValidationError(message='Invalid date format, expected: DD.MM.YYYY')
         
-        res=text.split(".")
-        if int(res[0]) > 31:
+        day, month, year = map(int, match.groups())
+        if day > 31:
             raise ValidationError(message='Day can not be greater than 31')
-        if int(res[0]) == 0:
+        if day == 0:
             raise ValidationError(message='Day can not be 0')
-        if int(res[1]) > 12:
+        if month > 12:
             raise ValidationError(message='Month can not be greater than 31')
-        if int(res[1]) == 0:
+        if month == 0:
             raise ValidationError(message='Month can not be 0')
-        if int(res[2]) == 0:
+        if year == 0:
             raise ValidationError(message='Year can not be 0')
+        if day > monthrange(year, month)[1]:
+            raise ValidationError(message=f'Day {day} does not exist in month {month} of {year}')
+
+
+# Validators keep no state, so the fields share a single instance of each instead of creating one per value.
+PHONE_VALIDATOR = PhoneValidator()
+EMAIL_VALIDATOR = EmailValidator()
+DATE_VALIDATOR = DateValidator()
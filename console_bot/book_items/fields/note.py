@@ -1,27 +1,31 @@
-from typing import List
+from typing import List, Optional
 from field import Tag, Text
 from field_exceptions import NoteException
 
 
 class Note:
     """A note with a message and tags."""
-    _index = 0
 
-    def __init__(self, summary: str, text: str, tags: List[str] = None) -> None:
+    def __init__(self,
+                 summary: str,
+                 text: str,
+                 tags: List[str] = None,
+                 on_change: Optional[callable] = None,
+                 index: Optional[int] = None
+                 ) -> None:
         """Initialize the note with a message and tags."""
         self.summary = Text(summary)
         self.text = Text(text)
         self.tags = [Tag(tag) for tag in tags] if tags else []
-        Note._index += 1
-        self.index = Note._index
-
-    def __del__(self):
-        Note._index -= 1
+        self._on_change = on_change
+        # The id the notebook gives the note when it is added; it never changes and is saved with the note.
+        self.index = index
 
     def add_tag(self, tag: str) -> None:
         """Add a tag to the note."""
         try:
             self.tags.append(Tag(tag))
+            self._notify_change()
         except ValueError:
             raise NoteException(f"Invalid tag: {tag}")
         except MemoryError:
@@ -31,6 +35,7 @@ class Note:
         """Add tags to the note."""
         try:
             self.tags.extend([Tag(tag) for tag in tags])
+            self._notify_change()
         except ValueError:
             raise NoteException(f"Invalid tags: {tags}")
         except MemoryError:
@@ -39,14 +44,22 @@ class Note:
     def add_text(self, text: str) -> None:
         """Add text to the note."""
         self.text = Text(text)
+        self._notify_change()
 
     def add_summary(self, summary: str) -> None:
         """Add a summary to the note."""
         self.summary = Text(summary)
+        self._notify_change()
 
     def remove_tag(self, tag: str) -> None:
         """Remove a tag from the note."""
         self.tags.remove(Tag(tag))
+        self._notify_change()
+
+    def _notify_change(self) -> None:
+        """Notify the owner of the note that its data has changed."""
+        if self._on_change:
+            self._on_change(self)
 
     def to_dict(self) -> dict:
         """Convert the note to a dictionary."""
@@ -65,6 +78,7 @@ class Note:
             self.add_text(text)
         else:
             self.text = None
+            self._notify_change()
 
     def update_tags(self, tags: str) -> None:
         """Update the tags of the note."""
@@ -73,6 +87,7 @@ class Note:
             self.tags = [Tag(tag.strip()) for tag in tags]
         else:
             self.tags = []
+        self._notify_change()
 
     @classmethod
     def from_dict(cls, **kwargs) -> "Note":
@@ -1,20 +1,25 @@
 from typing import Optional
-from field import Address, Birthday, Email, Name, Phone
+from field import Address, Birthday, Email, Name, Phone, DATE_VALIDATOR, EMAIL_VALIDATOR, PHONE_VALIDATOR, normalize_phone
 from field_exceptions import RecordException
 
 
 class Record:
     """A record in the address book."""
+    # Books keep hundreds of thousands of records, so they do not carry a `__dict__` each.
+    __slots__ = ("_name", "_on_name_change", "_on_change", "phone", "birthday", "email", "address", "__weakref__")
+
     def __init__(self,
                  name: str,
                  address: str = None,
                  phone: str = None,
                  birthday: str = None,
                  email: str = None,
-                 on_name_change: Optional[callable] = None
+                 on_name_change: Optional[callable] = None,
+                 on_change: Optional[callable] = None
                  ) -> None:
         self._name: Name = Name(name)
         self._on_name_change = on_name_change
+        self._on_change = on_change
         self.phone: Optional[Phone] = Phone(phone) if phone else None
         self.birthday: Optional[Birthday] = Birthday(birthday) if birthday else None
         self.email: Optional[Email] = Email(email) if email else None
@@ -26,22 +31,26 @@ class Record:
     def add_address(self, address: str) -> None:
         """Add an address to the record."""
         self.address = Address(address)
+        self._notify_change()
 
     def add_birthday(self, birthday: str) -> None:
         """Add a birthday to the record."""
         self.birthday = Birthday(birthday)
+        self._notify_change()
 
     def add_email(self, email: str) -> None:
         """Add an email to the record."""
         self.email = Email(email)
+        self._notify_change()
 
     def add_phone(self, phone) -> None:
         """Add a phone to the record."""
         self.phone = Phone(phone)
+        self._notify_change()
 
     def find_phone(self, phone: str) -> Optional[Phone]:
         """Find a phone number in the record."""
-        if self.phone and self.phone.value == phone:
+        if self.phone and self.phone.value == normalize_phone(phone):
             return self.phone
         return None
     
@@ -57,6 +66,21 @@ class Record:
                 self._on_name_change(self._name.value, new_name.value)
             self._name = new_name
 
+    def _fill_trusted(self, data: dict) -> "Record":
+        """Set the fields from already validated values without validating them again."""
+        if not data.get("phone"):
+            raise RecordException("Phone number is required.")
+        self.phone = Phone.trusted(data["phone"])
+        self.birthday = Birthday.trusted(data["birthday"]) if data.get("birthday") else None
+        self.email = Email.trusted(data["email"]) if data.get("email") else None
+        self.address = Address.trusted(data["address"]) if data.get("address") else None
+        return self
+
+    def _notify_change(self) -> None:
+        """Notify the owner of the record that its data has changed."""
+        if self._on_change:
+            self._on_change(self)
+
     def to_dict(self):
         """Convert the record to a dictionary."""
         try:
@@ -77,6 +101,7 @@ class Record:
             self.add_address(new_address)
         else:
             self.address = None
+            self._notify_change()
 
     def update_birthday(self, new_birthday: str) -> None:
         """Update the birthday of the record."""
@@ -84,6 +109,7 @@ class Record:
             self.add_birthday(new_birthday)
         else:
             self.birthday = None
+            self._notify_change()
 
     def update_email(self, new_email: str) -> None:
         """Update the email of the record."""
@@ -91,6 +117,7 @@ class Record:
             self.add_email(new_email)
         else:
             self.email = None
+            self._notify_change()
 
     def update_name(self, new_name: str) -> None:
         """Update the name of the record."""
@@ -124,20 +151,49 @@ class Record:
         return record
 
     @classmethod
-    def from_dict(cls, data: dict, name_change_callback: Optional[callable] = None) -> "Record":
-        """Create a record from a dictionary."""
+    def from_dict(cls, data: dict, name_change_callback: Optional[callable] = None, validate: bool = True) -> "Record":
+        """Create a record from a dictionary; `validate=False` trusts data which was validated before it was saved."""
         if name := data.get("name"):
             record = cls(name, on_name_change=name_change_callback)
         else:
             raise RecordException("Name is required.")
+        if validate:
+            data = cls._validate_dict(data)
+        return record._fill_trusted(data)
+
+    @classmethod
+    def trusted(cls,
+                name: str,
+                phone: str,
+                birthday: str = None,
+                email: str = None,
+                address: str = None,
+                on_name_change: Optional[callable] = None,
+                on_change: Optional[callable] = None
+                ) -> "Record":
+        """Create a record from values which were validated before they were saved, validating none of them."""
+        if not name:
+            raise RecordException("Name is required.")
+        if not phone:
+            raise RecordException("Phone number is required.")
+        record = object.__new__(cls)
+        record._name = Name.trusted(name)
+        record._on_name_change = on_name_change
+        record._on_change = on_change
+        record.phone = Phone.trusted(phone)
+        record.birthday = Birthday.trusted(birthday) if birthday else None
+        record.email = Email.trusted(email) if email else None
+        record.address = Address.trusted(address) if address else None
+        return record
+
+    @staticmethod
+    def _validate_dict(data: dict) -> dict:
+        """Check every field of the dictionary in one pass, before any field is created, and normalize the phone."""
         if birthday := data.get("birthday"):
-            record.add_birthday(birthday)
-        if phone := data.get("phone"):
-            record.add_phone(phone)
-        else:
+            DATE_VALIDATOR.validate(birthday)
+        if not (phone := data.get("phone")):
             raise RecordException("Phone number is required.")
+        PHONE_VALIDATOR.validate(phone)
         if email := data.get("email"):
-            record.add_email(email)
-        if address := data.get("address"):
-            record.add_address(address)
-        return record
+            EMAIL_VALIDATOR.validate(email)
+        return data if phone.isdigit() else {**data, "phone": normalize_phone(phone)}
@@ -0,0 +1,235 @@
+import threading
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+MAX_EDIT_DISTANCE = 2
+CLOSEST_NAMES_LIMIT = 5
+# Books with fewer names build the tree at once, larger ones build it in the background.
+BACKGROUND_BUILD_SIZE = 5000
+# The number of names compared one by one while the tree is being built, so a lookup takes a fraction of a second.
+SCAN_LIMIT = 20000
+# The share of emptied nodes at which the tree is built again without them.
+REBUILD_EMPTY_SHARE = 0.75
+
+
+def pattern_masks(pattern: str) -> Dict[str, int]:
+    """Return the bit mask of the positions of every character of the pattern."""
+    masks: Dict[str, int] = {}
+    for position, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | 1 << position
+    return masks
+
+
+def distance_to(pattern: str, masks: Dict[str, int], text: str) -> int:
+    """Return the Levenshtein distance between the pattern and the text.
+
+    Myers' bit-parallel algorithm keeps a whole column of the distance matrix in the bits of two integers,
+    so the text is walked once instead of filling the matrix cell by cell.
+    """
+    if not pattern:
+        return len(text)
+    all_ones = (1 << len(pattern)) - 1
+    last_bit = 1 << (len(pattern) - 1)
+    positive, negative, score = all_ones, 0, len(pattern)
+    for char in text:
+        equal = masks.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last_bit:
+            score += 1
+        elif horizontal_negative & last_bit:
+            score -= 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & all_ones
+        negative = horizontal_positive & vertical & all_ones
+    return score
+
+
+def edit_distance(first: str, second: str) -> int:
+    """Return the Levenshtein distance between two strings."""
+    return distance_to(first, pattern_masks(first), second)
+
+
+def scan_closest(name: str,
+                 names: Iterable[str],
+                 limit: int = CLOSEST_NAMES_LIMIT,
+                 max_distance: int = MAX_EDIT_DISTANCE,
+                 scan_limit: int = SCAN_LIMIT
+                 ) -> List[str]:
+    """Return up to `limit` names closest to the name ignoring the case, comparing the first `scan_limit` names."""
+    query = name.lower()
+    masks = pattern_masks(query)
+    found: List[Tuple[int, str]] = []
+    for other in islice(names, scan_limit):
+        # The distance is at least the difference of the lengths, so most names are skipped without computing it.
+        if abs(len(other) - len(query)) <= max_distance:
+            distance = distance_to(query, masks, other.lower())
+            if distance <= max_distance:
+                found.append((distance, other))
+    return [other for _, other in sorted(found)[:limit]]
+
+
+class _Node:
+    """A node of the BK-tree holding the names which are equal after lowercasing."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.names: Set[str] = set()
+        self.children: Dict[int, "_Node"] = {}
+
+
+class FuzzyIndex:
+    """A BK-tree over the lowercased contact names finding the names within an edit distance of a query.
+
+    The triangle inequality lets a lookup skip every subtree whose distance to its parent is out of range,
+    so a typo is resolved by visiting a small part of the tree. The tree is built on its first lookup, in a
+    background thread for large books; the names changed meanwhile are applied to it once it is ready.
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[_Node] = None
+        self._nodes: Optional[Dict[str, _Node]] = None
+        self._names_count = 0
+        self._lock = threading.RLock()
+        # The tree being built in the background and the (added, name) changes to apply to it once it is ready.
+        self._pending: Optional["FuzzyIndex"] = None
+        self._pending_changes: List[Tuple[bool, str]] = []
+
+    def is_built(self) -> bool:
+        """Check if the tree has been built."""
+        return self._nodes is not None
+
+    def is_building(self) -> bool:
+        """Check if the tree is being built in the background."""
+        return self._pending is not None
+
+    def build(self, names: Iterable[str]) -> None:
+        """Build the tree from the names of all contacts."""
+        with self._lock:
+            self._pending = None
+            self._root = None
+            self._nodes = {}
+            self._names_count = 0
+            for name in names:
+                self._insert(name)
+
+    def build_in_background(self, names: List[str]) -> None:
+        """Build the tree from the names of all contacts in a thread, keeping the current tree until it is ready."""
+        with self._lock:
+            if self._pending is not None:
+                return
+            if len(names) < BACKGROUND_BUILD_SIZE:
+                self.build(names)
+                return
+            self._pending = pending = FuzzyIndex()
+            self._pending_changes = []
+        threading.Thread(target=self._finish_build, args=(pending, names), name="fuzzy-index-build", daemon=True).start()
+
+    def clear(self) -> None:
+        """Drop the tree, so it is built again on its next lookup."""
+        with self._lock:
+            self._root = None
+            self._nodes = None
+            self._names_count = 0
+            self._pending = None
+            self._pending_changes = []
+
+    def add(self, name: str) -> None:
+        """Add a contact name to the tree."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending_changes.append((True, name))
+            if self._nodes is not None:
+                self._insert(name)
+
+    def remove(self, name: str) -> None:
+        """Remove a contact name from the tree."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending_changes.append((False, name))
+            if self._nodes is None:
+                return
+            node = self._nodes.get(name.lower())
+            if node is None or name not in node.names:
+                return
+            # BK-trees can not unlink a node, so an emptied node stays in the tree to route lookups.
+            node.names.discard(name)
+            self._names_count -= 1
+            if self._names_count < len(self._nodes) * (1 - REBUILD_EMPTY_SHARE):
+                self.build_in_background([name for node in self._nodes.values() for name in node.names])
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Replace the old name of a contact with its new one."""
+        self.remove(old_name)
+        self.add(new_name)
+
+    def closest(self,
+                name: str,
+                limit: int = CLOSEST_NAMES_LIMIT,
+                max_distance: int = MAX_EDIT_DISTANCE
+                ) -> List[str]:
+        """Return up to `limit` names closest to the name ignoring the case, the closest first."""
+        with self._lock:
+            return self._closest(name, limit, max_distance)
+
+    def _closest(self, name: str, limit: int, max_distance: int) -> List[str]:
+        """Look the name up in the tree."""
+        if self._root is None:
+            return []
+        query = name.lower()
+        masks = pattern_masks(query)
+        found: List[Tuple[int, str]] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = distance_to(query, masks, node.key)
+            if distance <= max_distance:
+                found.extend((distance, name) for name in node.names)
+            for child_distance, child in node.children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return [name for _, name in sorted(found)[:limit]]
+
+    def _finish_build(self, pending: "FuzzyIndex", names: List[str]) -> None:
+        """Build the pending tree and take it over with the changes made while it was built."""
+        pending.build(names)
+        with self._lock:
+            if self._pending is not pending:
+                # The index was cleared or built again meanwhile.
+                return
+            for added, name in self._pending_changes:
+                if added:
+                    pending.add(name)
+                else:
+                    pending.remove(name)
+            self._root, self._nodes, self._names_count = pending._root, pending._nodes, pending._names_count
+            self._pending = None
+            self._pending_changes = []
+
+    def _insert(self, name: str) -> None:
+        """Put the name into the node of its lowercased key, creating the node if needed."""
+        key = name.lower()
+        if node := self._nodes.get(key):
+            if name not in node.names:
+                node.names.add(name)
+                self._names_count += 1
+            return
+        new_node = _Node(key)
+        new_node.names.add(name)
+        self._nodes[key] = new_node
+        self._names_count += 1
+        if self._root is None:
+            self._root = new_node
+            return
+        masks = pattern_masks(key)
+        node = self._root
+        while True:
+            distance = distance_to(key, masks, node.key)
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = new_node
+                return
+            node = child
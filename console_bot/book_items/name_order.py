@@ -0,0 +1,51 @@
+from typing import Iterable, List, Optional
+
+
+class NameOrder:
+    """The names of the contacts in the order they were added, so a page of them is a slice of a list.
+
+    Only adding a contact is as cheap as appending to the list; deleting or renaming one moves the names
+    after it, which is still far cheaper than walking the book from its start for every page.
+    The order is built on its first use, so loading a book does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._names: Optional[List[str]] = None
+
+    def is_built(self) -> bool:
+        """Check if the order has been built."""
+        return self._names is not None
+
+    def build(self, names: Iterable[str]) -> None:
+        """Build the order from the names of all contacts in the order of the book."""
+        self._names = list(names)
+
+    def clear(self) -> None:
+        """Drop the order, so it is built again on its next use."""
+        self._names = None
+
+    def extend(self, names: Iterable[str]) -> None:
+        """Put the names of new contacts after all others."""
+        if self._names is not None:
+            self._names.extend(names)
+
+    def remove(self, name: str) -> None:
+        """Drop the contact with the name from the order."""
+        if self._names is None:
+            return
+        try:
+            self._names.remove(name)
+        except ValueError:
+            pass
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Move a renamed contact after all others, where the book puts its new key, unless the name was taken."""
+        if self._names is None:
+            return
+        self.remove(old_name)
+        if new_name not in self._names:
+            self._names.append(new_name)
+
+    def slice(self, offset: int, count: int) -> List[str]:
+        """Return the names of `count` contacts from the offset on."""
+        return self._names[offset:offset + count]
@@ -1,203 +1,474 @@
+import threading
 from abc import ABC, abstractmethod
-from collections import UserList
-from typing import List, Optional
+from bisect import bisect_left, insort
+from collections import UserDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from fields import Note, Tag
 from book_exceptions import NoteBookException
 from fields.field_exceptions import NoteException
+from note_index import NOTE_FIELDS, NoteIndex
+from pagination import DEFAULT_PAGE_SIZE, Page, check_page
+from prefix_index import COMPLETIONS_LIMIT, PrefixIndex
+from tag_index import TagIndex, parse_tags
 
 
 class SortStrategy(ABC):
     """A class to represent a sort strategy."""
     @abstractmethod
-    def sort(self, data):
+    def key(self, note: Note) -> Tuple:
+        """Return the key the note is sorted by."""
         ...
 
+    def sort(self, data):
+        # The ids break the ties, so notes with equal keys keep the order they were added in.
+        return sorted(data, key=lambda note: (self.key(note), note.index))
+
 
 class IndexSortStrategy(SortStrategy):
     """A class to represent a sort strategy by index."""
-    def sort(self, data):
-        return sorted(data, key=lambda note: note.index)
+    def key(self, note: Note) -> Tuple:
+        return (note.index,)
 
 
 class TextSortStrategy(SortStrategy):
     """A class to represent a sort strategy by text."""
-    def sort(self, data):
-        return sorted(data, key=lambda note: note.text.value)
+    def key(self, note: Note) -> Tuple:
+        return (note.text.value if note.text and note.text.value else "",)
 
 
 class TagSortStrategy(SortStrategy):
-    """A class to represent a sort strategy by tag."""
-    def sort(self, data):
-        data_to_sort = [note for note in data if note.tags]
-        data_not_to_sort = [note for note in data if not note.tags]
-        try:
-            sorted_data = sorted(data_to_sort, key=lambda note: note.tags[0].value)
-            return sorted_data + data_not_to_sort
-        except IndexError:
-            return data
+    """A class to represent a sort strategy by tag, the notes without tags going last."""
+    def key(self, note: Note) -> Tuple:
+        return (0, note.tags[0].value) if note.tags else (1, "")
 
 
 class NoteSorter:
-    """A class to represent a note sorter."""
+    """A sorted view of the notes by the key of a strategy, kept up to date as the notes change.
+
+    The view is a sorted list of (key, id) entries maintained by bisection, so listing the notes in order
+    reads a slice of it and the notebook itself is never reordered.
+    The view is built on its first use, so loading a notebook does not pay for it.
+    """
     def __init__(self, strategy: SortStrategy) -> None:
         self.strategy = strategy
+        self._entries: Optional[List[Tuple[Tuple, int]]] = None
+        # The key every note is sorted by, so its entry can be found once the note has already changed.
+        self._keys: Dict[int, Tuple] = {}
 
-    def sort(self, data, order="asc"):
-        """Sort the notes."""
+    def is_built(self) -> bool:
+        """Check if the view has been built."""
+        return self._entries is not None
+
+    def build(self, notes: Iterable[Note]) -> None:
+        """Build the view from all notes of the notebook."""
         try:
-            sorted_data = self.strategy.sort(data)
-            if order == "desc" and (isinstance(self.strategy, IndexSortStrategy) or isinstance(self.strategy, TextSortStrategy)):
-                sorted_data.reverse()
-            elif order == "desc" and isinstance(self.strategy, TagSortStrategy):
-                try:
-                    sorted_data = sorted_data[::-1]
-                except (TypeError, IndexError) as ex:
-                    raise NoteBookException(f"Invalid data to sort: {data}")
-            return sorted_data
+            self._keys = {note.index: self.strategy.key(note) for note in notes}
         except AttributeError as ex:
             raise NoteBookException(f"Invalid sort strategy: {self.strategy}")
+        self._entries = sorted((key, index) for index, key in self._keys.items())
+
+    def clear(self) -> None:
+        """Drop the view, so it is built again on its next use."""
+        self._entries = None
+        self._keys = {}
 
+    def add(self, note: Note) -> None:
+        """Put the note into the view replacing its entry from before it changed."""
+        if self._entries is None:
+            return
+        self.remove(note)
+        key = self.strategy.key(note)
+        self._keys[note.index] = key
+        insort(self._entries, (key, note.index))
 
-class NoteBook(UserList):
-    """A class to represent a notebook."""
+    def remove(self, note: Note) -> None:
+        """Drop the note from the view."""
+        if self._entries is None or note.index not in self._keys:
+            return
+        entry = (self._keys.pop(note.index), note.index)
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def ids(self, offset: int = 0, count: Optional[int] = None, order: str = "asc") -> List[int]:
+        """Return the ids of `count` notes from the offset on in the order, all the rest if `count` is None."""
+        total = len(self._entries)
+        end = total if count is None else min(total, offset + count)
+        if order == "desc":
+            return [self._entries[total - 1 - position][1] for position in range(offset, end)]
+        return [index for _, index in self._entries[offset:end]]
+
+
+class NoteBook(UserDict):
+    """A class to represent a notebook, mapping the ids of the notes to them in the notebook order."""
     def __init__(self) -> None:
-        self.data = []
+        self.data = {}
         super().__init__()
+        # The ids of the notes changed and deleted since the last save.
+        self._changed_ids: Set[int] = set()
+        self._deleted_ids: Set[int] = set()
+        # The autosave thread serializes the notebook while the user keeps editing it, so every change of the
+        # notes and every serialization of them holds this lock.
+        self._lock = threading.RLock()
+        # Ids are never reused, so a deleted note's id does not point to another note; the storages save this
+        # counter, so it outlives the session as well.
+        self._next_index = 1
+        self._text_index = NoteIndex()
+        self._tag_index = TagIndex()
+        self._summaries = PrefixIndex()
+        self._tag_names = PrefixIndex()
+        self._sorters = {
+            "index": NoteSorter(IndexSortStrategy()),
+            "text": NoteSorter(TextSortStrategy()),
+            "tag": NoteSorter(TagSortStrategy()),
+        }
 
-    def _sort(self, by: str, order: str = "asc") -> None:
-        """Sort the notes."""
-        if by == "index":
-            strategy = IndexSortStrategy()
-        elif by == "text":
-            strategy = TextSortStrategy()
-        elif by in ["tag", "tags"]:
-            strategy = TagSortStrategy()
-        else:
+    def _sorter(self, by: str, build: bool = True) -> NoteSorter:
+        """Return the sorted view of the notes by the attribute, building it on first use unless `build` is False."""
+        sorter = self._sorters.get("tag" if by == "tags" else by)
+        if sorter is None:
             raise ValueError(f"Invalid sort attribute: {by}")
+        if build and not sorter.is_built():
+            sorter.build(self.data.values())
+        return sorter
 
-        sorter = NoteSorter(strategy)
-        self.data = sorter.sort(self.data, order)
-
-    def add_note(self, **kwargs) -> None:
-        """Add a note."""
+    def add_note(self, **kwargs) -> Note:
+        """Add a note and return it with its id set."""
         note = Note.from_dict(summary=kwargs.get("summary"), text=kwargs.get("text"), tags=kwargs.get("tags"))
-        self.data.append(note)
+        with self._lock:
+            self._add(note)
+            self._mark_changed(note.index)
+            return note
 
     def add_tags_to_note(self, index: int, tags: List[str]) -> bool:
         """Add tags to a note."""
-        try:
-            self.data[index].tags.extend([Tag(tag) for tag in tags])
-            return True
-        except IndexError:
-            return False
+        with self._lock:
+            try:
+                self.data[index].tags.extend([Tag(tag) for tag in tags])
+                self._index_note(self.data[index])
+                self._mark_changed(index)
+                return True
+            except KeyError:
+                return False
 
     def change_text(self, new_text: str, idx: int = None) -> None:
-        """Change the text of a note."""
-        if not idx:
-            idx = len(self.data) - 1
-        self.data[idx].text.value = new_text
+        """Change the text of a note, the last added one by default."""
+        with self._lock:
+            if not idx:
+                if not self.data:
+                    raise NoteBookException("The notebook is empty, there is no note to change.")
+                idx = next(reversed(self.data))
+            self.data[idx].text.value = new_text
+            self._index_note(self.data[idx])
+            self._mark_changed(idx)
 
     def delete_note(self, idx: int = None) -> bool:
-        """Delete a note."""
-        try:
-            if note := self.data.pop(idx - 1):
+        """Delete a note by its id."""
+        with self._lock:
+            if note := self.data.pop(idx, None):
+                self._unindex_note(note)
+                self._mark_deleted(idx)
                 return True
             return False
-        except IndexError:
-            return False
 
     def delete_tags_from_note(self, index, *tags) -> bool:
         """Delete tags from a note."""
-        try:
-            for tag in tags:
-                self.data[index].tags.remove(Tag(tag))
-            return True
-        except IndexError:
-            return False
+        with self._lock:
+            try:
+                for tag in tags:
+                    self.data[index].tags.remove(Tag(tag))
+                self._index_note(self.data[index])
+                self._mark_changed(index)
+                return True
+            except KeyError:
+                return False
 
-    def delete_by_tag(self, tag: str) -> None:
-        """Delete notes by tag."""
-        self.data = [note for note in self.data if tag not in note.tags]
+    def delete_by_tag(self, tag: str) -> int:
+        """Delete the notes having the tag and return their number."""
+        with self._lock:
+            deleted = self._tags().having(tag)
+            for note in deleted:
+                del self.data[note.index]
+                self._unindex_note(note)
+                self._mark_deleted(note.index)
+            return len(deleted)
 
     def get_all_notes(self, sorted_by: str = None, order: str = "asc") -> List[Note]:
-        """Return all notes."""
+        """Return all notes, in the notebook order or sorted if `sorted_by` is given."""
         if not self.data:
             return []
         if sorted_by:
-            self._sort(sorted_by, order)
-        return self.data
+            return [self.data[index] for index in self._sorter(sorted_by).ids(order=order)]
+        return list(self.data.values())
+
+    def get_note(self, index: int) -> Optional[Note]:
+        """Return the note with the id."""
+        return self.data.get(index)
+
+    def get_page(self,
+                 offset: int = 0,
+                 page_size: int = DEFAULT_PAGE_SIZE,
+                 sorted_by: str = None,
+                 order: str = "asc"
+                 ) -> Page[Note]:
+        """Return a page of the notes, read from the sorted view if `sorted_by` is given."""
+        check_page(offset, page_size)
+        if sorted_by:
+            notes = [self.data[index] for index in self._sorter(sorted_by).ids(offset, page_size, order)]
+        else:
+            notes = list(islice(self.data.values(), offset, offset + page_size))
+        return Page(notes, offset, page_size, len(self.data))
 
     def new_note(self, *data) -> None:
         """Add a new note."""
-        try:
-            self.data.append(Note.from_tuple(*data))
-        except TypeError as ex:
-            raise NoteException(f"Invalid data for Note: {data}")
-        except MemoryError as ex:
-            raise MemoryError(f"Memory is full. Unable to create a new note from data: {data}")
+        with self._lock:
+            try:
+                note = Note.from_tuple(*data)
+                self._add(note)
+                self._mark_changed(note.index)
+            except TypeError as ex:
+                raise NoteException(f"Invalid data for Note: {data}")
+            except MemoryError as ex:
+                raise MemoryError(f"Memory is full. Unable to create a new note from data: {data}")
 
     def search(self, by: str, query: str, sorted_by: str, order: str) -> List[Note]:
-        """Search for a note."""
-        if sorted_by and order:
-            self._sort(sorted_by, order)
+        """Search for a note, sorting only the found notes if `sorted_by` and `order` are given."""
         if by in ["tag", "tags"]:
-            return self.search_by_tag(query)
+            result = self.search_by_tags(*parse_tags(query))
         elif by == "text":
-            return self.search_note(query)
+            result = self.search_note(query)
         elif by == "index":
-            return self.search_by_index(int(query))
+            # Only a number can be the id of a note.
+            result = self.search_by_index(int(query)) if query.strip().isdigit() else []
         elif by == "summary":
-            return self.search_by_summary(query)
+            result = self.search_by_summary(query)
+        elif by == "content":
+            result = self.search_text(query)
         else:
             raise ValueError(f"Invalid search attribute: {by}")
+        if sorted_by and order:
+            # Only the found notes are sorted by the key, so the sorted view of the whole notebook is not built.
+            result = self._sorter(sorted_by, build=False).strategy.sort(result)
+            if order == "desc":
+                result.reverse()
+        return result
         
     def search_by_index(self, index: int) -> list:
         """Search for a note by index."""
-        return [note for note in self.data if note.index == index]
+        note = self.get_note(index)
+        return [note] if note else []
     
     def search_by_summary(self, summary: str) -> list:
-        """Search for a note by summary."""
-        return [note for note in self.data if summary in note.summary.value]
+        """Search for a note by the words of its summary, the most relevant first."""
+        return self.search_text(summary, fields=("summary",))
 
     def search_note(self, query: str) -> list:
-        """Search for a note by text."""
-        return [note for note in self.data if query in note.text.value]
+        """Search for a note by the words of its text, the most relevant first."""
+        return self.search_text(query, fields=("text",))
+
+    def search_text(self, query: str, fields: Sequence[str] = NOTE_FIELDS) -> List[Note]:
+        """Search for the notes having the words of the query, joined by `and` and `or`, ranked by BM25."""
+        if not self._text_index.is_built():
+            self._text_index.build(self.data.values())
+        return self._text_index.search(query, fields)
 
     def search_by_tag(self, tag: str) -> list:
         """Search for a note by tag."""
-        res = []
-        for note in self.data:
-            note_tags = [t.value for t in note.tags]
-            if tag in note_tags:
-                try:
-                    res.append(note)
-                except TypeError as ex:
-                    raise NoteException(f"Invalid note: {note}. Unable to add to search results.")
-                except MemoryError as ex:
-                    raise MemoryError(f"Memory is full. Unable to add note: {note} to search results.")
-        return res
+        return self._tags().having(tag)
+
+    def search_by_tags(self, tags: Iterable[str], match_all: bool = True) -> List[Note]:
+        """Search for the notes having all of the tags, or any of them if `match_all` is false."""
+        return self._tags().having_all(tags) if match_all else self._tags().having_any(tags)
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Return the number of notes having every tag, the most used tags first."""
+        return self._tags().counts()
+
+    def pop_changes(self) -> Tuple[List[dict], List[int]]:
+        """Return the notes changed and the ids of the notes deleted since the last call.
+
+        The changes are forgotten only once all changed notes have been converted, so a failed
+        conversion leaves them for the next save.
+        """
+        with self._lock:
+            changed = [{"id": index, **self.data[index].to_dict()} for index in sorted(self._changed_ids) if index in self.data]
+            deleted = list(self._deleted_ids)
+            self._changed_ids, self._deleted_ids = set(), set()
+        return changed, deleted
+
+    @property
+    def next_index(self) -> int:
+        """The id the next added note gets."""
+        return self._next_index
+
+    @next_index.setter
+    def next_index(self, index: int) -> None:
+        """Give the next added notes ids from the index on; the counter never goes back."""
+        with self._lock:
+            self._next_index = max(self._next_index, index)
+
+    def restore_changes(self, changed: List[dict], deleted: List[int]) -> None:
+        """Give back the changes returned by `pop_changes` which could not be saved, so the next save retries them.
+
+        A note changed again meanwhile keeps its newer change.
+        """
+        with self._lock:
+            for note in changed:
+                if note["id"] not in self._deleted_ids:
+                    self._changed_ids.add(note["id"])
+            for index in deleted:
+                if index not in self._changed_ids:
+                    self._deleted_ids.add(index)
+
+    def has_changes(self) -> bool:
+        """Check if the notebook has changed since the last call of `pop_changes`."""
+        return bool(self._changed_ids or self._deleted_ids)
 
     def to_dict(self) -> List[dict]:
         """Convert the notebook to a dictionary."""
-        return [note.to_dict() for note in self.data]
+        with self._lock:
+            return [{"id": index, **note.to_dict()} for index, note in self.data.items()]
+
+    def deferred_dict(self) -> Callable[[], List[dict]]:
+        """Return a function converting the notebook as it is now to a dictionary later, e.g. in another thread.
+
+        Only the references to the notes are copied now, so a note changed meanwhile is converted as changed.
+        """
+        with self._lock:
+            notes = list(self.data.items())
+        return lambda: [{"id": index, **note.to_dict()} for index, note in notes]
 
     def find(self, name: str) -> Optional[Note]:
-        """Find a note by name."""
-        for note in self.data:
-            if note.summary.value == name:
-                return note
-        return None
+        """Find a note by its summary."""
+        notes = self.find_all(name)
+        return notes[0] if notes else None
+
+    def find_all(self, summary: str) -> List[Note]:
+        """Return the notes with exactly the summary."""
+        return [self.data[index] for index in self._summary_index().lookup(summary)]
+
+    def find_by_summary_prefix(self, prefix: str, limit: Optional[int] = None) -> List[Note]:
+        """Return the notes whose summary starts with the prefix ignoring the case, by summary in alphabetical order."""
+        notes = []
+        summaries = self._summary_index()
+        for summary in summaries.starting_with(prefix, limit):
+            notes.extend(self.data[index] for index in summaries.lookup(summary))
+            if limit is not None and len(notes) >= limit:
+                return notes[:limit]
+        return notes
+
+    def complete_summary(self, prefix: str, limit: int = COMPLETIONS_LIMIT) -> List[str]:
+        """Return the first summaries starting with the prefix ignoring the case, in alphabetical order."""
+        return self._summary_index().starting_with(prefix, limit)
+
+    def complete_tag(self, prefix: str, limit: int = COMPLETIONS_LIMIT) -> List[str]:
+        """Return the tags starting with the prefix ignoring the case, the most used first."""
+        if not self._tag_names.is_built():
+            self._tag_names.build((index, self._tag_values(note)) for index, note in self.data.items())
+        return self._tag_names.top(prefix, limit)
 
     @classmethod
-    def from_dict(cls, data: List[dict]) -> "NoteBook":
+    def from_dict(cls, data: Iterable[dict]) -> "NoteBook":
         """Create a notebook from a dictionary."""
         note_book = cls()
         for note in data:
-            new_note = Note.from_dict(**note)
-            try:
-                note_book.data.append(new_note)
-            except TypeError as ex:
-                raise NoteBookException(f"Invalid note: {note}. Unable to add to notebook.")
-            except MemoryError as ex:
-                raise MemoryError(f"Memory is full. Unable to add note: {note} to notebook.")
+            note_book.load_note(note)
         return note_book
+
+    def load_note(self, data: dict) -> Note:
+        """Create a note from a dictionary and add it to the notebook, keeping its saved id if it has one."""
+        new_note = Note.from_dict(**data)
+        try:
+            self._add(new_note, data.get("id"))
+        except TypeError as ex:
+            raise NoteBookException(f"Invalid note: {data}. Unable to add to notebook.")
+        except MemoryError as ex:
+            raise MemoryError(f"Memory is full. Unable to add note: {data} to notebook.")
+        return new_note
+
+    def put_note(self, data: dict) -> Note:
+        """Create a note from a dictionary replacing the note with its id in place, or add it if there is none."""
+        with self._lock:
+            old_note = self.data.get(data.get("id"))
+            if old_note is None:
+                return self.load_note(data)
+            new_note = Note.from_dict(**data)
+            new_note.index = old_note.index
+            self._unindex_note(old_note)
+            self.data[new_note.index] = self._track(new_note)
+            self._index_note(new_note)
+            return new_note
+
+    def _add(self, note: Note, index: Optional[int] = None) -> None:
+        """Give the note the id, or the next free one if it has none or it is taken, and add it to the notebook."""
+        with self._lock:
+            if not index or index in self.data:
+                index = self._next_index
+            note.index = index
+            self._next_index = max(self._next_index, index + 1)
+            self.data[index] = self._track(note)
+            self._index_note(note)
+
+    def _index_note(self, note: Note) -> None:
+        """Index the words and tags of a new or changed note and put it into the sorted views."""
+        self._text_index.add(note)
+        self._tag_index.add(note)
+        self._summaries.add(note.index, self._summary_values(note))
+        self._tag_names.add(note.index, self._tag_values(note))
+        for sorter in self._sorters.values():
+            sorter.add(note)
+
+    def _unindex_note(self, note: Note) -> None:
+        """Drop a deleted note from the indexes and the sorted views."""
+        self._text_index.remove(note)
+        self._tag_index.remove(note)
+        self._summaries.remove(note.index)
+        self._tag_names.remove(note.index)
+        for sorter in self._sorters.values():
+            sorter.remove(note)
+
+    def _summary_index(self) -> PrefixIndex:
+        """Return the prefix index of the summaries, building it on first use."""
+        if not self._summaries.is_built():
+            self._summaries.build((index, self._summary_values(note)) for index, note in self.data.items())
+        return self._summaries
+
+    @staticmethod
+    def _summary_values(note: Note) -> Tuple[str, ...]:
+        """Return the summary of the note as the texts of the summary index."""
+        return (note.summary.value,) if note.summary and note.summary.value else ()
+
+    @staticmethod
+    def _tag_values(note: Note) -> Tuple[str, ...]:
+        """Return the tags of the note as the texts of the tag completion index."""
+        return tuple(tag.value for tag in note.tags)
+
+    def _tags(self) -> TagIndex:
+        """Return the tag index, building it on first use."""
+        if not self._tag_index.is_built():
+            self._tag_index.build(self.data.values())
+        return self._tag_index
+
+    def _mark_changed(self, index: int) -> None:
+        """Mark the note as changed since the last save."""
+        with self._lock:
+            self._deleted_ids.discard(index)
+            self._changed_ids.add(index)
+
+    def _mark_deleted(self, index: int) -> None:
+        """Mark the note as deleted since the last save."""
+        with self._lock:
+            self._changed_ids.discard(index)
+            self._deleted_ids.add(index)
+
+    def _on_note_change(self, note: Note) -> None:
+        """Track changes made to a note of the notebook."""
+        with self._lock:
+            self._index_note(note)
+            self._mark_changed(note.index)
+
+    def _track(self, note: Note) -> Note:
+        """Subscribe the notebook to the changes of the note."""
+        note._on_change = self._on_note_change
+        return note
@@ -0,0 +1,144 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from fields.note import Note
+
+NOTE_FIELDS = ("summary", "text")
+TOKEN_PATTERN = re.compile(r"\w+")
+# The usual BM25 parameters: how fast repeated terms stop adding to the score, and how much long notes are penalized.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split the text into lowercased words."""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def parse_terms(query: str) -> List[List[str]]:
+    """Parse words joined by `and` and `or` into groups of words which must all occur, `and` being the default."""
+    groups = []
+    for alternative in re.split(r"\s+or\s+", query.strip(), flags=re.IGNORECASE):
+        if terms := [term for term in tokenize(alternative) if term != "and"]:
+            groups.append(terms)
+    return groups
+
+
+class NoteIndex:
+    """Inverted indexes from the words of the note summaries and texts to the notes, ranking matches by BM25.
+
+    The index is built on the first search, so loading a notebook does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Optional[Dict[str, Dict[str, Dict[Note, int]]]] = None
+        # The words of every indexed note, so it can be removed once it has already changed.
+        self._terms: Dict[str, Dict[Note, Tuple[str, ...]]] = {}
+        self._lengths: Dict[str, Dict[Note, int]] = {}
+        self._total_length: Dict[str, int] = {}
+
+    def is_built(self) -> bool:
+        """Check if the index has been built."""
+        return self._postings is not None
+
+    def build(self, notes: Iterable[Note]) -> None:
+        """Build the index from all notes of the notebook."""
+        self._postings = {field: defaultdict(dict) for field in NOTE_FIELDS}
+        self._terms = {field: {} for field in NOTE_FIELDS}
+        self._lengths = {field: {} for field in NOTE_FIELDS}
+        self._total_length = dict.fromkeys(NOTE_FIELDS, 0)
+        for note in notes:
+            self._insert(note)
+
+    def clear(self) -> None:
+        """Drop the index, so it is built again on its next search."""
+        self._postings = None
+        self._terms = {}
+        self._lengths = {}
+        self._total_length = {}
+
+    def add(self, note: Note) -> None:
+        """Index the words of the note replacing what was indexed for it before."""
+        if self._postings is None:
+            return
+        self.remove(note)
+        self._insert(note)
+
+    def remove(self, note: Note) -> None:
+        """Drop the note from the index."""
+        if self._postings is None:
+            return
+        for field in NOTE_FIELDS:
+            terms = self._terms[field].pop(note, None)
+            if terms is None:
+                continue
+            self._total_length[field] -= self._lengths[field].pop(note)
+            postings = self._postings[field]
+            for term in terms:
+                notes = postings[term]
+                notes.pop(note, None)
+                if not notes:
+                    del postings[term]
+
+    def search(self, query: str, fields: Sequence[str] = NOTE_FIELDS) -> List[Note]:
+        """Return the notes matching the query in the fields, the most relevant first.
+
+        A note matches when it has every word of one of the groups joined by `or`; it is scored by BM25
+        over all words of the query, summed over the fields. Notes scored equally come in the order of their ids.
+        """
+        groups = parse_terms(query)
+        notes: Set[Note] = set()
+        for terms in groups:
+            notes.update(self._having_all(terms, fields))
+        if not notes:
+            return []
+        scores = dict.fromkeys(notes, 0.0)
+        for field in fields:
+            self._score(field, {term for terms in groups for term in terms}, scores)
+        return sorted(notes, key=lambda note: (-scores[note], note.index))
+
+    def _having_all(self, terms: List[str], fields: Sequence[str]) -> Set[Note]:
+        """Return the notes having every term in any of the fields, intersecting the shortest postings first."""
+        postings = []
+        for term in set(terms):
+            notes: Set[Note] = set()
+            for field in fields:
+                notes.update(self._postings[field].get(term, ()))
+            if not notes:
+                return set()
+            postings.append(notes)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def _score(self, field: str, terms: Set[str], scores: Dict[Note, float]) -> None:
+        """Add the BM25 scores of the terms in the field to the scores of the matched notes."""
+        lengths = self._lengths[field]
+        if not lengths:
+            return
+        average_length = self._total_length[field] / len(lengths)
+        for term in terms:
+            notes = self._postings[field].get(term)
+            if not notes:
+                continue
+            idf = math.log(1 + (len(lengths) - len(notes) + 0.5) / (len(notes) + 0.5))
+            for note in scores:
+                if frequency := notes.get(note):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[note] / average_length)
+                    scores[note] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    def _insert(self, note: Note) -> None:
+        """Add the words of every field of the note to the postings."""
+        for field in NOTE_FIELDS:
+            value = getattr(note, field)
+            counts = Counter(tokenize(value.value if value else None))
+            if not counts:
+                continue
+            length = sum(counts.values())
+            self._terms[field][note] = tuple(counts)
+            self._lengths[field][note] = length
+            self._total_length[field] += length
+            postings = self._postings[field]
+            for term, frequency in counts.items():
+                postings[term][note] = frequency
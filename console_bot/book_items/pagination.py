@@ -0,0 +1,59 @@
+from typing import Generic, List, Sequence, TypeVar
+
+DEFAULT_PAGE_SIZE = 20
+
+Item = TypeVar("Item")
+
+
+class Page(Generic[Item]):
+    """A page of the items of a book together with its position among all items."""
+
+    def __init__(self, items: List[Item], offset: int, page_size: int, total: int) -> None:
+        self.items = items
+        self.offset = offset
+        self.page_size = page_size
+        self.total = total
+
+    @property
+    def number(self) -> int:
+        """The number of the page counting from 1."""
+        return self.offset // self.page_size + 1
+
+    @property
+    def pages_count(self) -> int:
+        """The number of pages all items take."""
+        return max(1, -(-self.total // self.page_size))
+
+    @property
+    def has_next(self) -> bool:
+        """Check if there are items after the page."""
+        return self.offset + len(self.items) < self.total
+
+    @property
+    def has_prev(self) -> bool:
+        """Check if there are items before the page."""
+        return self.offset > 0
+
+    @property
+    def next_offset(self) -> int:
+        """The offset of the next page."""
+        return self.offset + self.page_size
+
+    @property
+    def prev_offset(self) -> int:
+        """The offset of the previous page."""
+        return max(0, self.offset - self.page_size)
+
+
+def check_page(offset: int, page_size: int) -> None:
+    """Check that the page is within the items."""
+    if page_size <= 0:
+        raise ValueError(f"Invalid page size: {page_size}. The page size must be positive.")
+    if offset < 0:
+        raise ValueError(f"Invalid offset: {offset}. The offset can not be negative.")
+
+
+def paginate(items: Sequence[Item], offset: int = 0, page_size: int = DEFAULT_PAGE_SIZE) -> Page[Item]:
+    """Return the page of the items already in memory starting at the offset."""
+    check_page(offset, page_size)
+    return Page(list(items[offset:offset + page_size]), offset, page_size, len(items))
@@ -0,0 +1,124 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fields.field import normalize_phone
+from fields.record import Record
+
+# Incoming numbers and contact phones sharing fewer trailing digits are not taken for the same number.
+MIN_CALLER_DIGITS = 7
+# Sorts after every digit, so (prefix + DIGITS_END) bounds all the numbers starting with the prefix.
+DIGITS_END = ":"
+
+
+class PhoneIndex:
+    """The normalized contact phones as a digit trie, for prefix searches and caller ID lookups.
+
+    The trie is kept flattened into a sorted list of (digits, name) pairs: the numbers under every trie node
+    are a contiguous slice of it, so a prefix is answered by two bisections plus the slice of the results.
+    The reversed digits are kept the same way to match incoming numbers by their trailing digits.
+    The index is built on its first lookup, so loading a book does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._numbers: Optional[List[Tuple[str, str]]] = None
+        self._reversed: List[Tuple[str, str]] = []
+        self._phones: Dict[str, str] = {}
+
+    def is_built(self) -> bool:
+        """Check if the index has been built."""
+        return self._numbers is not None
+
+    def build(self, phones: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Build the index from the (name, phone) pairs of all contacts."""
+        self._phones = {name: digits for name, phone in phones if (digits := normalize_phone(phone or ""))}
+        self._numbers = sorted((digits, name) for name, digits in self._phones.items())
+        self._reversed = sorted((digits[::-1], name) for name, digits in self._phones.items())
+
+    def clear(self) -> None:
+        """Drop the index, so it is built again on its next lookup."""
+        self._numbers = None
+        self._reversed = []
+        self._phones = {}
+
+    def add(self, record: Record) -> None:
+        """Index the phone of the record replacing what was indexed for its name before."""
+        if self._numbers is None:
+            return
+        name = record.name.value
+        self.remove(name)
+        if digits := normalize_phone(record.phone.value if record.phone else ""):
+            self._insert(name, digits)
+
+    def remove(self, name: str) -> None:
+        """Drop the contact with the name from the index."""
+        if self._numbers is None or name not in self._phones:
+            return
+        digits = self._phones.pop(name)
+        _discard(self._numbers, (digits, name))
+        _discard(self._reversed, (digits[::-1], name))
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Move the phone of a contact to its new name."""
+        if self._numbers is None:
+            return
+        digits = self._phones.get(old_name)
+        self.remove(old_name)
+        self.remove(new_name)
+        if digits:
+            self._insert(new_name, digits)
+
+    def starting_with(self, prefix: str) -> List[str]:
+        """Return the names of the contacts whose phone starts with the digits of the prefix, ordered by phone."""
+        return [name for _, name in self._prefix_slice(self._numbers, normalize_phone(prefix))]
+
+    def count_starting_with(self, prefix: str) -> int:
+        """Return the number of contacts whose phone starts with the digits of the prefix."""
+        first, last = _prefix_bounds(self._numbers, normalize_phone(prefix))
+        return last - first
+
+    def callers(self, number: str, min_digits: int = MIN_CALLER_DIGITS) -> List[str]:
+        """Return the names of the contacts an incoming number may come from.
+
+        Numbers are written with and without the country and trunk prefixes, so a contact matches when its phone
+        equals the number or one of them ends with the other, as long as they share `min_digits` trailing digits.
+        """
+        digits = normalize_phone(number)
+        if len(digits) < min_digits:
+            return []
+        reversed_digits = digits[::-1]
+        # Contact phones the incoming number ends with: shorter reversed phones the reversed number starts with.
+        names = [name for length in range(min_digits, len(digits))
+                 for _, name in self._exact_slice(reversed_digits[:length])]
+        # Contact phones ending with the incoming number, including the equal ones.
+        names.extend(name for _, name in self._prefix_slice(self._reversed, reversed_digits))
+        return list(dict.fromkeys(names))
+
+    def _insert(self, name: str, digits: str) -> None:
+        """Put the phone of the contact into both sorted lists."""
+        self._phones[name] = digits
+        insort(self._numbers, (digits, name))
+        insort(self._reversed, (digits[::-1], name))
+
+    def _exact_slice(self, reversed_digits: str) -> List[Tuple[str, str]]:
+        """Return the entries of the reversed list equal to the reversed digits."""
+        first = bisect_left(self._reversed, (reversed_digits,))
+        last = bisect_left(self._reversed, (reversed_digits + "\0",))
+        return self._reversed[first:last]
+
+    @staticmethod
+    def _prefix_slice(entries: List[Tuple[str, str]], prefix: str) -> List[Tuple[str, str]]:
+        """Return the entries whose digits start with the prefix."""
+        first, last = _prefix_bounds(entries, prefix)
+        return entries[first:last]
+
+
+def _prefix_bounds(entries: List[Tuple[str, str]], prefix: str) -> Tuple[int, int]:
+    """Return the slice of the sorted entries whose digits start with the prefix."""
+    return bisect_left(entries, (prefix,)), bisect_left(entries, (prefix + DIGITS_END,))
+
+
+def _discard(entries: List[Tuple[str, str]], entry: Tuple[str, str]) -> None:
+    """Delete the entry from the sorted list if it is there."""
+    position = bisect_left(entries, entry)
+    if position < len(entries) and entries[position] == entry:
+        del entries[position]
@@ -0,0 +1,109 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Sorts after every character, so (prefix + TEXT_END) bounds all the texts starting with the prefix.
+TEXT_END = chr(0x10FFFF)
+# The number of completions offered while typing.
+COMPLETIONS_LIMIT = 10
+
+
+def fold(text: str) -> str:
+    """Return the text as it is compared for prefixes, ignoring the case."""
+    return text.casefold()
+
+
+class PrefixIndex:
+    """The texts of the notes, such as their summaries or tags, as a trie for prefix lookups and completion.
+
+    Like the phone index, the trie is kept flattened into a sorted list of (folded text, text) pairs: the texts
+    under every trie node are a contiguous slice of it, so a prefix is answered by two bisections.
+    Every text maps to the values, such as note ids, having it, in the order they were indexed.
+    The index is built on its first lookup, so loading a notebook does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Optional[List[Tuple[str, str]]] = None
+        # Dictionaries with no values keep the values of a text as an ordered set.
+        self._values: Dict[str, Dict[Hashable, None]] = {}
+        # The texts of every indexed value, so it can be removed once its texts have already changed.
+        self._texts: Dict[Hashable, Tuple[str, ...]] = {}
+
+    def is_built(self) -> bool:
+        """Check if the index has been built."""
+        return self._entries is not None
+
+    def build(self, items: Iterable[Tuple[Hashable, Iterable[str]]]) -> None:
+        """Build the index from the (value, texts) pairs of all notes."""
+        self._entries = []
+        self._values = {}
+        self._texts = {}
+        for value, texts in items:
+            self._insert(value, texts)
+        self._entries = sorted((fold(text), text) for text in self._values)
+
+    def clear(self) -> None:
+        """Drop the index, so it is built again on its next lookup."""
+        self._entries = None
+        self._values = {}
+        self._texts = {}
+
+    def add(self, value: Hashable, texts: Iterable[str]) -> None:
+        """Index the texts of the value replacing what was indexed for it before."""
+        if self._entries is None:
+            return
+        self.remove(value)
+        for text in self._insert(value, texts):
+            insort(self._entries, (fold(text), text))
+
+    def remove(self, value: Hashable) -> None:
+        """Drop the value from the index."""
+        if self._entries is None:
+            return
+        for text in self._texts.pop(value, ()):
+            values = self._values[text]
+            values.pop(value, None)
+            if not values:
+                del self._values[text]
+                entry = (fold(text), text)
+                position = bisect_left(self._entries, entry)
+                if position < len(self._entries) and self._entries[position] == entry:
+                    del self._entries[position]
+
+    def lookup(self, text: str) -> List[Hashable]:
+        """Return the values having exactly the text."""
+        return list(self._values.get(text, ()))
+
+    def starting_with(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Return the first `limit` texts starting with the prefix ignoring the case, in alphabetical order."""
+        first, last = self._prefix_bounds(prefix)
+        if limit is not None:
+            last = min(last, first + limit)
+        return [text for _, text in self._entries[first:last]]
+
+    def count_starting_with(self, prefix: str) -> int:
+        """Return the number of distinct texts starting with the prefix ignoring the case."""
+        first, last = self._prefix_bounds(prefix)
+        return last - first
+
+    def top(self, prefix: str, limit: int = COMPLETIONS_LIMIT) -> List[str]:
+        """Return the `limit` texts starting with the prefix which the most values have, ties alphabetically."""
+        first, last = self._prefix_bounds(prefix)
+        entries = self._entries[first:last]
+        return [text for _, text in heapq.nsmallest(limit, entries, key=lambda entry: -len(self._values[entry[1]]))]
+
+    def _prefix_bounds(self, prefix: str) -> Tuple[int, int]:
+        """Return the slice of the sorted entries starting with the prefix."""
+        prefix = fold(prefix)
+        return bisect_left(self._entries, (prefix,)), bisect_left(self._entries, (prefix + TEXT_END,))
+
+    def _insert(self, value: Hashable, texts: Iterable[str]) -> List[str]:
+        """Map the texts to the value and return the texts which no value had before."""
+        texts = tuple(dict.fromkeys(text for text in texts if text))
+        if not texts:
+            return []
+        self._texts[value] = texts
+        new_texts = [text for text in texts if text not in self._values]
+        for text in texts:
+            self._values.setdefault(text, {})[value] = None
+        return new_texts
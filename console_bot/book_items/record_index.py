@@ -0,0 +1,98 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from fields.field import normalize_phone
+from fields.record import Record
+
+INDEXED_FIELDS = ("phone", "email", "birthday")
+
+
+def normalize(field: str, value: Optional[str]) -> Optional[str]:
+    """Return the form of the value the index is keyed by."""
+    if not value:
+        return None
+    if field == "phone":
+        return normalize_phone(value) or None
+    if field == "email":
+        return value.strip().lower()
+    return value.strip()
+
+
+class RecordIndex:
+    """Hash indexes from the normalized phone, email and birthday to the names of the records having them.
+
+    The index of a field is built on its first lookup, so loading a book does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._names: Dict[str, Dict[str, Set[str]]] = {}
+        # The indexed key of every record, so it can be removed once the record has already changed.
+        self._keys: Dict[str, Dict[str, str]] = {}
+
+    def is_built(self, field: str) -> bool:
+        """Check if the index of the field has been built."""
+        return field in self._names
+
+    def build(self, field: str, values: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Build the index of the field from the (name, value) pairs of all records of the book."""
+        names: Dict[str, Set[str]] = defaultdict(set)
+        keys: Dict[str, str] = {}
+        for name, value in values:
+            if key := normalize(field, value):
+                names[key].add(name)
+                keys[name] = key
+        self._names[field] = names
+        self._keys[field] = keys
+
+    def clear(self) -> None:
+        """Drop the indexes of all fields, so they are built again on their next lookup."""
+        self._names.clear()
+        self._keys.clear()
+
+    def add(self, record: Record) -> None:
+        """Index the record in every built index replacing what was indexed for its name before."""
+        name = record.name.value
+        self.remove(name)
+        for field in self._names:
+            self._add_value(field, name, record)
+
+    def remove(self, name: str) -> None:
+        """Drop the record with the name from every built index."""
+        for field, keys in self._keys.items():
+            key = keys.pop(name, None)
+            if key is None:
+                continue
+            names = self._names[field][key]
+            names.discard(name)
+            if not names:
+                del self._names[field][key]
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Move the indexed values of a record to its new name."""
+        self.remove(new_name)
+        for field, keys in self._keys.items():
+            key = keys.pop(old_name, None)
+            if key is None:
+                continue
+            names = self._names[field][key]
+            names.discard(old_name)
+            names.add(new_name)
+            keys[new_name] = key
+
+    def lookup(self, field: str, value: str) -> Set[str]:
+        """Return the names of the records whose field equals the value after normalization."""
+        key = normalize(field, value)
+        names = self._names[field].get(key) if key else None
+        return set(names) if names else set()
+
+    def count(self, field: str, value: str) -> int:
+        """Return the number of records whose field equals the value after normalization."""
+        key = normalize(field, value)
+        return len(self._names[field].get(key, ())) if key else 0
+
+    def _add_value(self, field: str, name: str, record: Record) -> None:
+        """Index the value of a single field of the record."""
+        value = getattr(record, field)
+        if key := normalize(field, value.value if value else None):
+            self._names[field][key].add(name)
+            self._keys[field][name] = key
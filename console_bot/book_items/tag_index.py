@@ -0,0 +1,84 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fields.note import Note
+
+
+def parse_tags(query: str) -> Tuple[List[str], bool]:
+    """Parse tags joined by `or`, any of which a note needs, or by commas or `and`, all of which it needs."""
+    alternatives = re.split(r"\s+or\s+", query.strip(), flags=re.IGNORECASE)
+    if len(alternatives) > 1:
+        return [tag.strip() for tag in alternatives if tag.strip()], False
+    return [tag.strip() for tag in re.split(r",|\s+and\s+", query, flags=re.IGNORECASE) if tag.strip()], True
+
+
+class TagIndex:
+    """Postings from every tag to the notes having it, in the order the notes were indexed.
+
+    The index is built on its first lookup, so loading a notebook does not pay for it.
+    """
+
+    def __init__(self) -> None:
+        # Dictionaries with no values keep the notes of a tag as an ordered set.
+        self._notes: Optional[Dict[str, Dict[Note, None]]] = None
+        # The tags of every indexed note, so it can be removed once its tags have already changed.
+        self._tags: Dict[Note, Tuple[str, ...]] = {}
+
+    def is_built(self) -> bool:
+        """Check if the index has been built."""
+        return self._notes is not None
+
+    def build(self, notes: Iterable[Note]) -> None:
+        """Build the index from all notes of the notebook."""
+        self._notes = {}
+        self._tags = {}
+        for note in notes:
+            self._insert(note)
+
+    def add(self, note: Note) -> None:
+        """Index the tags of the note replacing what was indexed for it before."""
+        if self._notes is None:
+            return
+        self.remove(note)
+        self._insert(note)
+
+    def remove(self, note: Note) -> None:
+        """Drop the note from the index."""
+        if self._notes is None:
+            return
+        for tag in self._tags.pop(note, ()):
+            notes = self._notes[tag]
+            notes.pop(note, None)
+            if not notes:
+                del self._notes[tag]
+
+    def having(self, tag: str) -> List[Note]:
+        """Return the notes having the tag."""
+        return list(self._notes.get(tag, ()))
+
+    def having_all(self, tags: Iterable[str]) -> List[Note]:
+        """Return the notes having every one of the tags, walking the rarest tag's notes only."""
+        postings = sorted((self._notes.get(tag, {}) for tag in set(tags)), key=len)
+        if not postings:
+            return []
+        return [note for note in postings[0] if all(note in notes for notes in postings[1:])]
+
+    def having_any(self, tags: Iterable[str]) -> List[Note]:
+        """Return the notes having at least one of the tags."""
+        notes: Dict[Note, None] = {}
+        for tag in tags:
+            notes.update(self._notes.get(tag, {}))
+        return list(notes)
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of notes having every tag, the most used tags first."""
+        return dict(sorted(((tag, len(notes)) for tag, notes in self._notes.items()), key=lambda item: (-item[1], item[0])))
+
+    def _insert(self, note: Note) -> None:
+        """Add the note to the postings of each of its tags."""
+        tags = tuple(dict.fromkeys(tag.value for tag in note.tags))
+        if not tags:
+            return
+        self._tags[note] = tags
+        for tag in tags:
+            self._notes.setdefault(tag, {})[note] = None
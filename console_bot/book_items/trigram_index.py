@@ -0,0 +1,114 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fields.field import normalize_phone
+from fields.record import Record
+
+SEARCH_FIELDS = ("name", "phone", "birthday", "email", "address")
+NGRAM_SIZE = 3
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the distinct substrings of the text of NGRAM_SIZE characters."""
+    return {text[start:start + NGRAM_SIZE] for start in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def index_key(field: str, value: str) -> str:
+    """Return the form of a value or a query the index compares: phones as digits, the other fields lowercased."""
+    return normalize_phone(value) if field == "phone" else value.lower()
+
+
+def field_value(record: Record, field: str) -> Optional[str]:
+    """Return the value of a field of the record, if it is set."""
+    value = getattr(record, field)
+    return value.value if value else None
+
+
+class TrigramIndex:
+    """Inverted indexes from the trigrams of the lowercased contact fields to the names of the records.
+
+    The index of a field is built on its first search, so fields which are never searched cost no memory.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[str, Set[str]]] = {}
+        # The indexed values in the form of `index_key`, so the final substring check does not convert them again.
+        self._lowered: Dict[str, Dict[str, str]] = {}
+
+    def is_built(self, field: str) -> bool:
+        """Check if the index of the field has been built."""
+        return field in self._postings
+
+    def build(self, field: str, values: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Build the index of the field from the (name, value) pairs of all records of the book."""
+        postings: Dict[str, Set[str]] = defaultdict(set)
+        lowered: Dict[str, str] = {}
+        for name, value in values:
+            if value:
+                lowered[name] = value = index_key(field, value)
+                for start in range(len(value) - NGRAM_SIZE + 1):
+                    postings[value[start:start + NGRAM_SIZE]].add(name)
+        self._postings[field] = postings
+        self._lowered[field] = lowered
+
+    def clear(self) -> None:
+        """Drop the indexes of all fields, so they are built again on their next search."""
+        self._postings.clear()
+        self._lowered.clear()
+
+    def add(self, record: Record) -> None:
+        """Index the record in every built index replacing what was indexed for its name before."""
+        name = record.name.value
+        self.remove(name)
+        for field in self._postings:
+            self._add_value(field, name, field_value(record, field))
+
+    def remove(self, name: str) -> None:
+        """Drop the record with the name from every built index."""
+        for field, postings in self._postings.items():
+            value = self._lowered[field].pop(name, None)
+            if value is None:
+                continue
+            for trigram in trigrams(value):
+                names = postings[trigram]
+                names.discard(name)
+                if not names:
+                    del postings[trigram]
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Move the indexed values of a record to its new name."""
+        values = {field: lowered.get(old_name) for field, lowered in self._lowered.items()}
+        self.remove(old_name)
+        self.remove(new_name)
+        for field, value in values.items():
+            self._add_value(field, new_name, new_name if field == "name" else value)
+
+    def search(self, field: str, value: str) -> List[str]:
+        """Return the sorted names of the records whose field contains the value, ignoring the case."""
+        value = index_key(field, value)
+        lowered = self._lowered[field]
+        return sorted(name for name in self.candidates(field, value) if value in lowered[name])
+
+    def candidates(self, field: str, value: str) -> Iterable[str]:
+        """Return the names of the records having every trigram of the value, which still have to be checked."""
+        query_trigrams = trigrams(index_key(field, value))
+        if not query_trigrams:
+            # The value is too short to have trigrams, so all values are checked.
+            return self._lowered[field]
+        postings = sorted((self._postings[field].get(trigram, set()) for trigram in query_trigrams), key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def estimate(self, field: str, value: str) -> int:
+        """Return the upper bound of the number of candidates of the value without collecting them."""
+        query_trigrams = trigrams(index_key(field, value))
+        if not query_trigrams:
+            return len(self._lowered[field])
+        return min(len(self._postings[field].get(trigram, ())) for trigram in query_trigrams)
+
+    def _add_value(self, field: str, name: str, value: Optional[str]) -> None:
+        """Index a single value of a field."""
+        if not value:
+            return
+        self._lowered[field][name] = value = index_key(field, value)
+        for trigram in trigrams(value):
+            self._postings[field][trigram].add(name)
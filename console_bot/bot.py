@@ -2,7 +2,9 @@ import sys
 from prompt_toolkit import PromptSession
 from prompt_toolkit.shortcuts import prompt
 
-from bot_memory import recall_bot_state, save_bot_state
+from bot_constants import BOT_AUTOSAVE_INTERVAL
+from bot_memory import create_storage, recall_bot_state, save_bot_state
+from bot_storage import AutoSaver
 from utils import _find_best_match, _parse_input
 from prompt_toolkit.styles import Style
 from command_handlers.dynamic_command_completer import DynamicCommandCompleter
@@ -26,10 +28,14 @@ class ConsoleBot:
     def __init__(self,
                  address_book: "AddressBook",
                  command_handler: "BaseCommandHandler",
-                 note_book: "NoteBook"
+                 note_book: "NoteBook",
+                 storage: "BaseStorage" = None,
+                 autosave_interval: float = BOT_AUTOSAVE_INTERVAL
                  ) -> None:
+        self.storage = storage if storage else create_storage()
         self._save_handler = save_bot_state
         self._recall_handler = recall_bot_state
+        self._autosaver = AutoSaver(self, interval=autosave_interval)
         self.address_book = address_book
         self.note_book = note_book
         self.handler = command_handler(self)
@@ -54,11 +60,15 @@ class ConsoleBot:
                     self._recall_handler(self)
             except MemoryError as ex:
                 print(RED_COLOR + str(ex) + WHITE_COLOR)
+                if self.storage.read_only:
+                    # The edits made to fresh books would be silently dropped on exit.
+                    sys.exit(1)
+            self._autosaver.start()
             while True:
                 try:
                     return func(*args, **kwargs)
                 except (KeyError, ValueError) as ex:
-                    f = ex.args[0]
+                    f = str(ex.args[0]) if ex.args else ""
                     match = _find_best_match(f, self.commands.keys())
                     if match:
                         print(RED_COLOR + f"Invalid command '{f}', did you mean '{match}'?" + WHITE_COLOR)
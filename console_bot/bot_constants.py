@@ -16,3 +16,24 @@ if not os.path.exists(APPDATA_PATH):
     os.makedirs(APPDATA_PATH)
 
 BOT_STATE_FILE = os.path.join(APPDATA_PATH, "bot_data.json")
+BOT_JOURNAL_FILE = os.path.join(APPDATA_PATH, "bot_data.journal")
+# The journal is compacted into BOT_STATE_FILE once it grows beyond this size in bytes.
+BOT_JOURNAL_COMPACT_SIZE = 4 * 1024 * 1024
+# The codec snapshots are compressed with: "none", "gzip", "bz2" or "lzma". Reading detects the codec by itself.
+BOT_COMPRESSION = os.environ.get("CONSOLE_BOT_COMPRESSION", "none")
+# Set to 1 to validate every field of a snapshot on load even when its checksum matches.
+BOT_VERIFY_STATE = os.environ.get("CONSOLE_BOT_VERIFY_STATE", "0") == "1"
+BOT_BINARY_STATE_FILE = os.path.join(APPDATA_PATH, "bot_data.bin")
+BOT_BINARY_JOURNAL_FILE = os.path.join(APPDATA_PATH, "bot_data.bin.journal")
+BOT_SQLITE_FILE = os.path.join(APPDATA_PATH, "bot_data.sqlite3")
+BOT_SHARDS_DIR = os.path.join(APPDATA_PATH, "bot_data.shards")
+# Contacts are spread over this many shard files by the hash of their name.
+BOT_SHARDS_COUNT = 256
+# The storage of the bot's state: "json", "binary", "columnar", "sharded", "sqlite" or "readonly" to browse the binary snapshot.
+BOT_STORAGE = os.environ.get("CONSOLE_BOT_STORAGE", "json")
+# Unsaved changes are flushed to the storage every this many seconds; 0 disables autosave.
+BOT_AUTOSAVE_INTERVAL = float(os.environ.get("CONSOLE_BOT_AUTOSAVE_INTERVAL", 30))
+# Imported contacts are validated and added to the address book in batches of this many records.
+BOT_IMPORT_BATCH_SIZE = 1000
+# Contacts and notes are listed this many at a time; the "--page-size" option overrides it per command.
+BOT_PAGE_SIZE = int(os.environ.get("CONSOLE_BOT_PAGE_SIZE", 20))
@@ -1,34 +1,43 @@
-import json
-import os
-import sys
+from bot_constants import BOT_STORAGE
+from bot_storage import BaseStorage, BinaryStorage, BotState, ColumnarStorage, JsonStorage, MappedStorage, ShardedStorage, SqliteStorage
 
-from bot_constants import BOT_STATE_FILE
-from book_items import AddressBook, NoteBook
+STORAGES = {"json": JsonStorage,
+            "binary": BinaryStorage,
+            "columnar": ColumnarStorage,
+            "readonly": MappedStorage,
+            "sharded": ShardedStorage,
+            "sqlite": SqliteStorage
+            }
+# The read-only storage saves nothing, so the state can not be converted to it.
+WRITABLE_STORAGES = [name for name in STORAGES if name != "readonly"]
 
-COLOR_RED = '\033[91m'
-COLOR_WHITE = '\033[97m'
+
+def create_storage(name: str = BOT_STORAGE) -> BaseStorage:
+    """Create the storage of the bot's state by its name."""
+    try:
+        return STORAGES[name]()
+    except KeyError:
+        raise ValueError(f"Unsupported storage: {name}. Supported storages: {', '.join(STORAGES)}")
 
 
 def recall_bot_state(bot: "ConsoleBot"):
     """Recall the bot's state from the last session."""
-    if os.path.exists(BOT_STATE_FILE):
-        with open(BOT_STATE_FILE, "r") as f:
-            try:
-                data = json.load(f)
-                bot.address_book = AddressBook.from_dict(data.get("addressBook", []))
-                bot.note_book = NoteBook.from_dict(data.get("noteBook", []))
-            except json.JSONDecodeError:
-                bot.address_book = AddressBook()
-                bot.note_book = NoteBook()
-                raise MemoryError(COLOR_RED + "ERROR: Could not recall bot state. Starting with a fresh state." + COLOR_WHITE)
-
+    bot.storage.recall(bot)
 
 
 def save_bot_state(bot: "ConsoleBot"):
     """Save the bot's state for the next session."""
-    with open(BOT_STATE_FILE, "w") as f:
-        data = {"addressBook": bot.address_book.to_dict(), "noteBook": bot.note_book.to_dict()}
-        try:
-            json.dump(data, f, indent=4)
-        except json.JSONDecodeError:
-            raise MemoryError(COLOR_RED + "ERROR: Could not save bot state." + COLOR_WHITE)
+    bot.storage.save(bot)
+
+
+def convert_bot_state(source: str, target: str) -> BotState:
+    """Copy the bot's state from one storage to another, e.g. from the JSON to the binary snapshot."""
+    if source == target:
+        raise ValueError(f"Source and target storages are the same: {source}")
+    if target not in WRITABLE_STORAGES:
+        raise ValueError(f"Unsupported target storage: {target}. Supported targets: {', '.join(WRITABLE_STORAGES)}")
+    source_storage, target_storage = create_storage(source), create_storage(target)
+    state = BotState()
+    source_storage.recall(state)
+    target_storage.save(state)
+    return state
@@ -0,0 +1,24 @@
+import os
+import sys
+
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+from atomic_file import atomic_open
+from autosave import AutoSaver
+from base_storage import BaseStorage, BotState
+from binary_snapshot import iter_snapshot, read_snapshot, write_snapshot
+from binary_storage import BinaryStorage
+from checksum import file_checksum, has_valid_checksum, write_checksum
+from columnar_storage import ColumnarAddressBook, ColumnarStorage
+from compression import CODECS, compressed_writer, detect_codec, open_decompressed
+from contact_transfer import FORMATS, ImportReport, export_contacts, import_contacts
+from json_storage import JsonStorage
+from json_stream import JsonStream, iter_json_arrays
+from mapped_snapshot import MappedSnapshot
+from mapped_storage import MappedAddressBook, MappedNoteBook, MappedStorage
+from sharded_storage import ShardedAddressBook, ShardedNoteBook, ShardedStorage
+from sqlite_storage import SqliteAddressBook, SqliteStorage
+from storage_benchmark import BENCHMARK_STORAGES, benchmark_codecs, generate_state, measure_contact_memory
+from storage_exceptions import SnapshotFormatException, StorageException
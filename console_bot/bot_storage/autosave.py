@@ -0,0 +1,47 @@
+import threading
+from typing import Optional
+
+from bot_constants import BOT_AUTOSAVE_INTERVAL
+
+COLOR_RED = '\033[91m'
+COLOR_WHITE = '\033[97m'
+
+
+class AutoSaver:
+    """A background thread saving the bot's state whenever its books have unsaved changes."""
+
+    def __init__(self, bot: "ConsoleBot", interval: float = BOT_AUTOSAVE_INTERVAL) -> None:
+        self.bot = bot
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start saving the state every `interval` seconds; a non-positive interval disables autosave."""
+        if self.interval <= 0 or self._thread:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="bot-autosave", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the autosave thread."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def save_if_dirty(self) -> bool:
+        """Save the state if any of the books has changed since the last save."""
+        if not (self.bot.address_book.has_changes() or self.bot.note_book.has_changes()):
+            return False
+        self.bot._save_handler(self.bot)
+        return True
+
+    def _run(self) -> None:
+        """Save the changes until the autosave is stopped."""
+        while not self._stopped.wait(self.interval):
+            try:
+                self.save_if_dirty()
+            except Exception as ex:
+                print(COLOR_RED + f"ERROR: Autosave failed: {ex}" + COLOR_WHITE)
@@ -0,0 +1,26 @@
+from abc import ABC, abstractmethod
+
+from book_items import AddressBook, NoteBook
+
+
+class BaseStorage(ABC):
+    """Base class for the storages of the bot's state."""
+    # A read-only storage saves nothing, so the bot can not go on with fresh books when recalling fails.
+    read_only = False
+
+    @abstractmethod
+    def recall(self, bot: "ConsoleBot") -> None:
+        """Load the bot's books from the storage."""
+        ...
+
+    @abstractmethod
+    def save(self, bot: "ConsoleBot") -> None:
+        """Persist the bot's books to the storage."""
+        ...
+
+
+class BotState:
+    """The books of the bot, detached from the bot itself."""
+    def __init__(self, address_book: AddressBook = None, note_book: NoteBook = None) -> None:
+        self.address_book = address_book if address_book is not None else AddressBook()
+        self.note_book = note_book if note_book is not None else NoteBook()
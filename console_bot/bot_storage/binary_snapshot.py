@@ -0,0 +1,215 @@
+"""Compact binary snapshot of the bot's books.
+
+Layout (little-endian):
+    header     magic, format version, flags, number of strings, contacts and notes
+    section 1  u32 end offset in bytes of every string of the string table
+    section 2  UTF-8 encoded concatenation of the strings
+    section 3  contacts, each as a u32 run length followed by the string ids of its fields
+    section 4  notes, each as a u32 run length followed by the string ids of summary, text and tags
+    section 5  u32 offsets of the contact runs in section 3, ordered by contact name
+    section 6  u32 offsets of the note runs in section 4
+    section 7  u32 ids of the notes in the order of section 4
+    section 8  u32 id the next added note gets, so the ids of deleted notes are not given again
+Every section is prefixed with its u64 size in bytes and padded to 4 bytes. Equal strings are stored
+once in the table, string ids start from 1 and id 0 stands for a missing value.
+"""
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from storage_exceptions import SnapshotFormatException
+
+MAGIC = b"CBSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII")
+SECTION = struct.Struct("<Q")
+ALIGNMENT = 4
+NO_STRING = 0
+NO_NOTE_ID = 0
+
+RECORD_FIELDS = ("name", "phone", "birthday", "email", "address")
+
+
+class StringTable:
+    """A table assigning a single id to every distinct string."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[Optional[str], int] = {None: NO_STRING}
+
+    def add(self, value: Optional[str]) -> int:
+        """Return the id of the string adding it to the table if needed."""
+        return self._ids.setdefault(value, len(self._ids))
+
+    @property
+    def strings(self) -> List[str]:
+        """Return the strings of the table ordered by their ids."""
+        return list(self._ids)[1:]
+
+
+def write_snapshot(f: BinaryIO,
+                   records: Iterable[Dict[str, str]],
+                   notes: Iterable[Dict[str, Any]],
+                   next_note_id: int = NO_NOTE_ID
+                   ) -> None:
+    """Write the records and notes as a binary snapshot together with the id the next note gets."""
+    table = StringTable()
+    add = table.add
+    contacts, contact_offsets, names = array("I"), array("I"), []
+    for record in records:
+        contact_offsets.append(len(contacts))
+        names.append(record.get("name"))
+        contacts.append(len(RECORD_FIELDS))
+        contacts.extend([add(record.get(field)) for field in RECORD_FIELDS])
+    note_runs, note_offsets, note_ids = array("I"), array("I"), array("I")
+    for note in notes:
+        note_ids.append(note["id"])
+        ids = [add(note.get("summary")), add(note.get("text"))]
+        ids.extend([add(tag) for tag in note.get("tags") or []])
+        note_offsets.append(len(note_runs))
+        note_runs.append(len(ids))
+        note_runs.extend(ids)
+    name_index = array("I", (contact_offsets[position] for position in sorted(range(len(names)), key=names.__getitem__)))
+    encoded = [string.encode("utf-8") for string in table.strings]
+    string_ends = array("I", accumulate(map(len, encoded)))
+    f.write(HEADER.pack(MAGIC, VERSION, 0, len(encoded), len(contact_offsets), len(note_offsets)))
+    for section in (_to_bytes(string_ends), b"".join(encoded), _to_bytes(contacts), _to_bytes(note_runs),
+                    _to_bytes(name_index), _to_bytes(note_offsets), _to_bytes(note_ids),
+                    _to_bytes(array("I", [next_note_id]))):
+        f.write(SECTION.pack(len(section)))
+        f.write(section)
+        f.write(b"\0" * (-len(section) % ALIGNMENT))
+
+
+def iter_snapshot(f: BinaryIO) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Iterate over the ("addressBook", record) and ("noteBook", note) pairs of a binary snapshot.
+
+    The pairs end with ("nextNoteId", id).
+    """
+    contacts, notes, next_note_id = read_snapshot(f)
+    for fields in contacts:
+        yield "addressBook", dict(zip(RECORD_FIELDS, fields))
+    for note in notes:
+        yield "noteBook", note
+    yield "nextNoteId", next_note_id
+
+
+def read_snapshot(f: BinaryIO) -> Tuple[Iterator[Tuple[Optional[str], ...]], List[Dict[str, Any]], int]:
+    """Read a binary snapshot as the field values of its contacts in RECORD_FIELDS order, its notes and the next note id.
+
+    The contacts are decoded as they are iterated, and no dictionary is built for them.
+    """
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise SnapshotFormatException("Snapshot is truncated.")
+    magic, version, _, strings_count, contacts_count, notes_count = HEADER.unpack(header)
+    check_header(magic, version)
+    offsets = _read_array(f)
+    if len(offsets) != strings_count:
+        raise SnapshotFormatException("String table does not match the header.")
+    blob = _read_section(f)
+    try:
+        strings = _decode_strings(blob, offsets)
+    except UnicodeDecodeError as ex:
+        raise SnapshotFormatException(f"Invalid string table: {ex}")
+    contacts = _read_array(f)
+    note_runs = _read_array(f)
+    # The name index and the note offsets are only needed for random access.
+    _read_section(f)
+    _read_section(f)
+    note_ids = _read_array(f)
+    if len(note_ids) != notes_count:
+        raise SnapshotFormatException("Note ids do not match the header.")
+    next_note_id = _read_array(f)
+    if len(next_note_id) != 1:
+        raise SnapshotFormatException("Invalid next note id.")
+    notes = []
+    try:
+        for position, ids in enumerate(_iter_runs(note_runs, notes_count)):
+            note = note_from_ids(ids, strings.__getitem__)
+            note["id"] = note_ids[position]
+            notes.append(note)
+    except IndexError:
+        raise SnapshotFormatException("Snapshot refers to a missing string.")
+    return _iter_contacts(contacts, contacts_count, strings), notes, next_note_id[0]
+
+
+def check_header(magic: bytes, version: int) -> None:
+    """Check that the header belongs to a snapshot this module can read."""
+    if magic != MAGIC:
+        raise SnapshotFormatException("Not a binary snapshot of the bot's state.")
+    if version != VERSION:
+        raise SnapshotFormatException(f"Unsupported snapshot version: {version}.")
+
+
+def note_from_ids(ids: Iterable[int], string: Callable[[int], Optional[str]]) -> Dict[str, Any]:
+    """Build the dictionary of a note from the ids of its strings."""
+    summary, text, *tags = ids
+    return {"summary": string(summary), "text": string(text), "tags": [string(tag) for tag in tags]}
+
+
+def _decode_strings(blob: bytes, ends: array) -> List[Optional[str]]:
+    """Decode the string table; the list is indexed by string id."""
+    ends = ends.tolist()
+    strings: List[Optional[str]] = [None]
+    strings.extend(blob[start:end].decode("utf-8") for start, end in zip([0] + ends[:-1], ends))
+    return strings
+
+
+def _iter_contacts(contacts: array, count: int, strings: List[Optional[str]]) -> Iterator[Tuple[Optional[str], ...]]:
+    """Iterate over the field values of the contacts."""
+    width = len(RECORD_FIELDS) + 1
+    try:
+        if len(contacts) == width * count and contacts[0::width].count(len(RECORD_FIELDS)) == count:
+            # All runs have the same length, so the fields are decoded column by column.
+            yield from zip(*(map(strings.__getitem__, contacts[column::width]) for column in range(1, width)))
+            return
+        for ids in _iter_runs(contacts, count):
+            yield tuple(strings[string_id] for string_id in ids)
+    except IndexError:
+        raise SnapshotFormatException("Snapshot refers to a missing string.")
+
+
+def _iter_runs(values: array, count: int) -> Iterator[array]:
+    """Iterate over the length-prefixed runs of ids."""
+    pos = 0
+    for _ in range(count):
+        if pos >= len(values):
+            raise SnapshotFormatException("Snapshot is truncated.")
+        length = values[pos]
+        yield values[pos + 1:pos + 1 + length]
+        pos += 1 + length
+
+
+def _to_bytes(values: array) -> bytes:
+    """Return the little-endian bytes of the array."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_section(f: BinaryIO) -> bytes:
+    """Read the next size-prefixed section."""
+    size = f.read(SECTION.size)
+    if len(size) != SECTION.size:
+        raise SnapshotFormatException("Snapshot is truncated.")
+    (size,) = SECTION.unpack(size)
+    data = f.read(size)
+    if len(data) != size:
+        raise SnapshotFormatException("Snapshot is truncated.")
+    f.read(-size % ALIGNMENT)
+    return data
+
+
+def _read_array(f: BinaryIO) -> array:
+    """Read the next section as an array of u32."""
+    data = _read_section(f)
+    if len(data) % 4:
+        raise SnapshotFormatException("Snapshot section is misaligned.")
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
@@ -0,0 +1,52 @@
+import gc
+from typing import Any, Dict, Tuple
+
+from atomic_file import atomic_open
+from binary_snapshot import iter_snapshot, read_snapshot, write_snapshot
+from bot_constants import (BOT_BINARY_JOURNAL_FILE, BOT_BINARY_STATE_FILE, BOT_COMPRESSION, BOT_JOURNAL_COMPACT_SIZE,
+                           BOT_VERIFY_STATE)
+from book_items import AddressBook, NoteBook
+from compression import compressed_writer, open_decompressed
+from json_storage import JsonStorage
+
+
+class BinaryStorage(JsonStorage):
+    """A storage keeping a compact binary snapshot of the books and a journal of the changes made since."""
+
+    def __init__(self,
+                 state_file: str = BOT_BINARY_STATE_FILE,
+                 journal_file: str = BOT_BINARY_JOURNAL_FILE,
+                 compact_size: int = BOT_JOURNAL_COMPACT_SIZE,
+                 compression: str = BOT_COMPRESSION,
+                 verify: bool = BOT_VERIFY_STATE
+                 ) -> None:
+        super().__init__(state_file=state_file,
+                         journal_file=journal_file,
+                         compact_size=compact_size,
+                         compression=compression,
+                         verify=verify
+                         )
+
+    def _load_snapshot(self, validate: bool = True) -> Tuple[AddressBook, NoteBook]:
+        """Build the books from the binary snapshot, in bulk and without validation when it is trusted."""
+        with open_decompressed(self.state_file) as f:
+            if validate:
+                return self._fill_books(iter_snapshot(f), validate=validate)
+            contacts, notes, next_note_id = read_snapshot(f)
+            # Everything decoded lives as long as the books, so collecting garbage while it is built only costs time.
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                address_book = self.address_book_class()
+                address_book.load_trusted(contacts)
+                note_book = NoteBook.from_dict(notes)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            note_book.next_index = next_note_id
+            return address_book, note_book
+
+    def _write_snapshot(self, data: Dict[str, Any]) -> None:
+        """Write the binary snapshot of the bot's state replacing the previous one."""
+        with atomic_open(self.state_file, "wb") as raw, compressed_writer(raw, self.compression) as f:
+            write_snapshot(f, data["addressBook"], data["noteBook"], data["nextNoteId"])
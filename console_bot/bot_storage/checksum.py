@@ -0,0 +1,42 @@
+import hashlib
+import os
+from typing import Optional
+
+from atomic_file import atomic_open
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def checksum_path(path: str) -> str:
+    """Return the path of the file keeping the checksum of a snapshot."""
+    return f"{path}.sha256"
+
+
+def file_checksum(path: str) -> str:
+    """Return the SHA-256 hex digest of the file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_checksum(path: str) -> None:
+    """Store the checksum of the snapshot next to it."""
+    with atomic_open(checksum_path(path), "w") as f:
+        f.write(file_checksum(path))
+
+
+def read_checksum(path: str) -> Optional[str]:
+    """Return the stored checksum of the snapshot, if there is one."""
+    try:
+        with open(checksum_path(path), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def has_valid_checksum(path: str) -> bool:
+    """Check if the snapshot is exactly the one its stored checksum was computed for."""
+    stored = read_checksum(path)
+    return stored is not None and os.path.exists(path) and stored == file_checksum(path)
@@ -0,0 +1,193 @@
+import weakref
+from array import array
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from birthday_index import clamp_day
+from book_items import AddressBook, Record
+from json_storage import JsonStorage
+
+NO_BIRTHDAY = 0
+
+
+def pack_birthday(birthday: Optional[str]) -> int:
+    """Pack a DD.MM.YYYY birthday into the YYYYMMDD integer kept in the birthday column."""
+    if not birthday:
+        return NO_BIRTHDAY
+    day, month, year = birthday.split(".")
+    return int(year) * 10000 + int(month) * 100 + int(day)
+
+
+def unpack_birthday(packed: int) -> Optional[str]:
+    """Return the DD.MM.YYYY birthday packed into the integer."""
+    if packed == NO_BIRTHDAY:
+        return None
+    year, month_day = divmod(packed, 10000)
+    month, day = divmod(month_day, 100)
+    return f"{day:02d}.{month:02d}.{year:04d}"
+
+
+class ColumnarRecords(MutableMapping):
+    """A mapping of contact names to records keeping every field of all contacts in a column of its own.
+
+    Birthdays are packed into an array of integers and the other fields are lists of strings,
+    so the book holds no objects per contact. Records are built only for the contacts which are accessed.
+    """
+
+    def __init__(self, on_load: Callable[[Record], None]) -> None:
+        self._on_load = on_load
+        self._rows: Dict[str, int] = {}
+        # Rows of deleted contacts are reused by the next added ones.
+        self._free_rows: List[int] = []
+        self._names: List[Optional[str]] = []
+        self._phones: List[Optional[str]] = []
+        self._emails: List[Optional[str]] = []
+        self._addresses: List[Optional[str]] = []
+        self._birthdays = array("I")
+        # Records are built from the columns on demand and live only as long as someone uses them.
+        self._cache: "weakref.WeakValueDictionary[str, Record]" = weakref.WeakValueDictionary()
+
+    def __getitem__(self, name: str) -> Record:
+        record = self._cache.get(name)
+        if record is None:
+            record = self._load(self._rows[name])
+        return record
+
+    def __setitem__(self, name: str, record: Record) -> None:
+        row = self._rows.get(name)
+        if row is None:
+            row = self._free_rows.pop() if self._free_rows else self._append_row()
+            self._rows[name] = row
+        # On rename the record still holds its old name when it is moved to the new key.
+        self._names[row] = name
+        self._phones[row] = record.phone.value if record.phone else None
+        self._emails[row] = record.email.value if record.email else None
+        self._addresses[row] = record.address.value if record.address else None
+        self._birthdays[row] = pack_birthday(record.birthday.value if record.birthday else None)
+        self._cache[name] = record
+
+    def __delitem__(self, name: str) -> None:
+        row = self._rows.pop(name)
+        self._names[row] = self._phones[row] = self._emails[row] = self._addresses[row] = None
+        self._birthdays[row] = NO_BIRTHDAY
+        self._free_rows.append(row)
+        self._cache.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def values(self) -> Iterator[Record]:
+        """Iterate over the records of all contacts."""
+        for name, row in self._rows.items():
+            yield self._cache.get(name) or self._load(row)
+
+    def column(self, field: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate over the names of all contacts with the value of their field, without building the records."""
+        if field == "name":
+            for name in self._rows:
+                yield name, name
+        elif field == "birthday":
+            birthdays = self._birthdays
+            for name, row in self._rows.items():
+                yield name, unpack_birthday(birthdays[row])
+        else:
+            values = {"phone": self._phones, "email": self._emails, "address": self._addresses}[field]
+            for name, row in self._rows.items():
+                yield name, values[row]
+
+    def birthday_days(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """Iterate over the names of the contacts having a birthday together with its month and day."""
+        birthdays = self._birthdays
+        for name, row in self._rows.items():
+            if packed := birthdays[row]:
+                yield name, clamp_day(*divmod(packed % 10000, 100))
+
+    def rows(self) -> Iterator[Dict[str, Optional[str]]]:
+        """Iterate over the dictionaries of all contacts without building the records."""
+        for name, row in self._rows.items():
+            yield {"name": name,
+                   "phone": self._phones[row],
+                   "birthday": unpack_birthday(self._birthdays[row]),
+                   "email": self._emails[row],
+                   "address": self._addresses[row]}
+
+    def copy_rows(self) -> Callable[[], List[Dict[str, Optional[str]]]]:
+        """Copy the columns and return a function converting the copy to the dictionaries of the contacts."""
+        rows, phones, emails, addresses = dict(self._rows), list(self._phones), list(self._emails), list(self._addresses)
+        birthdays = array("I", self._birthdays)
+        return lambda: [{"name": name,
+                         "phone": phones[row],
+                         "birthday": unpack_birthday(birthdays[row]),
+                         "email": emails[row],
+                         "address": addresses[row]} for name, row in rows.items()]
+
+    def _append_row(self) -> int:
+        """Add an empty row to the end of every column."""
+        for column in (self._names, self._phones, self._emails, self._addresses):
+            column.append(None)
+        self._birthdays.append(NO_BIRTHDAY)
+        return len(self._names) - 1
+
+    def _load(self, row: int) -> Record:
+        """Build the record of the row from the columns, without validating the values again."""
+        record = Record(self._names[row])._fill_trusted({"phone": self._phones[row],
+                                                         "birthday": unpack_birthday(self._birthdays[row]),
+                                                         "email": self._emails[row],
+                                                         "address": self._addresses[row]})
+        self._on_load(record)
+        self._cache[self._names[row]] = record
+        return record
+
+
+class ColumnarAddressBook(AddressBook):
+    """An address book keeping its contacts in columns and building records only for the ones it returns."""
+    def __init__(self) -> None:
+        super().__init__()
+        self.data = ColumnarRecords(on_load=self._attach)
+
+    def get_all_records(self) -> List[Record]:
+        """Return all records in the address book."""
+        return list(self.data.values())
+
+    def to_dict(self) -> List[Dict[str, str]]:
+        """Convert the address book to a dictionary."""
+        with self._lock:
+            return list(self.data.rows())
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        """Iterate over the dictionaries of all records without building them."""
+        return self.data.rows()
+
+    def deferred_dict(self) -> Callable[[], List[Dict[str, str]]]:
+        """Return a function converting the address book as it is now to a dictionary, copying only the columns now."""
+        with self._lock:
+            return self.data.copy_rows()
+
+    def _attach(self, record: Record) -> None:
+        """Subscribe the address book to the changes of a record built from the columns."""
+        self._attach_hooks(record)
+
+    def _iter_birthday_days(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """Iterate over the names and birthday months and days of the contacts, unpacking the birthday column."""
+        return self.data.birthday_days()
+
+    def _iter_field(self, field: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate over the names of all contacts with the value of their field, scanning a single column."""
+        return self.data.column(field)
+
+    def _on_record_change(self, record: Record) -> None:
+        """Write the changed record back to the columns."""
+        with self._lock:
+            self.data[record.name.value] = record
+            super()._on_record_change(record)
+
+
+class ColumnarStorage(JsonStorage):
+    """A storage keeping the JSON snapshot and journal but loading the contacts into a columnar address book."""
+    address_book_class = ColumnarAddressBook
@@ -0,0 +1,75 @@
+import bz2
+import gzip
+import io
+import lzma
+from contextlib import contextmanager
+from typing import IO, BinaryIO, Callable, Dict, Iterator, Optional
+
+from storage_exceptions import SnapshotFormatException, StorageException
+
+NO_COMPRESSION = "none"
+# The leading bytes every file written by the codec starts with.
+CODEC_MAGIC = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "lzma": b"\xfd7zXZ\x00",
+}
+CODEC_WRITERS: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    "gzip": lambda f: gzip.GzipFile(fileobj=f, mode="wb"),
+    "bz2": lambda f: bz2.BZ2File(f, "wb"),
+    "lzma": lambda f: lzma.LZMAFile(f, "wb"),
+}
+CODEC_READERS: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    "gzip": lambda f: gzip.GzipFile(fileobj=f, mode="rb"),
+    "bz2": lambda f: bz2.BZ2File(f, "rb"),
+    "lzma": lambda f: lzma.LZMAFile(f, "rb"),
+}
+CODECS = (NO_COMPRESSION, *CODEC_WRITERS)
+
+
+def check_codec(codec: str) -> str:
+    """Check that the compression codec is supported."""
+    if codec not in CODECS:
+        raise StorageException(f"Unsupported compression: {codec}. Supported compressions: {', '.join(CODECS)}")
+    return codec
+
+
+def detect_codec(path: str) -> str:
+    """Return the codec the file is compressed with by its leading bytes."""
+    with open(path, "rb") as f:
+        head = f.read(max(map(len, CODEC_MAGIC.values())))
+    for codec, magic in CODEC_MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return NO_COMPRESSION
+
+
+@contextmanager
+def open_decompressed(path: str, encoding: Optional[str] = None) -> Iterator[IO]:
+    """Open the file for reading, decompressing it with the codec it was written with."""
+    codec = detect_codec(path)
+    with open(path, "rb") as f:
+        stream = CODEC_READERS[codec](f) if codec != NO_COMPRESSION else f
+        try:
+            yield io.TextIOWrapper(stream, encoding=encoding) if encoding else stream
+        except (EOFError, OSError, lzma.LZMAError) as ex:
+            raise SnapshotFormatException(f"Could not decompress {path}: {ex}")
+        finally:
+            stream.close()
+
+
+@contextmanager
+def compressed_writer(f: BinaryIO, codec: str, encoding: Optional[str] = None) -> Iterator[IO]:
+    """Wrap the file so everything written to it is compressed with the codec; the file itself is left open."""
+    stream = CODEC_WRITERS[check_codec(codec)](f) if codec != NO_COMPRESSION else f
+    text = io.TextIOWrapper(stream, encoding=encoding) if encoding else None
+    try:
+        yield text if text else stream
+        if text:
+            text.flush()
+    finally:
+        if text:
+            # Detaching keeps the wrapper from closing the file it was given.
+            text.detach()
+        if stream is not f:
+            stream.close()
@@ -0,0 +1,218 @@
+"""Streaming import and export of contacts in the CSV and vCard formats.
+
+Files are read and written one contact at a time, so their size is only bounded by the address book itself.
+"""
+import csv
+import os
+import re
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from atomic_file import atomic_open
+from bot_constants import BOT_IMPORT_BATCH_SIZE
+from book_items import AddressBook
+
+RECORD_FIELDS = ("name", "phone", "birthday", "email", "address")
+# Only the first errors are kept for the report, the rest are counted.
+MAX_REPORTED_ERRORS = 20
+# The fields stored as plain text vCard properties; only the first phone and email of a contact are imported.
+VCARD_TEXT_FIELDS = {"TEL": "phone", "EMAIL": "email"}
+# vCard lines longer than this are folded onto continuation lines.
+VCARD_LINE_LENGTH = 75
+
+Progress = Callable[[int, Optional[float]], None]
+
+
+class ImportReport:
+    """The outcome of a contacts import."""
+
+    def __init__(self) -> None:
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def add_error(self, position: int, message: str) -> None:
+        """Count an entry which could not be imported."""
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((position, message))
+
+
+def read_csv(f: IO[str]) -> Iterator[Dict[str, Optional[str]]]:
+    """Iterate over the contacts of a CSV file with a header row naming the fields."""
+    reader = csv.reader(f)
+    header = [column.strip().lower() for column in next(reader, [])]
+    for row in reader:
+        if not any(row):
+            continue
+        values = dict(zip(header, row))
+        yield {field: values.get(field, "").strip() or None for field in RECORD_FIELDS}
+
+
+def write_csv(f: IO[str], rows: Iterable[Dict[str, Optional[str]]]) -> None:
+    """Write the contacts as a CSV file with a header row."""
+    writer = csv.writer(f)
+    writer.writerow(RECORD_FIELDS)
+    for row in rows:
+        writer.writerow([row.get(field) or "" for field in RECORD_FIELDS])
+
+
+def read_vcard(f: IO[str]) -> Iterator[Dict[str, Optional[str]]]:
+    """Iterate over the contacts of a vCard file."""
+    contact: Optional[Dict[str, Optional[str]]] = None
+    for line in _unfold(f):
+        name, _, value = line.partition(":")
+        # Parameters like TEL;TYPE=CELL and group prefixes like item1.EMAIL are not used.
+        name = name.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+        if name == "BEGIN" and value.upper() == "VCARD":
+            contact = dict.fromkeys(RECORD_FIELDS)
+        elif name == "END" and value.upper() == "VCARD":
+            if contact is not None:
+                yield contact
+            contact = None
+        elif contact is None:
+            continue
+        elif name == "FN":
+            contact["name"] = _unescape(value).strip() or None
+        elif name == "N" and not contact["name"]:
+            # The structured name is family;given;additional;prefixes;suffixes.
+            family, given, *_ = _split_escaped(value) + ["", ""]
+            contact["name"] = " ".join(part for part in (given, family) if part) or None
+        elif name in VCARD_TEXT_FIELDS and not contact[VCARD_TEXT_FIELDS[name]]:
+            contact[VCARD_TEXT_FIELDS[name]] = _unescape(value).strip() or None
+        elif name == "BDAY":
+            contact["birthday"] = _vcard_date(value.strip())
+        elif name == "ADR" and not contact["address"]:
+            contact["address"] = ", ".join(part for part in _split_escaped(value) if part) or None
+
+
+def write_vcard(f: IO[str], rows: Iterable[Dict[str, Optional[str]]]) -> None:
+    """Write the contacts as vCard 3.0 entries."""
+    for row in rows:
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{_escape(row['name'])}", f"N:{_escape(row['name'])};;;;"]
+        if row.get("phone"):
+            lines.append(f"TEL;TYPE=CELL:{_escape(row['phone'])}")
+        if row.get("email"):
+            lines.append(f"EMAIL:{_escape(row['email'])}")
+        if birthday := _birthday_vcard_date(row.get("birthday")):
+            lines.append(f"BDAY:{birthday}")
+        if row.get("address"):
+            lines.append(f"ADR:;;{_escape(row['address'])};;;;")
+        lines.append("END:VCARD")
+        f.write("".join(_fold(line) + "\r\n" for line in lines))
+
+
+FORMATS: Dict[str, Tuple[Callable[[IO[str]], Iterator[Dict[str, Optional[str]]]],
+                         Callable[[IO[str], Iterable[Dict[str, Optional[str]]]], None]]] = {
+    "csv": (read_csv, write_csv),
+    "vcard": (read_vcard, write_vcard),
+}
+
+
+def import_contacts(address_book: AddressBook,
+                    path: str,
+                    file_format: str,
+                    batch_size: int = BOT_IMPORT_BATCH_SIZE,
+                    on_progress: Optional[Progress] = None
+                    ) -> ImportReport:
+    """Add the contacts of the file to the address book, contacts with the same name are replaced."""
+    reader, _ = FORMATS[file_format]
+    report = ImportReport()
+    total_size = os.path.getsize(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        entries = enumerate(reader(f), start=1)
+        while batch := list(islice(entries, batch_size)):
+            errors = address_book.add_records(data for _, data in batch)
+            for index, message in errors:
+                report.add_error(batch[index][0], message)
+            report.imported += len(batch) - len(errors)
+            if on_progress:
+                on_progress(report.imported + report.failed, f.buffer.tell() / total_size if total_size else None)
+    return report
+
+
+def export_contacts(address_book: AddressBook,
+                    path: str,
+                    file_format: str,
+                    batch_size: int = BOT_IMPORT_BATCH_SIZE,
+                    on_progress: Optional[Progress] = None
+                    ) -> int:
+    """Write all contacts of the address book to the file and return their number."""
+    _, writer = FORMATS[file_format]
+    total = len(address_book)
+    exported = 0
+
+    def rows() -> Iterator[Dict[str, Optional[str]]]:
+        nonlocal exported
+        for row in address_book.iter_rows():
+            yield row
+            exported += 1
+            if on_progress and exported % batch_size == 0:
+                on_progress(exported, exported / total if total else None)
+
+    with atomic_open(path, "w", encoding="utf-8", newline="") as f:
+        writer(f, rows())
+    if on_progress:
+        on_progress(exported, 1.0)
+    return exported
+
+
+def _unfold(f: IO[str]) -> Iterator[str]:
+    """Iterate over the logical lines of a vCard file joining the folded ones."""
+    current = None
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _fold(line: str) -> str:
+    """Fold a long vCard line onto continuation lines."""
+    if len(line) <= VCARD_LINE_LENGTH:
+        return line
+    parts = [line[:VCARD_LINE_LENGTH]]
+    parts.extend(line[start:start + VCARD_LINE_LENGTH - 1]
+                 for start in range(VCARD_LINE_LENGTH, len(line), VCARD_LINE_LENGTH - 1))
+    return "\r\n ".join(parts)
+
+
+def _escape(value: str) -> str:
+    """Escape the special characters of a vCard text value."""
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _unescape(value: str) -> str:
+    """Undo the escaping of a vCard text value."""
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def _split_escaped(value: str) -> List[str]:
+    """Split a structured vCard value on the semicolons which are not escaped."""
+    return [_unescape(part).strip() for part in re.split(r"(?<!\\);", value)]
+
+
+def _birthday_vcard_date(value: Optional[str]) -> Optional[str]:
+    """Convert a birthday to a vCard date, or None if it is not a real date, so the contact is exported without it."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _vcard_date(value: str) -> Optional[str]:
+    """Convert a vCard date to the format of the birthday field, leaving unknown formats as they are."""
+    for date_format in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(value[:10], date_format).strftime("%d.%m.%Y")
+        except ValueError:
+            continue
+    return value or None
@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from atomic_file import atomic_open
+from base_storage import BaseStorage
+from bot_constants import BOT_COMPRESSION, BOT_JOURNAL_COMPACT_SIZE, BOT_JOURNAL_FILE, BOT_STATE_FILE, BOT_VERIFY_STATE
+from book_items import AddressBook, NoteBook
+from checksum import has_valid_checksum, write_checksum
+from compression import check_codec, compressed_writer, open_decompressed
+from json_stream import iter_json_arrays
+from storage_exceptions import SnapshotFormatException
+
+COLOR_RED = '\033[91m'
+COLOR_WHITE = '\033[97m'
+
+
+def iter_journal(journal_file: str) -> Iterator[Dict[str, Any]]:
+    """Iterate over the entries of a journal, skipping the ones an interrupted write left incomplete."""
+    if not os.path.exists(journal_file):
+        return
+    with open(journal_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print("Ignored incomplete entry in journal: ", line.strip())
+
+
+class JsonStorage(BaseStorage):
+    """A storage keeping a JSON snapshot of the books and a journal of the changes made since."""
+    # The class of the address book the contacts are loaded into.
+    address_book_class = AddressBook
+
+    def __init__(self,
+                 state_file: str = BOT_STATE_FILE,
+                 journal_file: str = BOT_JOURNAL_FILE,
+                 compact_size: int = BOT_JOURNAL_COMPACT_SIZE,
+                 compression: str = BOT_COMPRESSION,
+                 verify: bool = BOT_VERIFY_STATE
+                 ) -> None:
+        self.state_file = state_file
+        self.journal_file = journal_file
+        # While the journal is being folded into a snapshot it is moved aside, so new entries go to a fresh journal.
+        self.compacting_file = journal_file + ".compacting"
+        self.compact_size = compact_size
+        # Snapshots are written with this codec and read with whichever codec they were written with.
+        self.compression = check_codec(compression)
+        # Snapshots matching their checksum are loaded without validating every field again, unless verify is set.
+        self.verify = verify
+        self._lock = threading.RLock()
+        self._journaled_books: Optional[Tuple[AddressBook, NoteBook]] = None
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    def recall(self, bot: "ConsoleBot") -> None:
+        """Load the snapshot and replay the journal on top of it."""
+        address_book, note_book = bot.address_book, bot.note_book
+        if os.path.exists(self.state_file):
+            try:
+                validate = self.verify or not has_valid_checksum(self.state_file)
+                address_book, note_book = self._load_snapshot(validate=validate)
+            except (json.JSONDecodeError, SnapshotFormatException):
+                bot.address_book = self.address_book_class()
+                bot.note_book = NoteBook()
+                raise MemoryError(COLOR_RED + "ERROR: Could not recall bot state. Starting with a fresh state." + COLOR_WHITE)
+        elif not isinstance(address_book, self.address_book_class):
+            address_book = self.address_book_class.from_dict(address_book.iter_rows())
+        for journal_file in (self.compacting_file, self.journal_file):
+            self._replay_journal(journal_file, address_book, note_book)
+        address_book.pop_changes()
+        note_book.pop_changes()
+        bot.address_book = address_book
+        bot.note_book = note_book
+        self._journaled_books = (address_book, note_book)
+
+    def save(self, bot: "ConsoleBot") -> None:
+        """Append the changes to the journal, or write a new snapshot if there is no journal for the books."""
+        with self._lock:
+            if self._is_journaled(bot):
+                self._append_journal(bot)
+                compact = os.path.getsize(self.journal_file) >= self.compact_size \
+                    if os.path.exists(self.journal_file) else False
+            else:
+                # The books were not recalled from the current snapshot, so the journal cannot be applied to them.
+                self.compact(bot)
+                compact = False
+        if compact:
+            self._compact_journal(bot)
+
+    def compact(self, bot: "ConsoleBot") -> None:
+        """Write a full snapshot of the bot's books and drop the journal."""
+        with self._lock:
+            if self._compaction_thread:
+                self._compaction_thread.join()
+            bot.address_book.pop_changes()
+            bot.note_book.pop_changes()
+            self._save_snapshot(self._snapshot_data(bot))
+            for journal_file in (self.compacting_file, self.journal_file):
+                if os.path.exists(journal_file):
+                    os.remove(journal_file)
+            self._journaled_books = (bot.address_book, bot.note_book)
+
+    def has_journal(self) -> bool:
+        """Check if there are changes journaled since the last snapshot."""
+        return os.path.exists(self.journal_file) or os.path.exists(self.compacting_file)
+
+    def _load_snapshot(self, validate: bool = True) -> Tuple[AddressBook, NoteBook]:
+        """Build the books from the snapshot decoding one record at a time."""
+        with open_decompressed(self.state_file, encoding="utf-8") as f:
+            return self._fill_books(iter_json_arrays(f), validate=validate)
+
+    @classmethod
+    def _fill_books(cls, items: Iterable[Tuple[str, Dict[str, Any]]], validate: bool = True) -> Tuple[AddressBook, NoteBook]:
+        """Build the books from the (book, item) pairs of a snapshot."""
+        address_book, note_book = cls.address_book_class(), NoteBook()
+        for key, item in items:
+            if key == "addressBook":
+                address_book.load_record(item, validate=validate)
+            elif key == "noteBook":
+                note_book.load_note(item)
+            elif key == "nextNoteId":
+                note_book.next_index = item
+        return address_book, note_book
+
+    def _is_journaled(self, bot: "ConsoleBot") -> bool:
+        """Check if the bot's books are the ones the journal is kept for."""
+        return self._journaled_books is not None \
+            and self._journaled_books[0] is bot.address_book \
+            and self._journaled_books[1] is bot.note_book
+
+    @staticmethod
+    def _snapshot_data(bot: "ConsoleBot") -> Dict[str, Any]:
+        """Return the full state of the bot as a dictionary."""
+        # The counter is read after the notes, so it is past the id of every note saved.
+        data = {"addressBook": bot.address_book.to_dict(), "noteBook": bot.note_book.to_dict()}
+        data["nextNoteId"] = bot.note_book.next_index
+        return data
+
+    def _save_snapshot(self, data: Dict[str, Any]) -> None:
+        """Write the snapshot together with its checksum."""
+        self._write_snapshot(data)
+        write_checksum(self.state_file)
+
+    def _write_snapshot(self, data: Dict[str, Any]) -> None:
+        """Write the snapshot of the bot's state replacing the previous one."""
+        with atomic_open(self.state_file, "wb") as raw, compressed_writer(raw, self.compression, encoding="utf-8") as f:
+            try:
+                json.dump(data, f, indent=4)
+            except (TypeError, ValueError):
+                raise MemoryError(COLOR_RED + "ERROR: Could not save bot state." + COLOR_WHITE)
+
+    def _append_journal(self, bot: "ConsoleBot") -> None:
+        """Append the changes made since the last save to the journal."""
+        changed, deleted = bot.address_book.pop_changes()
+        changed_notes, deleted_notes = bot.note_book.pop_changes()
+        entries = [{"op": "delete_record", "name": name} for name in deleted]
+        entries.extend({"op": "put_record", "data": record} for record in changed)
+        entries.extend({"op": "delete_note", "id": index} for index in deleted_notes)
+        entries.extend({"op": "put_note", "data": note} for note in changed_notes)
+        if not entries:
+            return
+        payload = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        try:
+            with open(self.journal_file, "a+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                if end:
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        # The previous session was interrupted in the middle of a write.
+                        payload = b"\n" + payload
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            # Replaying an entry twice is harmless, so the next save appends all of them again.
+            bot.address_book.restore_changes(changed, deleted)
+            bot.note_book.restore_changes(changed_notes, deleted_notes)
+            raise
+
+    @staticmethod
+    def _replay_journal(journal_file: str,
+                        address_book: AddressBook,
+                        note_book: NoteBook
+                        ) -> None:
+        """Apply the journal entries to the books."""
+        for entry in iter_journal(journal_file):
+            op = entry.get("op")
+            if op == "put_record":
+                address_book.load_record(entry["data"])
+            elif op == "delete_record":
+                address_book.delete_record(entry["name"])
+            elif op == "put_note":
+                note_book.put_note(entry["data"])
+            elif op == "delete_note":
+                note_book.delete_note(entry["id"])
+                # The note may have been added and deleted between two saves, so its id is not in the books.
+                note_book.next_index = entry["id"] + 1
+
+    def _compact_journal(self, bot: "ConsoleBot") -> None:
+        """Fold the journal into a new snapshot in a background thread."""
+        with self._lock:
+            if os.path.exists(self.compacting_file):
+                return
+            # Only references are taken here and the books are converted in the background. A change made meanwhile
+            # may reach the snapshot as well as the new journal, which is harmless as replaying an entry is idempotent.
+            records, notes = bot.address_book.deferred_dict(), bot.note_book.deferred_dict()
+            next_note_id = bot.note_book.next_index
+            os.replace(self.journal_file, self.compacting_file)
+            self._compaction_thread = threading.Thread(target=self._finish_compaction,
+                                                       args=(records, notes, next_note_id),
+                                                       name="bot-state-compaction")
+            self._compaction_thread.start()
+
+    def _finish_compaction(self,
+                           records: Callable[[], List[Dict[str, str]]],
+                           notes: Callable[[], List[Dict[str, Any]]],
+                           next_note_id: int
+                           ) -> None:
+        """Convert the books, write the compacted snapshot and drop the journal it replaces."""
+        self._save_snapshot({"addressBook": records(), "noteBook": notes(), "nextNoteId": next_note_id})
+        if os.path.exists(self.compacting_file):
+            os.remove(self.compacting_file)
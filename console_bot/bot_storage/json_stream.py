@@ -0,0 +1,88 @@
+import json
+import re
+from typing import Any, Iterator, TextIO, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonStream:
+    """A reader decoding JSON values one by one from the chunks of a file."""
+
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, or an empty string at the end of the file."""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character which must be `char`."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buffer, self._pos)
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk.
+                if not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk as well.
+            if end == len(self._buffer) and self._read():
+                continue
+            self._pos = end
+            return value
+
+    def _read(self) -> bool:
+        """Append the next chunk of the file to the buffer dropping the consumed part."""
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+
+def iter_json_arrays(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Iterate over the (key, item) pairs of the arrays of a top-level JSON object.
+
+    Members which are not arrays are yielded as a single (key, value) pair.
+    """
+    stream = JsonStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() != "]":
+                while True:
+                    yield key, stream.value()
+                    if stream.peek() != ",":
+                        break
+                    stream.expect(",")
+            stream.expect("]")
+        else:
+            yield key, stream.value()
+        if stream.peek() != ",":
+            break
+        stream.expect(",")
+    stream.expect("}")
@@ -0,0 +1,131 @@
+import mmap
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from binary_snapshot import ALIGNMENT, HEADER, NO_STRING, RECORD_FIELDS, SECTION, VERSION, check_header, note_from_ids
+from storage_exceptions import SnapshotFormatException
+
+# The number of sections of a snapshot.
+SECTIONS_COUNT = 8
+_NOT_DECODED = object()
+
+
+class MappedSnapshot:
+    """Random access to the entries of a binary snapshot mapped into memory.
+
+    Opening the snapshot only reads its header, strings are decoded when an entry using them is read.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotFormatException("Snapshot is empty.")
+        view = memoryview(self._mmap)
+        if len(view) < HEADER.size:
+            raise SnapshotFormatException("Snapshot is truncated.")
+        magic, version, _, strings_count, contacts_count, notes_count = HEADER.unpack_from(view)
+        check_header(magic, version)
+        if version != VERSION:
+            raise SnapshotFormatException(f"Unsupported snapshot version: {version}.")
+        sections, pos = [], HEADER.size
+        for _ in range(SECTIONS_COUNT):
+            if pos + SECTION.size > len(view):
+                raise SnapshotFormatException("Snapshot is truncated.")
+            (size,) = SECTION.unpack_from(view, pos)
+            pos += SECTION.size
+            if pos + size > len(view):
+                raise SnapshotFormatException("Snapshot is truncated.")
+            sections.append(view[pos:pos + size])
+            pos += size + (-size % ALIGNMENT)
+        string_ends, self._blob, contacts, note_runs, name_index, note_offsets, note_ids, next_note_id = sections
+        self._string_ends = _as_u32(string_ends)
+        self._contacts = _as_u32(contacts)
+        self._note_runs = _as_u32(note_runs)
+        self._name_index = _as_u32(name_index)
+        self._note_offsets = _as_u32(note_offsets)
+        self._note_ids = _as_u32(note_ids)
+        if len(self._string_ends) != strings_count or len(self._name_index) != contacts_count \
+                or len(self._note_offsets) != notes_count or len(self._note_ids) != notes_count:
+            raise SnapshotFormatException("Snapshot sections do not match the header.")
+        next_note_id = _as_u32(next_note_id)
+        if len(next_note_id) != 1:
+            raise SnapshotFormatException("Invalid next note id.")
+        self.next_note_id = next_note_id[0]
+        self.contacts_count = contacts_count
+        self.notes_count = notes_count
+        self._strings: Dict[int, Optional[str]] = {NO_STRING: None}
+
+    def string(self, string_id: int) -> Optional[str]:
+        """Return the string by its id decoding it on first use."""
+        value = self._strings.get(string_id, _NOT_DECODED)
+        if value is _NOT_DECODED:
+            try:
+                start = self._string_ends[string_id - 2] if string_id > 1 else 0
+                value = str(self._blob[start:self._string_ends[string_id - 1]], "utf-8")
+            except (IndexError, UnicodeDecodeError):
+                raise SnapshotFormatException(f"Snapshot refers to an invalid string: {string_id}.")
+            self._strings[string_id] = value
+        return value
+
+    def contact(self, offset: int) -> Dict[str, Optional[str]]:
+        """Return the dictionary of the contact stored at the offset."""
+        return dict(zip(RECORD_FIELDS, map(self.string, self._run(self._contacts, offset))))
+
+    def contact_field(self, offset: int, field: str) -> Optional[str]:
+        """Return a single field of the contact stored at the offset."""
+        return self.string(self._contacts[offset + 1 + RECORD_FIELDS.index(field)])
+
+    def contact_offsets(self) -> Iterator[int]:
+        """Iterate over the offsets of the contacts in their storage order."""
+        pos = 0
+        for _ in range(self.contacts_count):
+            yield pos
+            pos += 1 + self._contacts[pos]
+
+    def find_contact(self, name: str) -> Optional[int]:
+        """Return the offset of the contact with the name by a binary search over the name index."""
+        low, high = 0, len(self._name_index)
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._name_index[middle]
+            middle_name = self.contact_field(offset, "name")
+            if middle_name == name:
+                return offset
+            if middle_name < name:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def note(self, position: int) -> Dict[str, Any]:
+        """Return the dictionary of the note at the position."""
+        note = note_from_ids(self._run(self._note_runs, self._note_offsets[position]), self.string)
+        note["id"] = self._note_ids[position]
+        return note
+
+    def note_ids(self) -> Iterator[int]:
+        """Iterate over the ids of the notes in their storage order."""
+        return iter(self._note_ids)
+
+    @staticmethod
+    def _run(values: Sequence[int], offset: int) -> List[int]:
+        """Return the ids of the length-prefixed run at the offset."""
+        try:
+            return list(values[offset + 1:offset + 1 + values[offset]])
+        except IndexError:
+            raise SnapshotFormatException(f"Snapshot refers to an invalid entry: {offset}.")
+
+
+def _as_u32(view: memoryview) -> Sequence[int]:
+    """View the little-endian section as a sequence of u32 without copying it where possible."""
+    if len(view) % 4:
+        raise SnapshotFormatException("Snapshot section is misaligned.")
+    if sys.byteorder == "big":
+        values = array("I")
+        values.frombytes(view)
+        values.byteswap()
+        return values
+    return view.cast("I")
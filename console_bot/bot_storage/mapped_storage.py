@@ -0,0 +1,360 @@
+import os
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from base_storage import BaseStorage
+from binary_snapshot import NO_NOTE_ID, RECORD_FIELDS
+from binary_storage import BinaryStorage
+from bot_constants import BOT_BINARY_JOURNAL_FILE, BOT_BINARY_STATE_FILE
+from book_items import AddressBook, NoteBook, Note, Record
+from book_exceptions import AddressBookException, NoteBookException
+from compression import NO_COMPRESSION, detect_codec
+from json_storage import iter_journal
+from mapped_snapshot import MappedSnapshot
+from record_index import INDEXED_FIELDS, normalize
+from trigram_index import index_key
+from storage_exceptions import SnapshotFormatException
+from prompt_toolkit.validation import ValidationError
+
+COLOR_RED = '\033[91m'
+COLOR_WHITE = '\033[97m'
+
+READ_ONLY_MESSAGE = "The books are opened read-only, changes are not allowed."
+
+
+class JournalOverlay:
+    """The changes journaled since the snapshot was written, kept in memory on top of the mapped snapshot.
+
+    Only the last entry of every contact and note is kept; None stands for a deleted one.
+    """
+
+    def __init__(self) -> None:
+        self.contacts: Dict[str, Optional[Dict[str, str]]] = {}
+        self.notes: Dict[int, Optional[Dict[str, Any]]] = {}
+        self.next_note_id = NO_NOTE_ID
+
+    def apply(self, entry: Dict[str, Any]) -> None:
+        """Apply a journal entry to the overlay."""
+        op = entry.get("op")
+        if op == "put_record":
+            try:
+                Record.from_dict(entry["data"])
+            except ValidationError as e:
+                print("Ignored invalid record instorage: ", entry["data"], e)
+                return
+            self.contacts[entry["data"]["name"]] = entry["data"]
+        elif op == "delete_record":
+            self.contacts[entry["name"]] = None
+        elif op == "put_note":
+            self.notes[entry["data"]["id"]] = entry["data"]
+            self.next_note_id = max(self.next_note_id, entry["data"]["id"] + 1)
+        elif op == "delete_note":
+            self.notes[entry["id"]] = None
+            self.next_note_id = max(self.next_note_id, entry["id"] + 1)
+
+
+class MappedRecords(Mapping):
+    """A read-only mapping of contact names to the records of a mapped snapshot and the journal over it."""
+
+    def __init__(self,
+                 snapshot: MappedSnapshot,
+                 on_load: Callable[[Record], None],
+                 journaled: Optional[Dict[str, Optional[Dict[str, str]]]] = None
+                 ) -> None:
+        self._snapshot = snapshot
+        self._on_load = on_load
+        self._records: Dict[int, Record] = {}
+        self._journaled = journaled or {}
+        self._journaled_records: Dict[str, Record] = {}
+        # The journaled contacts the snapshot does not have, they come after the ones it has.
+        self._added = [name for name, row in self._journaled.items()
+                       if row is not None and snapshot.find_contact(name) is None]
+        deleted = sum(1 for name, row in self._journaled.items()
+                      if row is None and snapshot.find_contact(name) is not None)
+        self._count = snapshot.contacts_count + len(self._added) - deleted
+
+    def __getitem__(self, name: str) -> Record:
+        if name in self._journaled:
+            row = self._journaled[name]
+            if row is None:
+                raise KeyError(name)
+            return self._load_journaled(row)
+        offset = self._snapshot.find_contact(name)
+        if offset is None:
+            raise KeyError(name)
+        return self._load(offset)
+
+    def __contains__(self, name: object) -> bool:
+        if name in self._journaled:
+            return self._journaled[name] is not None
+        return isinstance(name, str) and self._snapshot.find_contact(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for offset, row in self._contacts():
+            yield self._snapshot.contact_field(offset, "name") if row is None else row["name"]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def values(self) -> Iterator[Record]:
+        """Iterate over all records of the snapshot."""
+        for offset, row in self._contacts():
+            yield self._load(offset) if row is None else self._load_journaled(row)
+
+    def rows(self) -> Iterator[Dict[str, Optional[str]]]:
+        """Iterate over the dictionaries of all contacts without building records."""
+        for offset, row in self._contacts():
+            yield self._snapshot.contact(offset) if row is None else row
+
+    def select(self, field: str, predicate: Callable[[Optional[str]], bool]) -> Iterator[Record]:
+        """Iterate over the records whose field matches the predicate decoding only that field of the others."""
+        for offset, row in self._contacts():
+            if row is None:
+                if predicate(self._snapshot.contact_field(offset, field)):
+                    yield self._load(offset)
+            elif predicate(row.get(field)):
+                yield self._load_journaled(row)
+
+    def evict(self, name: str) -> None:
+        """Forget the record built for the contact, so it is read from the snapshot again."""
+        if self._journaled_records.pop(name, None) is None:
+            offset = self._snapshot.find_contact(name)
+            self._records.pop(offset, None)
+
+    def _contacts(self) -> Iterator[Tuple[Optional[int], Optional[Dict[str, str]]]]:
+        """Iterate over the contacts in their storage order as (offset, None) when they are read from the snapshot
+        and as (None, row) when the journal has them."""
+        for offset in self._snapshot.contact_offsets():
+            if self._journaled:
+                name = self._snapshot.contact_field(offset, "name")
+                if name in self._journaled:
+                    if self._journaled[name] is not None:
+                        yield None, self._journaled[name]
+                    continue
+            yield offset, None
+        for name in self._added:
+            yield None, self._journaled[name]
+
+    def _load(self, offset: int) -> Record:
+        """Return the record of the contact at the offset building it on first use."""
+        record = self._records.get(offset)
+        if record is None:
+            record = Record.from_dict(self._snapshot.contact(offset))
+            self._on_load(record)
+            self._records[offset] = record
+        return record
+
+    def _load_journaled(self, row: Dict[str, str]) -> Record:
+        """Return the record of a journaled contact building it on first use."""
+        record = self._journaled_records.get(row["name"])
+        if record is None:
+            record = Record.from_dict(row)
+            self._on_load(record)
+            self._journaled_records[row["name"]] = record
+        return record
+
+
+class MappedNotes(Mapping):
+    """A read-only mapping of the ids of the notes of a mapped snapshot and the journal over it to the notes."""
+
+    def __init__(self,
+                 snapshot: MappedSnapshot,
+                 on_load: Callable[[Note], Note],
+                 journaled: Optional[Dict[int, Optional[Dict[str, Any]]]] = None
+                 ) -> None:
+        self._snapshot = snapshot
+        self._on_load = on_load
+        self._notes: Dict[int, Note] = {}
+        self._journaled = journaled or {}
+        # The storage positions of the notes by their ids, read from the snapshot on first access.
+        self._positions: Optional[Dict[int, int]] = None
+        self._count: Optional[int] = None if self._journaled else snapshot.notes_count
+
+    def __getitem__(self, index: int) -> Note:
+        note = self._notes.get(index)
+        if note is None:
+            if index in self._journaled:
+                data = self._journaled[index]
+                if data is None:
+                    raise KeyError(index)
+            else:
+                data = self._snapshot.note(self._note_positions()[index])
+            note = Note.from_dict(**data)
+            note.index = index
+            note = self._notes[index] = self._on_load(note)
+        return note
+
+    def __iter__(self) -> Iterator[int]:
+        positions = self._note_positions()
+        for index in positions:
+            if index not in self._journaled or self._journaled[index] is not None:
+                yield index
+        for index, data in self._journaled.items():
+            if data is not None and index not in positions:
+                yield index
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def _note_positions(self) -> Dict[int, int]:
+        """Return the positions of the notes by their ids."""
+        if self._positions is None:
+            self._positions = {note_id: position for position, note_id in enumerate(self._snapshot.note_ids())}
+        return self._positions
+
+
+class MappedAddressBook(AddressBook):
+    """A read-only address book decoding only the contacts it touches from a mapped snapshot."""
+    def __init__(self, snapshot: MappedSnapshot, overlay: Optional[JournalOverlay] = None) -> None:
+        super().__init__()
+        self.data = MappedRecords(snapshot, on_load=self._attach, journaled=overlay and overlay.contacts)
+
+    def add_record(self, record: Record) -> None:
+        """Adding records is not allowed in read-only mode."""
+        raise AddressBookException(READ_ONLY_MESSAGE)
+
+    def add_records(self, rows: Iterable[Union[Record, Dict[str, str]]], validate: bool = True) -> List[Tuple[int, str]]:
+        """Adding records is not allowed in read-only mode."""
+        raise AddressBookException(READ_ONLY_MESSAGE)
+
+    def delete_record(self, name: str) -> bool:
+        """Deleting records is not allowed in read-only mode."""
+        raise AddressBookException(READ_ONLY_MESSAGE)
+
+    def find_by(self, by_field: str, value: str) -> List[Record]:
+        """Find the records whose phone, email or birthday equals the value."""
+        if by_field not in INDEXED_FIELDS:
+            raise AddressBookException(f"Invalid indexed field: {by_field}")
+        key = normalize(by_field, value)
+        records = self.data.select(by_field, lambda field: key is not None and normalize(by_field, field) == key)
+        return sorted(records, key=lambda record: record.name.value)
+
+    def get_all_records(self) -> List[Record]:
+        """Return all records in the address book."""
+        return list(self.data.values())
+
+    def has_changes(self) -> bool:
+        """The read-only address book never changes."""
+        return False
+
+    def to_dict(self) -> List[Dict[str, str]]:
+        """Convert the address book to a dictionary."""
+        return list(self.data.rows())
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        """Iterate over the dictionaries of all records without building them."""
+        return self.data.rows()
+
+    def search(self, by_field: str, value: str) -> List[Record]:
+        """Search for a record in the address book."""
+        if by_field not in RECORD_FIELDS:
+            raise AddressBookException(f"Invalid search field: {by_field}")
+        if not value:
+            return self.get_all_records()
+        value = index_key(by_field, value)
+        return list(self.data.select(by_field, lambda field: bool(field) and value in index_key(by_field, field)))
+
+    def _attach(self, record: Record) -> None:
+        """Subscribe the address book to the changes of a record loaded from the snapshot."""
+        self._attach_hooks(record)
+
+    def _iter_field(self, field: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate over the names of all contacts with the value of their field, without building the records."""
+        for row in self.data.rows():
+            yield row["name"], row[field]
+
+    def _on_record_change(self, record: Record) -> None:
+        """Drop the change made to the record."""
+        self.data.evict(record.name.value)
+        raise AddressBookException(READ_ONLY_MESSAGE)
+
+    def _update_self_key(self, old_name: str, new_name: str) -> None:
+        """Renaming records is not allowed in read-only mode."""
+        raise AddressBookException(READ_ONLY_MESSAGE)
+
+
+class MappedNoteBook(NoteBook):
+    """A read-only notebook decoding only the notes it touches from a mapped snapshot."""
+    def __init__(self, snapshot: MappedSnapshot, overlay: Optional[JournalOverlay] = None) -> None:
+        super().__init__()
+        overlay = overlay or JournalOverlay()
+        self.data = MappedNotes(snapshot, on_load=self._track, journaled=overlay.notes)
+        self.next_index = max(snapshot.next_note_id, overlay.next_note_id)
+
+    def add_note(self, **kwargs) -> None:
+        """Adding notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def add_tags_to_note(self, index: int, tags: List[str]) -> bool:
+        """Adding tags is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def change_text(self, new_text: str, idx: int = None) -> None:
+        """Changing notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def delete_note(self, idx: int = None) -> bool:
+        """Deleting notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def delete_tags_from_note(self, index, *tags) -> bool:
+        """Deleting tags is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def delete_by_tag(self, tag: str) -> None:
+        """Deleting notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def has_changes(self) -> bool:
+        """The read-only notebook never changes."""
+        return False
+
+    def new_note(self, *data) -> None:
+        """Adding notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+    def _on_note_change(self, note: Note) -> None:
+        """Changing notes is not allowed in read-only mode."""
+        raise NoteBookException(READ_ONLY_MESSAGE)
+
+
+class MappedStorage(BaseStorage):
+    """A read-only storage mapping the binary snapshot into memory instead of loading it."""
+    read_only = True
+
+    def __init__(self,
+                 state_file: str = BOT_BINARY_STATE_FILE,
+                 journal_file: str = BOT_BINARY_JOURNAL_FILE
+                 ) -> None:
+        self.state_file = state_file
+        self.journal_file = journal_file
+
+    def recall(self, bot: "ConsoleBot") -> None:
+        """Map the binary snapshot and lay the journal over it; records and notes are decoded when they are read.
+
+        Nothing is written, the journal is left for the binary storage to fold into the snapshot.
+        """
+        binary_storage = BinaryStorage(state_file=self.state_file, journal_file=self.journal_file)
+        overlay = JournalOverlay()
+        for journal_file in (binary_storage.compacting_file, binary_storage.journal_file):
+            for entry in iter_journal(journal_file):
+                overlay.apply(entry)
+        if not os.path.exists(self.state_file):
+            raise MemoryError(COLOR_RED + "ERROR: There is no binary snapshot to open read-only, "
+                                          "convert the state first: console_bot_convert json binary" + COLOR_WHITE)
+        if detect_codec(self.state_file) != NO_COMPRESSION:
+            raise MemoryError(COLOR_RED + "ERROR: A compressed snapshot cannot be opened read-only, "
+                                          "save it with CONSOLE_BOT_COMPRESSION=none first" + COLOR_WHITE)
+        try:
+            snapshot = MappedSnapshot(self.state_file)
+        except SnapshotFormatException as ex:
+            raise MemoryError(COLOR_RED + f"ERROR: Could not open bot state read-only: {ex}" + COLOR_WHITE)
+        bot.address_book = MappedAddressBook(snapshot, overlay)
+        bot.note_book = MappedNoteBook(snapshot, overlay)
+
+    def save(self, bot: "ConsoleBot") -> None:
+        """Nothing is saved in read-only mode."""
+        bot.address_book.pop_changes()
+        bot.note_book.pop_changes()
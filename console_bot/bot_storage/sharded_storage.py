@@ -0,0 +1,265 @@
+import json
+import os
+import threading
+import zlib
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from atomic_file import atomic_open
+from base_storage import BaseStorage
+from bot_constants import BOT_SHARDS_COUNT, BOT_SHARDS_DIR
+from book_items import AddressBook, Note, NoteBook, Record
+from prompt_toolkit.validation import ValidationError
+from storage_exceptions import StorageException
+
+COLOR_RED = '\033[91m'
+COLOR_WHITE = '\033[97m'
+
+MANIFEST_FILE = "manifest.json"
+NOTES_FILE = "notes.json"
+MANIFEST_VERSION = 1
+
+
+def contacts_file(index: int) -> str:
+    """Return the name of the file of a contacts shard."""
+    return f"contacts-{index:04d}.json"
+
+
+def shard_index(name: str, shards_count: int) -> int:
+    """Return the index of the shard the contact with the name belongs to."""
+    # crc32 unlike hash() is the same in every session.
+    return zlib.crc32(name.encode("utf-8")) % shards_count
+
+
+class ShardedRecords(MutableMapping):
+    """A mapping of contact names to records spread over shards which are loaded on first access."""
+
+    def __init__(self,
+                 shards_count: int,
+                 load_shard: Callable[[int], Iterable[Dict[str, str]]],
+                 on_load: Callable[[Record], None],
+                 counts: Optional[List[int]] = None
+                 ) -> None:
+        self.shards_count = shards_count
+        self._load_shard = load_shard
+        self._on_load = on_load
+        self._shards: Dict[int, Dict[str, Record]] = {}
+        # The sizes of the shards not loaded yet, so the book can be counted without reading them.
+        self._counts = counts if counts else [0] * shards_count
+
+    def __getitem__(self, name: str) -> Record:
+        return self.shard(self.bucket(name))[name]
+
+    def __setitem__(self, name: str, record: Record) -> None:
+        self.shard(self.bucket(name))[name] = record
+
+    def __delitem__(self, name: str) -> None:
+        del self.shard(self.bucket(name))[name]
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and name in self.shard(self.bucket(name))
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self.shards_count):
+            yield from list(self.shard(index))
+
+    def __len__(self) -> int:
+        return sum(self.counts())
+
+    def bucket(self, name: str) -> int:
+        """Return the index of the shard the contact with the name belongs to."""
+        return shard_index(name, self.shards_count)
+
+    def counts(self) -> List[int]:
+        """Return the number of contacts in every shard."""
+        return [len(self._shards[index]) if index in self._shards else self._counts[index]
+                for index in range(self.shards_count)]
+
+    def shard(self, index: int) -> Dict[str, Record]:
+        """Return the records of the shard loading it on first use."""
+        shard = self._shards.get(index)
+        if shard is None:
+            shard = {}
+            for data in self._load_shard(index):
+                try:
+                    record = Record.from_dict(data)
+                except ValidationError as e:
+                    print("Ignored invalid record instorage: ", data, e)
+                    continue
+                self._on_load(record)
+                shard[record.name.value] = record
+            self._shards[index] = shard
+        return shard
+
+
+class ShardedAddressBook(AddressBook):
+    """An address book reading its contacts shard by shard as they are accessed."""
+    def __init__(self,
+                 shards_count: int,
+                 load_shard: Callable[[int], Iterable[Dict[str, str]]],
+                 counts: Optional[List[int]] = None
+                 ) -> None:
+        super().__init__()
+        self.data = ShardedRecords(shards_count, load_shard, on_load=self._attach, counts=counts)
+
+    def find_by(self, by_field: str, value: str) -> List[Record]:
+        """Find the records whose phone, email or birthday equals the value, loading all shards into the index first."""
+        for index in range(self.data.shards_count):
+            self.data.shard(index)
+        return super().find_by(by_field, value)
+
+    def _attach(self, record: Record) -> None:
+        """Subscribe the address book to the changes of a record loaded from a shard."""
+        self._attach_hooks(record)
+        self._index.add(record)
+        self._trigrams.add(record)
+        self._birthdays.add(record)
+        self._fuzzy_names.add(record.name.value)
+        self._phones.add(record)
+
+
+class ShardedNoteBook(NoteBook):
+    """A notebook reading its notes from their shard on first access."""
+    def __init__(self, load_notes: Callable[[], Tuple[Iterable[Dict[str, Any]], int]]) -> None:
+        self._load_notes = load_notes
+        super().__init__()
+        self._notes: Optional[Dict[int, Note]] = None
+
+    @property
+    def data(self) -> Dict[int, Note]:
+        """The notes by their ids, loaded from the shard on first access."""
+        if self._notes is None:
+            self._notes = {}
+            notes, next_index = self._load_notes()
+            for note in notes:
+                self.load_note(note)
+            self.next_index = next_index
+        return self._notes
+
+    @data.setter
+    def data(self, notes: Dict[int, Note]) -> None:
+        self._notes = notes
+
+    def _add(self, note: Note, index: Optional[int] = None) -> None:
+        """Read the notes before adding the first new one, so it gets an id after the saved ones."""
+        self.data
+        super()._add(note, index)
+
+
+class ShardedStorage(BaseStorage):
+    """A storage splitting the books into shard files, writing back only the shards which changed."""
+
+    def __init__(self, shards_dir: str = BOT_SHARDS_DIR, shards_count: int = BOT_SHARDS_COUNT) -> None:
+        self.shards_dir = shards_dir
+        self.shards_count = shards_count
+        self._lock = threading.Lock()
+        self._recalled_books: Optional[Tuple[AddressBook, NoteBook]] = None
+        self._saved_counts: Optional[List[int]] = None
+
+    def recall(self, bot: "ConsoleBot") -> None:
+        """Read the manifest of the shards; contacts and notes are read when they are first accessed."""
+        shards_count, counts = self.shards_count, None
+        if os.path.exists(self._path(MANIFEST_FILE)):
+            try:
+                with open(self._path(MANIFEST_FILE), "r") as f:
+                    manifest = json.load(f)
+                shards_count, counts = manifest["shards"], manifest["counts"]
+                if len(counts) != shards_count:
+                    raise ValueError("The manifest does not match the shards.")
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                bot.address_book = AddressBook()
+                bot.note_book = NoteBook()
+                raise MemoryError(COLOR_RED + "ERROR: Could not recall bot state. Starting with a fresh state." + COLOR_WHITE)
+        bot.address_book = ShardedAddressBook(shards_count, self._read_contacts, counts)
+        bot.note_book = ShardedNoteBook(self._read_notes)
+        self._recalled_books = (bot.address_book, bot.note_book)
+        self._saved_counts = bot.address_book.data.counts()
+
+    def save(self, bot: "ConsoleBot") -> None:
+        """Write the shards changed since the last save, or all of them if the books come from elsewhere."""
+        with self._lock:
+            os.makedirs(self.shards_dir, exist_ok=True)
+            changed, deleted = bot.address_book.pop_changes()
+            changed_notes, deleted_notes = bot.note_book.pop_changes()
+            try:
+                self._write_changes(bot, changed, deleted, changed_notes, deleted_notes)
+            except OSError:
+                # The shards of the changes are written again on the next save.
+                bot.address_book.restore_changes(changed, deleted)
+                bot.note_book.restore_changes(changed_notes, deleted_notes)
+                raise
+
+    def _write_changes(self,
+                       bot: "ConsoleBot",
+                       changed: List[Dict[str, str]],
+                       deleted: List[str],
+                       changed_notes: List[Dict[str, Any]],
+                       deleted_notes: List[int]
+                       ) -> None:
+        """Write the shards having the changes, or all shards if the books come from elsewhere."""
+        if self._recalled_books is not None and self._recalled_books[0] is bot.address_book:
+            records = bot.address_book.data
+            dirty = {records.bucket(record["name"]) for record in changed}
+            dirty.update(records.bucket(name) for name in deleted)
+            for index in sorted(dirty):
+                self._write_shard(contacts_file(index), [record.to_dict() for record in list(records.shard(index).values())])
+            counts = records.counts()
+        else:
+            counts = self._write_all_contacts(bot.address_book.iter_rows())
+        if changed_notes or deleted_notes or self._recalled_books is None \
+                or self._recalled_books[1] is not bot.note_book:
+            notes = bot.note_book.to_dict()
+            self._write_shard(NOTES_FILE, {"nextNoteId": bot.note_book.next_index, "notes": notes})
+        if counts != self._saved_counts:
+            self._write_shard(MANIFEST_FILE, {"version": MANIFEST_VERSION, "shards": len(counts), "counts": counts})
+            self._saved_counts = counts
+
+    def _path(self, name: str) -> str:
+        """Return the path of a file in the shards directory."""
+        return os.path.join(self.shards_dir, name)
+
+    def _read_contacts(self, index: int) -> List[Dict[str, str]]:
+        """Read the contacts of a shard."""
+        return self._read_shard(contacts_file(index))
+
+    def _read_notes(self) -> Tuple[List[Dict[str, Any]], int]:
+        """Read the notes and the id the next added note gets."""
+        shard = self._read_shard(NOTES_FILE)
+        if not shard:
+            # The notes shard is missing until the first save.
+            return [], 1
+        try:
+            return shard["notes"], shard["nextNoteId"]
+        except (KeyError, TypeError):
+            raise StorageException(COLOR_RED + f"ERROR: Could not read the shard {NOTES_FILE}." + COLOR_WHITE)
+
+    def _read_shard(self, name: str) -> Any:
+        """Read a shard file; a missing shard is empty."""
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError:
+            # The shard is left untouched on disk, so it can be restored by hand.
+            raise StorageException(COLOR_RED + f"ERROR: Could not read the shard {name}." + COLOR_WHITE)
+
+    def _write_all_contacts(self, rows: Iterable[Dict[str, str]]) -> List[int]:
+        """Replace all contacts shards with the given contacts and return the size of every shard."""
+        shards: List[List[Dict[str, str]]] = [[] for _ in range(self.shards_count)]
+        for row in rows:
+            shards[shard_index(row["name"], self.shards_count)].append(row)
+        names = set()
+        for index, shard in enumerate(shards):
+            names.add(contacts_file(index))
+            self._write_shard(contacts_file(index), shard)
+        for name in os.listdir(self.shards_dir):
+            # Shards left over from a layout with more shards.
+            if name.startswith("contacts-") and name not in names:
+                os.remove(self._path(name))
+        return [len(shard) for shard in shards]
+
+    def _write_shard(self, name: str, data: Any) -> None:
+        """Write a shard file replacing the previous one."""
+        with atomic_open(self._path(name), "w", encoding="utf-8") as f:
+            json.dump(data, f)
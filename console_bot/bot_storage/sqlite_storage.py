@@ -0,0 +1,352 @@
+import json
+import sqlite3
+import weakref
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from base_storage import BaseStorage
+from bot_constants import BOT_SQLITE_FILE
+from book_items import AddressBook, Note, NoteBook, Record
+from book_exceptions import AddressBookException
+from fields.field import normalize_phone
+from record_index import INDEXED_FIELDS, normalize
+
+COLOR_RED = '\033[91m'
+COLOR_WHITE = '\033[97m'
+
+RECORD_COLUMNS = ("name", "phone", "birthday", "email", "address")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    phone TEXT NOT NULL,
+    birthday TEXT,
+    email TEXT,
+    address TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_phone ON contacts (phone);
+CREATE INDEX IF NOT EXISTS contacts_email_nocase ON contacts (email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (birthday);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL,
+    text TEXT,
+    tags TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _lower(value: Optional[str]) -> Optional[str]:
+    """Lowercase the value the same way the in-memory address book does."""
+    return value.lower() if value else value
+
+
+def _like_pattern(value: str) -> str:
+    """Return the LIKE pattern matching the values containing the value literally."""
+    return "%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class SqliteRecords(MutableMapping):
+    """A mapping of contact names to the records stored in the rows of a SQLite table."""
+
+    def __init__(self, connection: sqlite3.Connection, on_load: Callable[[Record], None]) -> None:
+        self._connection = connection
+        self._on_load = on_load
+        # Records are built from rows on demand and live only as long as someone uses them.
+        self._cache: "weakref.WeakValueDictionary[str, Record]" = weakref.WeakValueDictionary()
+
+    def __getitem__(self, name: str) -> Record:
+        record = self._cache.get(name)
+        if record is None:
+            row = self._connection.execute(f"SELECT {', '.join(RECORD_COLUMNS)} FROM contacts WHERE name = ?",
+                                           (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            record = self._load(row)
+        return record
+
+    def __setitem__(self, name: str, record: Record) -> None:
+        data = record.to_dict()
+        # On rename the record still holds its old name when it is moved to the new key.
+        data["name"] = name
+        self._connection.execute(f"INSERT OR REPLACE INTO contacts ({', '.join(RECORD_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                                 tuple(data[column] for column in RECORD_COLUMNS))
+        self._cache[name] = record
+
+    def __delitem__(self, name: str) -> None:
+        cursor = self._connection.execute("DELETE FROM contacts WHERE name = ?", (name,))
+        self._cache.pop(name, None)
+        if not cursor.rowcount:
+            raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        if name in self._cache:
+            return True
+        return self._connection.execute("SELECT 1 FROM contacts WHERE name = ?", (name,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for (name,) in self._connection.execute("SELECT name FROM contacts"):
+            yield name
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def values(self) -> Iterator[Record]:
+        """Iterate over all records of the table."""
+        return self.select()
+
+    def select(self, where: str = "", params: Sequence[Any] = ()) -> Iterator[Record]:
+        """Iterate over the records of the rows matching the condition."""
+        for row in self.rows(where, params, as_dict=False):
+            yield self._load(row)
+
+    def rows(self,
+             where: str = "",
+             params: Sequence[Any] = (),
+             as_dict: bool = True
+             ) -> Iterator[Union[Dict[str, str], Tuple[str, ...]]]:
+        """Iterate over the raw rows matching the condition without building records."""
+        cursor = self._connection.execute(f"SELECT {', '.join(RECORD_COLUMNS)} FROM contacts {where}", params)
+        for row in cursor:
+            yield dict(zip(RECORD_COLUMNS, row)) if as_dict else row
+
+    def replace_all(self, records: List[Dict[str, str]]) -> None:
+        """Replace all rows of the table with the given records."""
+        self._connection.execute("DELETE FROM contacts")
+        self._connection.executemany(f"INSERT INTO contacts ({', '.join(RECORD_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                                     (tuple(record.get(column) for column in RECORD_COLUMNS) for record in records))
+        self._cache.clear()
+
+    def _load(self, row: Tuple[str, ...]) -> Record:
+        """Return the record for the row, reusing the one already in use."""
+        record = self._cache.get(row[0])
+        if record is None:
+            record = Record.from_dict(dict(zip(RECORD_COLUMNS, row)))
+            self._on_load(record)
+            self._cache[row[0]] = record
+        return record
+
+
+class SqliteAddressBook(AddressBook):
+    """An address book reading and writing its records directly from the rows of a SQLite database."""
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        super().__init__()
+        self.data = SqliteRecords(connection, on_load=self._attach)
+
+    def find_by(self, by_field: str, value: str) -> List[Record]:
+        """Find the records whose phone, email or birthday equals the value, using the column indexes."""
+        if by_field not in INDEXED_FIELDS:
+            raise AddressBookException(f"Invalid indexed field: {by_field}")
+        key = normalize(by_field, value)
+        if by_field == "email":
+            # Emails are ASCII, so the case-insensitive collation of the email index matches them as lowercased.
+            return list(self.data.select("WHERE email = ? COLLATE NOCASE ORDER BY name", (key,)))
+        return list(self.data.select(f"WHERE {by_field} = ? ORDER BY name", (key,)))
+
+    def get_all_records(self) -> List[Record]:
+        """Return all records in the address book."""
+        return list(self.data.values())
+
+    def to_dict(self) -> List[Dict[str, str]]:
+        """Convert the address book to a dictionary."""
+        with self._lock:
+            return list(self.data.rows())
+
+    def has_changes(self) -> bool:
+        """Check if there are changes not committed to the database yet."""
+        return self.data._connection.in_transaction
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        """Iterate over the dictionaries of all records without building them."""
+        return self.data.rows()
+
+    def search(self, by_field: str, value: str) -> List[Record]:
+        """Search for a record in the address book."""
+        if by_field not in RECORD_COLUMNS:
+            raise AddressBookException(f"Invalid search field: {by_field}")
+        if not value:
+            return self.get_all_records()
+        if by_field == "phone":
+            # Phones are stored as digits only, so the value is searched the same way.
+            return list(self.data.select("WHERE instr(phone, ?) > 0", (normalize_phone(value),)))
+        if value.isascii():
+            # LIKE ignores the case of ASCII letters without calling back into Python for every row.
+            return list(self.data.select(f"WHERE {by_field} LIKE ? ESCAPE '\\'", (_like_pattern(value),)))
+        return list(self.data.select(f"WHERE instr(py_lower({by_field}), ?) > 0", (value.lower(),)))
+
+    def _attach(self, record: Record) -> None:
+        """Subscribe the address book to the changes of a record loaded from the database."""
+        self._attach_hooks(record)
+
+    def _iter_field(self, field: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate over the names and values of the field of the contacts having it, without building the records."""
+        for row in self.data.rows(f"WHERE {field} IS NOT NULL AND {field} != ''"):
+            yield row["name"], row[field]
+
+    def _mark_changed(self, name: str) -> None:
+        """Rows are written as soon as the record changes, so there is nothing to track."""
+
+    def _mark_deleted(self, name: str) -> None:
+        """Rows are deleted together with the record, so there is nothing to track."""
+
+    def _on_record_change(self, record: Record) -> None:
+        """Write the changed record to its row and to the indexes built in memory."""
+        with self._lock:
+            self.data[record.name.value] = record
+            super()._on_record_change(record)
+
+
+class SqliteNotes(MutableMapping):
+    """A mapping of note ids to the notes stored in the rows of a SQLite table, read on first access.
+
+    Unlike contacts, notes are written only on save: the notes read or added stay in memory with their
+    changes until then, and the deleted ones are hidden until their rows are deleted.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, on_load: Callable[[Note], Note]) -> None:
+        self._connection = connection
+        self._on_load = on_load
+        self._notes: Dict[int, Note] = {}
+        self._deleted: Set[int] = set()
+
+    def __getitem__(self, index: int) -> Note:
+        note = self._notes.get(index)
+        if note is None:
+            if index in self._deleted:
+                raise KeyError(index)
+            row = self._connection.execute("SELECT summary, text, tags FROM notes WHERE id = ?", (index,)).fetchone()
+            if row is None:
+                raise KeyError(index)
+            summary, text, tags = row
+            note = Note.from_dict(summary=summary, text=text, tags=json.loads(tags))
+            note.index = index
+            note = self._notes[index] = self._on_load(note)
+        return note
+
+    def __setitem__(self, index: int, note: Note) -> None:
+        self._notes[index] = note
+        self._deleted.discard(index)
+
+    def __delitem__(self, index: int) -> None:
+        if index not in self:
+            raise KeyError(index)
+        self._notes.pop(index, None)
+        self._deleted.add(index)
+
+    def __contains__(self, index: object) -> bool:
+        if index in self._notes:
+            return True
+        if index in self._deleted:
+            return False
+        return self._connection.execute("SELECT 1 FROM notes WHERE id = ?", (index,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[int]:
+        # Ids only grow, so the notes added since the last save follow the stored ones in the notebook order.
+        stored = [index for (index,) in self._connection.execute("SELECT id FROM notes ORDER BY id")]
+        yield from (index for index in stored if index not in self._deleted)
+        stored_ids = set(stored)
+        yield from sorted(index for index in self._notes if index not in stored_ids)
+
+    def __reversed__(self) -> Iterator[int]:
+        return reversed(list(self))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def write(self, changed: List[Dict[str, Any]], deleted: List[int]) -> None:
+        """Write the rows of the changed notes and delete the rows of the deleted ones."""
+        self._connection.executemany("DELETE FROM notes WHERE id = ?", ((index,) for index in deleted))
+        self._connection.executemany("INSERT OR REPLACE INTO notes (id, summary, text, tags) VALUES (?, ?, ?, ?)",
+                                     ((note["id"], note["summary"], note["text"], json.dumps(note["tags"]))
+                                      for note in changed))
+        self._deleted.difference_update(deleted)
+
+    def replace_all(self, notes: List[Dict[str, Any]]) -> None:
+        """Replace all rows of the table with the given notes."""
+        self._connection.execute("DELETE FROM notes")
+        self.write(notes, [])
+        self._notes.clear()
+        self._deleted.clear()
+
+
+class SqliteNoteBook(NoteBook):
+    """A notebook reading its notes from the rows of a SQLite database on demand and writing the changed ones on save."""
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        super().__init__()
+        self.data = SqliteNotes(connection, on_load=self._track)
+
+
+class SqliteStorage(BaseStorage):
+    """A storage keeping the books in a SQLite database with indexed contact columns."""
+
+    def __init__(self, db_file: str = BOT_SQLITE_FILE) -> None:
+        self.db_file = db_file
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def recall(self, bot: "ConsoleBot") -> None:
+        """Open the database; contacts and notes are read from it on demand."""
+        try:
+            connection = self._connect()
+            address_book = SqliteAddressBook(connection)
+            note_book = SqliteNoteBook(connection)
+            note_book.next_index = self._read_counter(connection, "next_note_id")
+        except sqlite3.DatabaseError:
+            bot.address_book = AddressBook()
+            bot.note_book = NoteBook()
+            raise MemoryError(COLOR_RED + "ERROR: Could not recall bot state. Starting with a fresh state." + COLOR_WHITE)
+        bot.address_book = address_book
+        bot.note_book = note_book
+
+    def save(self, bot: "ConsoleBot") -> None:
+        """Commit the changes made to the books to the database."""
+        connection = self._connect()
+        if not self._owns(bot, connection):
+            # The books live in memory, so all their records are copied to the database.
+            SqliteRecords(connection, on_load=lambda record: None).replace_all(bot.address_book.to_dict())
+            bot.address_book.pop_changes()
+            bot.note_book.pop_changes()
+            SqliteNotes(connection, on_load=lambda note: note).replace_all(bot.note_book.to_dict())
+            self._write_counter(connection, "next_note_id", bot.note_book.next_index)
+            connection.commit()
+            return
+        changed, deleted = bot.note_book.pop_changes()
+        try:
+            if changed or deleted:
+                bot.note_book.data.write(changed, deleted)
+                self._write_counter(connection, "next_note_id", bot.note_book.next_index)
+            connection.commit()
+        except sqlite3.Error:
+            # The contacts written meanwhile stay in the open transaction, so only the notes are retried.
+            bot.note_book.restore_changes(changed, deleted)
+            raise
+
+    @staticmethod
+    def _owns(bot: "ConsoleBot", connection: sqlite3.Connection) -> bool:
+        """Check if the books of the bot were read from the database, so only their changes need writing."""
+        return (isinstance(bot.address_book, SqliteAddressBook) and bot.address_book.data._connection is connection
+                and isinstance(bot.note_book, SqliteNoteBook) and bot.note_book.data._connection is connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection to the database creating the schema if needed."""
+        if self._connection is None:
+            # The connection is shared with the autosave thread, SQLite serializes the access to it.
+            connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            connection.executescript(SCHEMA)
+            connection.create_function("py_lower", 1, _lower, deterministic=True)
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _read_counter(connection: sqlite3.Connection, name: str) -> int:
+        """Read a counter stored in the database, 1 if it has never been saved."""
+        row = connection.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 1
+
+    @staticmethod
+    def _write_counter(connection: sqlite3.Connection, name: str, value: int) -> None:
+        """Save a counter in the database."""
+        connection.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, value))
@@ -0,0 +1,127 @@
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from base_storage import BotState
+from book_items import AddressBook, Record
+from binary_storage import BinaryStorage
+from compression import CODECS
+from json_storage import JsonStorage
+
+BENCHMARK_STORAGES = {"json": JsonStorage, "binary": BinaryStorage}
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet",
+         "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango")
+STREETS = ("Main st", "Shevchenka ave", "Khreshchatyk st", "Park lane", "Station rd")
+
+
+def generate_state(contacts: int, notes: int, seed: int = 0) -> BotState:
+    """Generate books of the given size filled with random but reproducible data."""
+    rnd = random.Random(seed)
+    state = BotState()
+    state.address_book.add_records(generate_rows(contacts, rnd))
+    for _ in range(notes):
+        state.note_book.add_note(summary=" ".join(rnd.choices(WORDS, k=3)),
+                                 text=" ".join(rnd.choices(WORDS, k=rnd.randint(5, 60))),
+                                 tags=rnd.sample(WORDS, k=rnd.randint(0, 4)))
+    return state
+
+
+def generate_rows(contacts: int, rnd: random.Random) -> List[Dict[str, Optional[str]]]:
+    """Generate the dictionaries of contacts filled with random data."""
+    rows = []
+    for index in range(contacts):
+        first, last = rnd.choice(WORDS).capitalize(), rnd.choice(WORDS).capitalize()
+        rows.append({
+            "name": f"{first} {last} {index}",
+            "phone": f"{rnd.randrange(10 ** 9, 10 ** 10)}",
+            "birthday": f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.{rnd.randint(1950, 2010)}"
+            if rnd.random() < 0.7 else None,
+            "email": f"{first.lower()}.{last.lower()}{index}@example.com" if rnd.random() < 0.6 else None,
+            "address": f"{rnd.randint(1, 200)} {rnd.choice(STREETS)}, Kyiv" if rnd.random() < 0.5 else None,
+        })
+    return rows
+
+
+def benchmark_codecs(state: BotState,
+                     codecs: Iterable[str] = CODECS,
+                     storage: str = "json"
+                     ) -> List[Dict[str, Union[str, int, float]]]:
+    """Measure the save time, load time and size on disk of the state's snapshot for every codec."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in codecs:
+            state_file = os.path.join(tmp_dir, f"state.{codec}")
+            bot_storage = BENCHMARK_STORAGES[storage](state_file=state_file,
+                                                      journal_file=state_file + ".journal",
+                                                      compression=codec
+                                                      )
+            start = time.perf_counter()
+            bot_storage.compact(state)
+            save_time = time.perf_counter() - start
+            start = time.perf_counter()
+            bot_storage.recall(BotState())
+            load_time = time.perf_counter() - start
+            results.append({"codec": codec,
+                            "size": os.path.getsize(state_file),
+                            "save": save_time,
+                            "load": load_time})
+    return results
+
+
+class _UnslottedField:
+    """A field laid out as before the fields had slots: a `__dict__` of its own and a value shared with no one."""
+
+    def __init__(self, value: str) -> None:
+        self.value = value
+
+
+class _UnslottedRecord:
+    """A record laid out as before the records had slots, the baseline of the memory a record takes."""
+
+    def __init__(self, data: Dict[str, Optional[str]], book: AddressBook) -> None:
+        self._name = _UnslottedField(data["name"])
+        # Every record got bound methods of its own as the hooks.
+        self._on_name_change = book._update_self_key
+        self._on_change = book._on_record_change
+        for field in ("phone", "birthday", "email", "address"):
+            setattr(self, field, _UnslottedField(data[field]) if data[field] else None)
+
+
+def measure_contact_memory(contacts: int, seed: int = 0) -> Dict[str, float]:
+    """Measure the bytes of memory a generated contact takes as a record keyed by its name, all its strings included.
+
+    The contacts are measured both as the records of the address book and, as the baseline, as records laid out
+    the way they were before they had slots and shared their repeated values.
+    """
+    book = AddressBook()
+
+    def records() -> Dict[str, Record]:
+        built = {}
+        for row in generate_rows(contacts, random.Random(seed)):
+            record = built[row["name"]] = Record.from_dict(row, validate=False)
+            book._attach_hooks(record)
+        return built
+
+    def unslotted_records() -> Dict[str, _UnslottedRecord]:
+        return {row["name"]: _UnslottedRecord(row, book) for row in generate_rows(contacts, random.Random(seed))}
+
+    return {"records": _measure_memory(records) / contacts,
+            "unslotted": _measure_memory(unslotted_records) / contacts}
+
+
+def _measure_memory(build: Callable[[], Any]) -> int:
+    """Return the bytes of memory taken by what the function builds, as long as it is kept."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        built = build()
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del built
+    return used
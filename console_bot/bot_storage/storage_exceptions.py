@@ -0,0 +1,10 @@
+class StorageException(Exception):
+    """A class to represent a storage exception."""
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class SnapshotFormatException(StorageException):
+    """A class to represent an exception raised on a malformed snapshot."""
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
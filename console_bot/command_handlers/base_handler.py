@@ -11,10 +11,12 @@ class BaseCommandHandler(ABC):
                                    "close": self._exit_bot,
                                    "delete": self._delete,
                                    "exit": self._exit_bot,
+                                   "export": self._export,
                                    "search": self._get,
                                    "get-all": self._get_all,
                                    "help": self._get_help,
                                    "hello": self._hello_bot,
+                                   "import": self._import,
                                    "remove": self._delete
                                    }
 
@@ -22,6 +24,10 @@ class BaseCommandHandler(ABC):
     def _add(self, *args) -> None:
         ...
 
+    @abstractmethod
+    def _export(self, *args) -> None:
+        ...
+
     @abstractmethod
     def _get(self, *args) -> str:
         ...
@@ -30,6 +36,10 @@ class BaseCommandHandler(ABC):
     def _get_all(self, *args) -> str:
         ...
 
+    @abstractmethod
+    def _import(self, *args) -> None:
+        ...
+
     @abstractmethod
     def _update(self) -> None:
         ...
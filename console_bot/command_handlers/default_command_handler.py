@@ -1,24 +1,42 @@
+import os
 import sys
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 
 from base_handler import BaseCommandHandler
-from console_bot.book_items import Record, Note
+from bot_constants import BOT_PAGE_SIZE
+from bot_storage import export_contacts, import_contacts
+from console_bot.book_items import Record, Note, Page, paginate, parse_query
 from handler_exceptions import BaseHandlerException, CommandException
 from handler_decorators import apply_decorator_to_class_methods, check_command_args, error_handler
-from print_utils import _pprint_notes, _pprint_records, _print_birthdays, _print_help
+from print_utils import _pprint_notes, _pprint_records, _print_birthdays, _print_help, _print_tags
 from collections import namedtuple
 
 from prompt_toolkit.shortcuts import prompt
 from fields import PhoneValidator, EmailValidator, DateValidator
-from prompt_toolkit.completion import WordCompleter
-from command_handlers.dynamic_command_completer import FieldCompleter
+from prompt_toolkit.completion import PathCompleter, WordCompleter
+from command_handlers.dynamic_command_completer import FieldCompleter, PrefixCompleter
 
 
 
 GREEN_COLOR = "\033[92m"
 RED_COLOR = "\033[91m"
 WHITE_COLOR = "\033[97m"
+# Note fields searched by their words through the full-text index.
+RANKED_NOTE_FIELDS = ("summary", "text", "content")
+# Tags are entered separated by commas, and searched joined by `and` and `or` as well.
+TAG_SEPARATORS = r","
+TAG_QUERY_SEPARATORS = r",|\s+or\s+|\s+and\s+"
+
+
+def _parse_page_size(args: Tuple[str, ...]) -> int:
+    """Return the value of the `--page-size` option among the command arguments."""
+    if "--page-size" not in args:
+        return BOT_PAGE_SIZE
+    position = args.index("--page-size") + 1
+    if position >= len(args) or not args[position].isdigit() or int(args[position]) == 0:
+        raise CommandException("The --page-size option expects a positive number.")
+    return int(args[position])
 
 
 @apply_decorator_to_class_methods(error_handler)
@@ -85,28 +103,27 @@ class DefaultCommandHandler(BaseCommandHandler):
         if not summary:
             summary = self.bot.prmt_session.prompt("Enter the note summary: ")
         text = self.bot.prmt_session.prompt("Enter the note text: ")
-        tags = self.bot.prmt_session.prompt("Enter tags separated by commas: ")
+        tags = self.bot.prmt_session.prompt("Enter tags separated by commas: ", completer=self._tag_completer(TAG_SEPARATORS))
         if tags:
             tags = tags.split(",")
             tags = [tag.strip() for tag in tags]
         else:
             tags = None
-        self.bot.note_book.add_note(summary=summary, text=text, tags=tags)
-        print(GREEN_COLOR + "Note has been added." + WHITE_COLOR)
+        note = self.bot.note_book.add_note(summary=summary, text=text, tags=tags)
+        print(GREEN_COLOR + f"Note {note.index} has been added." + WHITE_COLOR)
 
     def _add_tags_to_note(self, *tags) -> None:
-        """Add tags to a note by index."""
-        note_index = self.bot.prmt_session.prompt("Enter note index to witch you want to add tags: ")
-        try:
-            note_index = int(note_index) - 1  # Note count starts from 1
-        except ValueError:
-            raise CommandException(f"Invalid note index {note_index}.")
+        """Add tags to a note by index or summary."""
+        note = self._pick_note("Enter note index or summary to witch you want to add tags: ")
+        if not note:
+            return
+        note_index = note.index
         tags = list(tags)
         if self.bot.note_book.add_tags_to_note(note_index, tags):
-            print(GREEN_COLOR + f"Tags {tags} have been added to note {note_index + 1}." + WHITE_COLOR)
+            print(GREEN_COLOR + f"Tags {tags} have been added to note {note_index}." + WHITE_COLOR)
             return
         else:
-            print(RED_COLOR + f"Adding tags to note {note_index + 1} was failed." + WHITE_COLOR)
+            print(RED_COLOR + f"Adding tags to note {note_index} was failed." + WHITE_COLOR)
             
     def _change_contact(self, name: Optional[str] = None) -> None:
         """Update contact data."""
@@ -172,26 +189,14 @@ class DefaultCommandHandler(BaseCommandHandler):
     def _change_note(self, index:int = None) -> None:
         """Change the text of a note."""
         if not index:
-            notes = self.bot.note_book.get_all_notes()
-            if not notes:
-                return "The book is empty."     
-            name_notes = [note.summary.value for note in notes]
-            print("Select notes to edit:")
-            for index, name in enumerate(name_notes):
-                print(f"{index + 1}. {name}")
-            while True:
-                index = self.bot.prmt_session.prompt("Enter notes number: ")
-                if index.isdigit() and 1 <= int(index) <= len(name_notes):
-                    index = int(index)
-                    break
-                else:
-                    print(RED_COLOR + "Invalid input. Please enter a valid note number." + WHITE_COLOR)
-            name = name_notes[int(index) - 1]
-            
-            selected_note = self.bot.note_book.find(name)
+            if not len(self.bot.note_book):
+                return "The book is empty."
+            selected_note = self._pick_note("Enter index or summary of the note to edit: ")
+            if not selected_note:
+                return
         else:
-           selected_note = self._check_note_exist(index)
-           name = selected_note.summary.value
+            selected_note = self._check_note_exist(index)
+        name = selected_note.summary.value
 
         print(f"Selected note: {name}")
         print("Select field to edit:")
@@ -229,19 +234,17 @@ class DefaultCommandHandler(BaseCommandHandler):
         """Check if the contact exists in the address book."""
         record: Optional["Record"] = self.bot.address_book.find(name)
         if not record:
-            print(RED_COLOR + f"Contact {name} does not exist." + WHITE_COLOR)
+            print(RED_COLOR + f"Contact {name} does not exist." + self._suggest_names(name) + WHITE_COLOR)
         else:
             return record
         
     def _check_note_exist(self, index: int) -> Optional[Note]:
         """Check if the note exists in the notebook."""
         index = int(index)
-        try:
-            note = self.bot.note_book.get_all_notes()[index - 1]
+        if note := self.bot.note_book.get_note(index):
             return note
-        except IndexError:
-            print(f"Note with index {index} does not exist.")
-            return None
+        print(f"Note with index {index} does not exist.")
+        return None
         
     @check_command_args    
     def _delete(self, command, *args) -> None:
@@ -267,12 +270,15 @@ class DefaultCommandHandler(BaseCommandHandler):
         if result:
             print(GREEN_COLOR + f"Contact {name} has been deleted." + WHITE_COLOR)
         else:
-            print(RED_COLOR + f"Contact {name} does not exist." + WHITE_COLOR)
+            print(RED_COLOR + f"Contact {name} does not exist." + self._suggest_names(name) + WHITE_COLOR)
 
     def _delete_note(self, index: int = None) -> None:
         """Delete a note from the notebook."""
         if not index:
-            index = self.bot.prmt_session.prompt("Enter the index of the note you want to delete: ")
+            note = self._pick_note("Enter the index or summary of the note you want to delete: ")
+            if not note:
+                return
+            index = note.index
         try:
             index = int(index)
         except ValueError:
@@ -288,11 +294,11 @@ class DefaultCommandHandler(BaseCommandHandler):
             note_index, *tags = args
         except ValueError:
             raise CommandException("Invalid number of arguments for delete-tags command, please try again.")
-        note_index = int(note_index) - 1  # Note count starts from 1
+        note_index = int(note_index)
         if self.bot.note_book.delete_tags_from_note(note_index, *tags):
-            print(GREEN_COLOR + f"Tags {tags} have been deleted from note {note_index + 1}." + WHITE_COLOR)
+            print(GREEN_COLOR + f"Tags {tags} have been deleted from note {note_index}." + WHITE_COLOR)
         else:
-            print(GREEN_COLOR + f"Deleting tags from note {note_index + 1} was failed." + WHITE_COLOR)
+            print(GREEN_COLOR + f"Deleting tags from note {note_index} was failed." + WHITE_COLOR)
     
     def _exit_bot(self) -> None:
         """Exit the bot and save your data."""
@@ -301,53 +307,99 @@ class DefaultCommandHandler(BaseCommandHandler):
         print("Done! Goodbye!")
         sys.exit(0)
 
-    def _find_contact(self) -> None:
+    @check_command_args
+    def _export(self, file_format, *args) -> None:
+        """\033[3m[csv/vcard]\033[0m Export all contacts to a CSV or vCard file."""
+        path = self._prompt_file_path(" ".join(args))
+        count = export_contacts(self.bot.address_book, path, file_format, on_progress=self._print_progress)
+        print()
+        print(GREEN_COLOR + f"{count} contacts have been exported to {path}." + WHITE_COLOR)
+
+    def _find_contact(self, page_size: int = BOT_PAGE_SIZE) -> None:
         """Find a contact by a given field and value."""
         field_completer = FieldCompleter('search', 'contact')
         by_field = self.bot.prmt_session.prompt("Enter field to search by: ", complete_while_typing=True, completer=field_completer)
+        if by_field.lower() == "query":
+            self._query_contacts(page_size)
+            return
+        if by_field.lower() == "caller":
+            self._find_callers()
+            return
         value = self.bot.prmt_session.prompt(f"Enter expected {by_field} value: ", complete_while_typing=False)
         if result := self.bot.address_book.search(by_field.lower(), value):
-            _pprint_records(result)
+            self._show_pages(lambda offset: paginate(result, offset, page_size), _pprint_records)
             return
         print(RED_COLOR + f"No contacts found with {by_field} {value}." + WHITE_COLOR)
+        if by_field.lower() == self.cmd_name and (closest := self.bot.address_book.find_closest(value)):
+            print("The closest contacts:")
+            _pprint_records(closest)
 
-    def _find_note(self) -> None:
+    def _query_contacts(self, page_size: int = BOT_PAGE_SIZE) -> None:
+        """Find the contacts matching conditions on several fields joined by `and` and `or`."""
+        print("Conditions are field=value, field^prefix, field~substring or birthday:DD.MM-DD.MM, "
+              "joined by 'and' and 'or'.")
+        text = self.bot.prmt_session.prompt("Enter query: ", complete_while_typing=False)
+        if result := self.bot.address_book.query(parse_query(text)):
+            self._show_pages(lambda offset: paginate(result, offset, page_size), _pprint_records)
+            return
+        print(RED_COLOR + f"No contacts found for {text}." + WHITE_COLOR)
+
+    def _find_callers(self) -> None:
+        """Find the contacts an incoming number may come from, with or without its country code."""
+        number = self.bot.prmt_session.prompt("Enter incoming number: ", complete_while_typing=False)
+        if result := self.bot.address_book.find_callers(number):
+            _pprint_records(result)
+            return
+        print(RED_COLOR + f"No contacts found for the number {number}." + WHITE_COLOR)
+
+    def _find_note(self, page_size: int = BOT_PAGE_SIZE) -> None:
         """Find a note by a given field and value."""
         field_completer = FieldCompleter('search', 'note')
         by_field = self.bot.prmt_session.prompt("Enter field to search by: ", complete_while_typing=True, completer=field_completer)
-        value = self.bot.prmt_session.prompt(f"Enter expected {by_field} value: ", complete_while_typing=False)
-        order = self.bot.prmt_session.prompt("Enter order (asc/desc): ", default="asc")
-        if result := self.bot.note_book.search(by_field, value, by_field, order):
-            _pprint_notes(result)
+        if by_field in ["tag", "tags"]:
+            value = self.bot.prmt_session.prompt(f"Enter expected {by_field} value: ", completer=self._tag_completer(TAG_QUERY_SEPARATORS))
+        else:
+            value = self.bot.prmt_session.prompt(f"Enter expected {by_field} value: ", complete_while_typing=False)
+        if by_field in RANKED_NOTE_FIELDS:
+            # Words found in the summary or text are shown the most relevant first.
+            result = self.bot.note_book.search(by_field, value, None, None)
+        else:
+            order = self.bot.prmt_session.prompt("Enter order (asc/desc): ", default="asc")
+            result = self.bot.note_book.search(by_field, value, by_field, order)
+        if result:
+            self._show_pages(lambda offset: paginate(result, offset, page_size), _pprint_notes)
             return
         print(RED_COLOR + f"No notes found with {by_field} {value}." + WHITE_COLOR)
 
     @check_command_args  
     def _get(self, command, *args) -> None:
-        """\033[3m[contact/note]\033[0m Get an item from the address book or notebook."""
+        """\033[3m[contact/note]\033[0m Get an item from the address book or notebook, found items are shown page by page (--page-size N)."""
+        page_size = _parse_page_size(args)
         if command == "contact":
-            self._find_contact()
+            self._find_contact(page_size)
         elif command == "note":
-            self._find_note()
+            self._find_note(page_size)
 
     @check_command_args  
     def _get_all(self, command, *args) -> None:
-        """\033[3m[contacts/notes/birthdays]\033[0m Show all items in the address book or notebook, or show all birthdayns in N days (defult 7)."""
+        """\033[3m[contacts/notes/birthdays/tags]\033[0m Show all items in the address book or notebook page by page (--page-size N), all birthdayns in N days (defult 7), or all tags with their note counts."""
         if command == "contacts":
-            self._get_contacts()
+            self._get_contacts(_parse_page_size(args))
         elif command == "notes":
-            self._get_notes()
+            self._get_notes(_parse_page_size(args))
         elif command == "birthdays":
             self._get_birthdays_from_date(*args)
+        elif command == "tags":
+            self._get_tags()
         else:
             print(RED_COLOR + "Invalid command, please try again." + WHITE_COLOR)
     
-    def _get_contacts(self) -> None:
+    def _get_contacts(self, page_size: int = BOT_PAGE_SIZE) -> None:
         """Show all book_items in the address book."""
-        records = self.bot.address_book.get_all_records()
-        if not records:
+        if not len(self.bot.address_book):
             print(RED_COLOR + "The address book is empty." + WHITE_COLOR)
-        _pprint_records(records)
+            return
+        self._show_pages(lambda offset: self.bot.address_book.get_page(offset, page_size), _pprint_records)
 
     def _get_birthdays_from_date(self, *args) -> None:
         """Show birthdays for the next n days. By default, n=7."""
@@ -361,24 +413,110 @@ class DefaultCommandHandler(BaseCommandHandler):
         if result:
             _print_birthdays(result)
 
-    def _get_notes(self) -> None:
+    def _get_tags(self) -> None:
+        """Show all tags with the number of notes having them."""
+        if counts := self.bot.note_book.tag_counts():
+            _print_tags(counts)
+        else:
+            print(RED_COLOR + "There are no tagged notes." + WHITE_COLOR)
+
+    def _get_notes(self, page_size: int = BOT_PAGE_SIZE) -> None:
         """Show all notes in the notebook."""
         apply_sort = self.bot.prmt_session.prompt("Do you want to sort the notes? ", default="no")
         if apply_sort.lower() in ["yes", "y"]:
             field_completer = FieldCompleter(custom_command_list=['index', 'text', 'tag'])
             sort_by = self.bot.prmt_session.prompt("Enter sort attribute (index/text/tag): ", complete_while_typing=True, completer=field_completer)
             order = self.bot.prmt_session.prompt("Enter order (asc/desc): ", default="asc", complete_while_typing=False)
-            notes = self.bot.note_book.get_all_notes(sort_by, order)
         else:
-            notes = self.bot.note_book.get_all_notes()
-        if not notes:
+            sort_by, order = None, "asc"
+        if not len(self.bot.note_book):
             print(RED_COLOR + "The notebook is empty." + WHITE_COLOR)
-        _pprint_notes(notes)
+            return
+        self._show_pages(lambda offset: self.bot.note_book.get_page(offset, page_size, sort_by, order), _pprint_notes)
 
     def _get_help(self, print_starting: bool = False, *args) -> None:
         """Show supported commands."""
         _print_help(self, print_title=print_starting)
         
+    @check_command_args
+    def _import(self, file_format, *args) -> None:
+        """\033[3m[csv/vcard]\033[0m Import contacts from a CSV or vCard file."""
+        path = self._prompt_file_path(" ".join(args))
+        report = import_contacts(self.bot.address_book, path, file_format, on_progress=self._print_progress)
+        print()
+        print(GREEN_COLOR + f"{report.imported} contacts have been imported from {path}." + WHITE_COLOR)
+        if report.failed:
+            print(RED_COLOR + f"{report.failed} contacts were skipped:" + WHITE_COLOR)
+            for position, message in report.errors:
+                print(RED_COLOR + f"  #{position} {message}" + WHITE_COLOR)
+            if report.failed > len(report.errors):
+                print(RED_COLOR + f"  ... and {report.failed - len(report.errors)} more." + WHITE_COLOR)
+
+    def _print_progress(self, count: int, fraction: Optional[float]) -> None:
+        """Show the progress of an import or export on a single line."""
+        percent = f" {fraction:.0%}" if fraction is not None else ""
+        print(f"\rProcessed {count} contacts{percent}", end="", flush=True)
+
+    def _prompt_file_path(self, default: str = "") -> str:
+        """Ask for the path of a file to import or export."""
+        path = self.bot.prmt_session.prompt("Enter file path: ", default=default, completer=PathCompleter(expanduser=True))
+        if not path.strip():
+            raise CommandException("File path is required.")
+        return os.path.expanduser(path.strip())
+
+    def _show_pages(self, get_page: Callable[[int], Page], print_items: Callable[[List], None]) -> None:
+        """Print the first page of items and let the user move to the next and previous pages."""
+        page = get_page(0)
+        print_items(page.items)
+        while page.pages_count > 1:
+            print(f"Page {page.number} of {page.pages_count}, {page.total} in total.")
+            choice = self.bot.prmt_session.prompt("[n]ext, [p]revious or [q]uit: ",
+                                                  default="n" if page.has_next else "q").strip().lower()
+            if choice in ("n", "next") and page.has_next:
+                page = get_page(page.next_offset)
+            elif choice in ("p", "prev", "previous") and page.has_prev:
+                page = get_page(page.prev_offset)
+            elif choice in ("q", "quit"):
+                return
+            else:
+                continue
+            print_items(page.items)
+
+    def _pick_note(self, message: str) -> Optional[Note]:
+        """Ask for a note by its index or summary, completing the summaries while typing."""
+        completer = PrefixCompleter(self.bot.note_book.complete_summary)
+        while True:
+            answer = self.bot.prmt_session.prompt(message, completer=completer, complete_while_typing=True).strip()
+            if not answer:
+                return None
+            if answer.isdigit() and (note := self.bot.note_book.get_note(int(answer))):
+                return note
+            notes = self.bot.note_book.find_all(answer)
+            if len(notes) == 1:
+                return notes[0]
+            if notes:
+                print(f"Several notes have the summary '{answer}', enter the index of one of them.")
+                _pprint_notes(notes)
+                continue
+            print(RED_COLOR + f"Note {answer} does not exist." + self._suggest_summaries(answer) + WHITE_COLOR)
+
+    def _suggest_summaries(self, summary: str) -> str:
+        """Return the "did you mean" hint listing the summaries starting with the entered text."""
+        if summaries := self.bot.note_book.complete_summary(summary):
+            return " Did you mean " + ", ".join(f"'{summary}'" for summary in summaries) + "?"
+        return ""
+
+    def _tag_completer(self, separators: str) -> PrefixCompleter:
+        """Return the completer of the tags typed last, the most used tags first."""
+        return PrefixCompleter(self.bot.note_book.complete_tag, separators)
+
+    def _suggest_names(self, name: str) -> str:
+        """Return the "did you mean" hint listing the contact names closest to the name."""
+        if closest := self.bot.address_book.find_closest(name):
+            names = ", ".join(f"'{record.name.value}'" for record in closest)
+            return f" Did you mean {names}?"
+        return ""
+
     @check_command_args  
     def _update(self, command, *args) -> None:
         """\033[3m[contact/note]\033[0m Update an item in the address book or notebook."""
@@ -1,5 +1,8 @@
 """Module for dynamic command autocompletion."""
 
+import re
+from typing import Callable, Iterable, Optional
+
 from prompt_toolkit.completion import Completer, Completion
 
 
@@ -8,10 +11,12 @@ commands = {
     "edit": ["contact", "note"],
     "delete": ["contact", "note"],
     "search": {
-        "contact": ["name", "phone", "birthday", "email", "address"],
-        "note": ["tag"],
+        "contact": ["name", "phone", "birthday", "email", "address", "query", "caller"],
+        "note": ["tag", "summary", "text", "content"],
     },
-    "get-all": ["contacts", "notes", "birthdays"],
+    "get-all": ["contacts", "notes", "birthdays", "tags"],
+    "import": ["csv", "vcard"],
+    "export": ["csv", "vcard"],
     "exit": [],
     "close": [],
     "help": [],
@@ -126,3 +131,24 @@ class FieldCompleter(Completer):
             )
             for subcommand in sorted_subcommands:
                 yield Completion(subcommand, start_position=-len(parts[0]))
+
+
+class PrefixCompleter(Completer):
+    """
+    Class PrefixCompleter(Completer) completes the entered text, or its
+    part after the last separator, with the texts a prefix lookup returns.
+    """
+
+    def __init__(self, complete: Callable[[str], Iterable[str]], separators: Optional[str] = None):
+        super().__init__()
+        self.complete = complete
+        self.separators = re.compile(separators) if separators else None
+
+    def get_completions(self, document, complete_event):
+        """Provides the completions of the text typed last, looked up in the index while typing."""
+        text = document.text_before_cursor
+        if self.separators:
+            text = self.separators.split(text)[-1]
+        prefix = text.lstrip()
+        for completion in self.complete(prefix):
+            yield Completion(completion, start_position=-len(prefix))
@@ -22,7 +22,8 @@ def check_command_args(func):
     @wraps(func)
     def inner(*args, **kwargs):
         if len(args) < 2:
-            names = {"_add": "add", "_delete": "delete/remove", "_get": "get", "_get_all": "get-all", "_update": "edit"}
+            names = {"_add": "add", "_delete": "delete/remove", "_export": "export", "_get": "get", "_get_all": "get-all",
+                     "_import": "import", "_update": "edit"}
             raise CommandException(f"Invalid number of arguments for {names[func.__name__]} command, please try again.")
         handler, command, *args = args[0], args[1].lower(), *args[2:]
         if func.__name__ == "_add":
@@ -35,7 +36,10 @@ def check_command_args(func):
             if command not in ["contact", "note"]:
                 raise CommandException(f"Invalid command {command}, please try again.")
         elif func.__name__ == "_get_all":
-            if command not in ["contacts", "notes", "birthdays"]:
+            if command not in ["contacts", "notes", "birthdays", "tags"]:
+                raise CommandException(f"Invalid command {command}, please try again.")
+        elif func.__name__ in ["_export", "_import"]:
+            if command not in ["csv", "vcard"]:
                 raise CommandException(f"Invalid command {command}, please try again.")
         elif func.__name__ == "_update":
             if command not in ["contact", "note"]:
@@ -79,6 +79,21 @@ def _print_birthdays(records: dict):
     print(table)
 
 
+def _print_tags(counts: dict):
+    """Print the tags with the number of notes having them."""
+    table = PrettyTable()
+    table.title = colorize("My Tags", 36, bold=True)
+    table.field_names = [colorize("Tag", 33), colorize("Notes", 33)]
+    table.align = "l"
+    table.set_style(DOUBLE_BORDER)
+    table.padding_width = 1
+
+    for tag, count in counts.items():
+        table.add_row([tag, count])
+
+    print(table)
+
+
 def _print_help(handler: "BaseCommandHandler", print_title: bool = False):
     """Print the help message."""
     if print_title:
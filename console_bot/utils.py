@@ -1,18 +1,22 @@
-from typing import Any, List, Optional, Tuple
-import re
+from typing import Iterable, Optional, Tuple
 
+from book_items.fuzzy_index import MAX_EDIT_DISTANCE, edit_distance
 
-def _find_best_match(input_value: str, str_list: List[str]) -> Optional[str]:
-    """Find the best match for the input_value in the list of strings."""
-    best_match: Optional[Any] = None
-    best_score: int = 0  # Initialize to 0 for matching pattern
 
-    pattern = re.compile(input_value)
+def _find_best_match(input_value: str, str_list: Iterable[str]) -> Optional[str]:
+    """Find the best match for the input_value in the list of strings."""
+    best_match: Optional[str] = None
+    best_score = MAX_EDIT_DISTANCE + 1
+    if not input_value:
+        return None
 
     for s in str_list:
-        match = pattern.search(s)
-        if match and match.end() - match.start() > best_score:
-            best_score = match.end() - match.start()
+        # The input is matched as plain text, so typos like "(" do not break the lookup.
+        if input_value in s:
+            return s
+        score = edit_distance(input_value, s)
+        if score < best_score:
+            best_score = score
             best_match = s
 
     return best_match
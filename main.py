@@ -1,4 +1,8 @@
+import argparse
+
 from console_bot import ConsoleBot
+from console_bot.bot_memory import STORAGES, WRITABLE_STORAGES, convert_bot_state
+from console_bot.bot_storage import BENCHMARK_STORAGES, CODECS, benchmark_codecs, generate_state, measure_contact_memory
 from console_bot.command_handlers import DefaultCommandHandler
 from console_bot.book_items import AddressBook, NoteBook
 
@@ -13,5 +17,38 @@ def main():
     bot.run()
 
 
+def convert():
+    """Convert the saved state of the bot from one storage format to another."""
+    parser = argparse.ArgumentParser(description="Convert the saved state of console_bot between storage formats.")
+    parser.add_argument("source", choices=list(STORAGES), help="storage to read the state from")
+    parser.add_argument("target", choices=WRITABLE_STORAGES, help="storage to write the state to")
+    args = parser.parse_args()
+    state = convert_bot_state(args.source, args.target)
+    print(f"Converted {len(state.address_book)} contacts and {len(state.note_book)} notes "
+          f"from {args.source} to {args.target}.")
+
+
+def benchmark():
+    """Compare the compression codecs of the saved state, or measure the memory of a contact, on a generated book."""
+    parser = argparse.ArgumentParser(description="Measure save time, load time and size of the state for every codec.")
+    parser.add_argument("--contacts", type=int, default=10000, help="number of contacts to generate")
+    parser.add_argument("--notes", type=int, default=1000, help="number of notes to generate")
+    parser.add_argument("--storage", choices=list(BENCHMARK_STORAGES), default="json", help="snapshot format")
+    parser.add_argument("--codecs", nargs="+", choices=CODECS, default=list(CODECS), help="codecs to compare")
+    parser.add_argument("--memory", action="store_true", help="measure the memory a contact takes instead")
+    args = parser.parse_args()
+    if args.memory:
+        memory = measure_contact_memory(args.contacts)
+        print(f"Bytes per contact in a book of {args.contacts} contacts:")
+        print(f"{'address book records':<24}{memory['records']:>8.0f}")
+        print(f"{'records without slots':<24}{memory['unslotted']:>8.0f}")
+        return
+    state = generate_state(args.contacts, args.notes)
+    print(f"{args.storage} snapshot of {args.contacts} contacts and {args.notes} notes:")
+    print(f"{'codec':<8}{'size, KiB':>12}{'save, s':>10}{'load, s':>10}")
+    for result in benchmark_codecs(state, args.codecs, args.storage):
+        print(f"{result['codec']:<8}{result['size'] / 1024:>12.1f}{result['save']:>10.3f}{result['load']:>10.3f}")
+
+
 if __name__ == "__main__":
     main()
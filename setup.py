@@ -15,7 +15,9 @@ setup(name='console_bot',
       ],
       entry_points={
           'console_scripts': [
-              'console_bot = main:main'
+              'console_bot = main:main',
+              'console_bot_convert = main:convert',
+              'console_bot_benchmark = main:benchmark'
               ]
           }
 )